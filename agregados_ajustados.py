@@ -0,0 +1,207 @@
+"""
+Agregados das últimas N partidas ponderados pela força dos adversários (perfis 'ajustado')
+
+Os perfis ajustados do peso do jogo e do SG olham as mesmas janelas dos perfis normais, mas cada
+partida pesa conforme a força do adversário na tabela de classificação (forca_normalizada, 0.0 =
+lanterna, 1.0 = líder): vitória sobre time forte vale mais, gol sofrido de time fraco pesa mais etc.
+
+Em vez de consultas por clube e por perfil, as somas ponderadas de todos os clubes × mandos ×
+janelas são calculadas de uma vez sobre a tabela de partidas do ciclo, com a tabela de
+classificação também do ciclo; os perfis ajustados só combinam os agregados.
+"""
+import logging
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from modelo_dados import MANDOS, TabelaPartidas
+
+logger = logging.getLogger(__name__)
+
+# Força atribuída a adversários fora da tabela (neutra)
+FORCA_NEUTRA = 0.5
+
+
+class AgregadoAjustado(NamedTuple):
+    """Últimas N partidas de um clube com um mando, com somas ponderadas pela força dos adversários"""
+    jogos: int = 0
+    gols_pro: int = 0
+    gols_contra: int = 0
+    clean_sheets: int = 0
+    # Soma das forças dos adversários
+    forca_adversarios: float = 0.0
+    # Pontos e pontos possíveis ponderados pelo peso do resultado
+    # (calculo_tabela.calcular_peso_resultado_por_forca_adversario)
+    pontos_resultado: float = 0.0
+    possiveis_resultado: float = 0.0
+    # Peso de ataque (1 + (forca - 0.5) * 0.3): pontos e gols pró valem mais contra times fortes
+    peso_ataque: float = 0.0
+    pontos_ataque: float = 0.0
+    gols_pro_ponderados: float = 0.0
+    # Peso de defesa (1 + (0.5 - forca) * 0.3): gols sofridos de times fracos pesam mais
+    peso_defesa: float = 0.0
+    gols_contra_ponderados: float = 0.0
+    # Clean sheets com peso 1 + (forca - 0.5) * 0.4
+    clean_sheets_ponderados: float = 0.0
+
+    @property
+    def forca_media_adversarios(self) -> float:
+        """Força média dos adversários (neutra sem jogos)"""
+        return self.forca_adversarios / self.jogos if self.jogos > 0 else FORCA_NEUTRA
+
+    @property
+    def aproveitamento_resultado(self) -> float:
+        return self.pontos_resultado / self.possiveis_resultado if self.possiveis_resultado > 0 else 0
+
+    @property
+    def aproveitamento_ataque(self) -> float:
+        return self.pontos_ataque / (3 * self.peso_ataque) if self.peso_ataque > 0 else 0
+
+    @property
+    def media_gols_pro(self) -> float:
+        return self.gols_pro / self.jogos if self.jogos > 0 else 0
+
+    @property
+    def media_gols_contra(self) -> float:
+        return self.gols_contra / self.jogos if self.jogos > 0 else 0
+
+    @property
+    def media_gols_pro_ponderada(self) -> float:
+        return self.gols_pro_ponderados / self.peso_ataque if self.peso_ataque > 0 else 0
+
+    @property
+    def media_gols_contra_ponderada(self) -> float:
+        return self.gols_contra_ponderados / self.peso_defesa if self.peso_defesa > 0 else 0
+
+    @property
+    def saldo_gols(self) -> int:
+        return self.gols_pro - self.gols_contra
+
+    @property
+    def fator_clean_sheets(self) -> float:
+        """Clean sheets ponderados sobre o peso de defesa das partidas"""
+        return self.clean_sheets_ponderados / self.peso_defesa if self.peso_defesa > 0 else 0
+
+
+class AgregadosAjustados:
+    """Agregados ajustados de todos os clubes, por mando e janela"""
+
+    def __init__(self, valores: Dict[Tuple[int, str, int], AgregadoAjustado], janelas: Tuple[int, ...]):
+        self._valores = valores
+        self.janelas = janelas
+
+    def obter(self, clube_id: int, mando: str, janela: int) -> AgregadoAjustado:
+        """Agregado do clube (zerado se o clube não tem partidas com o mando)"""
+        if janela not in self.janelas:
+            raise KeyError(f"Janela {janela} não foi carregada (disponíveis: {self.janelas})")
+        return self._valores.get((clube_id, mando, janela), AgregadoAjustado())
+
+    def __len__(self):
+        return len(self._valores)
+
+
+def forcas_por_indice(partidas: TabelaPartidas, tabela_classificacao: Dict[int, Dict]) -> np.ndarray:
+    """Força normalizada de cada clube no índice denso da tabela de partidas"""
+    forcas = np.full(len(partidas.clubes), FORCA_NEUTRA)
+    for clube_id, estatisticas in tabela_classificacao.items():
+        i = partidas.clubes.get(clube_id)
+        if i >= 0:
+            forcas[i] = estatisticas['forca_normalizada']
+    return forcas
+
+
+def agregar_ajustados(partidas: TabelaPartidas, rodada_atual: int, janelas: Iterable[int],
+                      tabela_classificacao: Dict[int, Dict]) -> AgregadosAjustados:
+    """
+    Agrega as partidas encerradas antes da rodada atual (vetorizado por clube × mando × janela)
+
+    Args:
+        partidas: Tabela de partidas da temporada
+        rodada_atual: Rodada atual (consideradas as rodadas até rodada_atual - 1)
+        janelas: Tamanhos de janela
+        tabela_classificacao: Tabela de classificação do ciclo (calculo_tabela)
+    """
+    janelas = tuple(sorted({int(j) for j in janelas}))
+    forcas = forcas_por_indice(partidas, tabela_classificacao)
+    # Da mais recente para a mais antiga
+    posicoes = partidas.encerradas(rodada_atual - 1)[::-1]
+    n = len(partidas.clubes)
+
+    valores = {}
+    for mando in MANDOS:
+        clubes_mando, adversarios_mando = (
+            (partidas.casa, partidas.visitante) if mando == 'casa' else (partidas.visitante, partidas.casa)
+        )
+        # Agrupar por clube mantendo a ordem de recência; posição de cada jogo no histórico do clube
+        ordem = np.argsort(clubes_mando[posicoes], kind='stable')
+        clubes = clubes_mando[posicoes][ordem]
+        forca = forcas[adversarios_mando[posicoes][ordem]]
+        pro, contra = partidas.gols_do_ponto_de_vista(posicoes[ordem], mando)
+        pro, contra = pro.astype(np.float64), contra.astype(np.float64)
+        recencia = np.arange(len(clubes)) - np.searchsorted(clubes, clubes, side='left')
+
+        vitoria, empate, derrota = pro > contra, pro == contra, pro < contra
+        pontos = 3.0 * vitoria + empate
+        # Peso do resultado: empate com metade do ajuste, derrota com o ajuste invertido
+        peso_resultado = 1.0 + (forca - 0.5) * 0.4 * np.where(empate, 0.5, np.where(derrota, -1.0, 1.0))
+        peso_ataque = 1.0 + (forca - 0.5) * 0.3
+        peso_defesa = 1.0 + (0.5 - forca) * 0.3
+        peso_clean_sheet = np.where(contra == 0, 1.0 + (forca - 0.5) * 0.4, 0.0)
+
+        for janela in janelas:
+            na_janela = recencia < janela
+            c = clubes[na_janela]
+
+            def somar(pesos=None):
+                return np.bincount(c, weights=None if pesos is None else pesos[na_janela], minlength=n)
+
+            jogos = somar().astype(np.int64).tolist()
+            colunas = [
+                somar(pro).astype(np.int64).tolist(),
+                somar(contra).astype(np.int64).tolist(),
+                somar((contra == 0).astype(np.float64)).astype(np.int64).tolist(),
+                somar(forca).tolist(),
+                somar(pontos * peso_resultado).tolist(),
+                somar(3.0 * peso_resultado).tolist(),
+                somar(peso_ataque).tolist(),
+                somar(pontos * peso_ataque).tolist(),
+                somar(pro * peso_ataque).tolist(),
+                somar(peso_defesa).tolist(),
+                somar(contra * peso_defesa).tolist(),
+                somar(peso_clean_sheet).tolist(),
+            ]
+            for i in np.flatnonzero(jogos).tolist():
+                valores[(partidas.clubes.clube(i), mando, janela)] = AgregadoAjustado(
+                    jogos[i], *(coluna[i] for coluna in colunas)
+                )
+    return AgregadosAjustados(valores, janelas)
+
+
+def carregar_agregados_ajustados(cursor, rodada_atual: int, temporada: int, janelas: Iterable[int],
+                                 partidas: Optional[TabelaPartidas] = None,
+                                 tabela_classificacao: Optional[Dict[int, Dict]] = None,
+                                 impressao: Optional[str] = None) -> AgregadosAjustados:
+    """
+    Agregados ajustados antes da rodada atual, com a tabela de classificação até a rodada anterior
+
+    Args:
+        cursor: Cursor do banco
+        rodada_atual: Rodada atual
+        temporada: Temporada
+        janelas: Tamanhos de janela dos perfis ajustados
+        partidas: Tabela de partidas do ciclo (se None, será carregada)
+        tabela_classificacao: Tabela de classificação do ciclo (se None, será calculada)
+        impressao: Hash dos dados de partidas (cache da tabela de partidas e da classificação)
+    """
+    from calculo_tabela import calcular_tabela_classificacao
+    from modelo_dados import carregar_tabela_partidas
+
+    if partidas is None:
+        partidas = carregar_tabela_partidas(cursor, temporada, impressao)
+    if tabela_classificacao is None:
+        tabela_classificacao = calcular_tabela_classificacao(
+            cursor, rodada_atual - 1, temporada, impressao, partidas=partidas
+        )
+    agregados = agregar_ajustados(partidas, rodada_atual, janelas, tabela_classificacao)
+    logger.info(f"Agregados ajustados carregados: janelas {agregados.janelas}, {len(agregados)} entradas")
+    return agregados
@@ -0,0 +1,198 @@
+"""
+Agregados das últimas N partidas de todos os clubes, por mando
+
+O peso do jogo e o peso do SG precisam, para cada clube, das vitórias/empates/derrotas,
+gols pró/contra e clean sheets das últimas N partidas como mandante (casa) ou visitante
+(fora). Em vez de várias consultas por partida, os agregados de todos os clubes × mandos ×
+janelas são carregados de uma vez, em um dos modos (MODO_AGREGACAO):
+
+    'python'  agregação vetorizada sobre a tabela de partidas da temporada (TabelaPartidas,
+              uma consulta ou a tabela já carregada no ciclo; bom para banco local)
+    'sql'     uma consulta com ROW_NUMBER() OVER (PARTITION BY clube, mando ...) agrega no
+              servidor e devolve um resultado compacto (bom para banco remoto)
+
+Os dois modos produzem o mesmo resultado.
+"""
+import logging
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from config import MODO_AGREGACAO
+from modelo_dados import TabelaPartidas, carregar_tabela_partidas
+
+logger = logging.getLogger(__name__)
+
+MANDOS = ('casa', 'fora')
+MODOS_AGREGACAO = ('python', 'sql')
+# Janela fixa do aproveitamento recente usado no peso do SG
+JANELA_APROVEITAMENTO_SG = 3
+
+
+class AgregadoJanela(NamedTuple):
+    """Resultados de um clube nas últimas N partidas com um mando (pontos de vista do clube)"""
+    jogos: int = 0
+    vitorias: int = 0
+    empates: int = 0
+    derrotas: int = 0
+    gols_pro: int = 0
+    gols_contra: int = 0
+    clean_sheets: int = 0
+
+    @property
+    def aproveitamento(self) -> float:
+        """Pontos conquistados / pontos possíveis (0 sem jogos)"""
+        return (self.vitorias * 3 + self.empates) / (self.jogos * 3) if self.jogos > 0 else 0
+
+    @property
+    def media_gols_pro(self) -> float:
+        return self.gols_pro / self.jogos if self.jogos > 0 else 0
+
+    @property
+    def media_gols_contra(self) -> float:
+        return self.gols_contra / self.jogos if self.jogos > 0 else 0
+
+    @property
+    def saldo_gols(self) -> int:
+        return self.gols_pro - self.gols_contra
+
+
+_VAZIO = AgregadoJanela()
+
+
+class AgregadosJanela:
+    """Agregados indexados por (clube_id, mando, janela)"""
+
+    def __init__(self, valores: Dict[Tuple[int, str, int], AgregadoJanela], janelas: Tuple[int, ...]):
+        self._valores = valores
+        self.janelas = janelas
+
+    def obter(self, clube_id: int, mando: str, janela: int) -> AgregadoJanela:
+        """Agregado do clube (zerado se o clube não tem partidas com o mando)"""
+        if janela not in self.janelas:
+            raise KeyError(f"Janela {janela} não foi carregada (disponíveis: {self.janelas})")
+        return self._valores.get((clube_id, mando, janela), _VAZIO)
+
+    def __len__(self):
+        return len(self._valores)
+
+
+def _normalizar_janelas(janelas: Iterable[int]) -> Tuple[int, ...]:
+    return tuple(sorted({int(j) for j in janelas if int(j) > 0}))
+
+
+def carregar_agregados_janela(cursor, rodada_atual: int, temporada: int, janelas: Iterable[int],
+                              modo: Optional[str] = None, partidas: Optional[TabelaPartidas] = None) -> AgregadosJanela:
+    """
+    Carrega os agregados das últimas N partidas (antes da rodada atual) de todos os clubes
+
+    Args:
+        cursor: Cursor do banco
+        rodada_atual: Rodada atual (consideradas as rodadas até rodada_atual - 1)
+        temporada: Temporada
+        janelas: Tamanhos de janela (N) necessários, ex.: últimas partidas dos perfis
+        modo: 'python' ou 'sql' (padrão: MODO_AGREGACAO)
+        partidas: Tabela de partidas do ciclo (modo python; se None, será carregada)
+    """
+    modo = modo or MODO_AGREGACAO
+    if modo not in MODOS_AGREGACAO:
+        raise ValueError(f"Modo de agregação inválido: {modo} (use {', '.join(MODOS_AGREGACAO)})")
+    janelas = _normalizar_janelas(janelas)
+    if not janelas:
+        return AgregadosJanela({}, janelas)
+
+    if modo == 'sql':
+        valores = _carregar_sql(cursor, rodada_atual, temporada, janelas)
+    else:
+        if partidas is None:
+            partidas = carregar_tabela_partidas(cursor, temporada)
+        valores = agregar_partidas(partidas, rodada_atual, janelas)
+
+    logger.info(f"Agregados por janela carregados (modo {modo}): {len(valores)} clube × mando × janela")
+    return AgregadosJanela(valores, janelas)
+
+
+# Últimas N partidas de todos os clubes × mandos × janelas (parâmetros: rodada, temporada, janelas);
+# também verificada com EXPLAIN em database.verificar_planos
+CONSULTA_AGREGADOS_JANELA = '''
+    WITH jogos AS (
+        SELECT clube_casa_id AS clube_id, 'casa' AS mando, rodada_id, partida_id,
+               placar_oficial_mandante AS gols_pro, placar_oficial_visitante AS gols_contra
+        FROM acf_partidas
+        WHERE valida = TRUE AND rodada_id <= %(rodada)s AND temporada = %(temporada)s
+        AND placar_oficial_mandante IS NOT NULL AND placar_oficial_visitante IS NOT NULL
+        UNION ALL
+        SELECT clube_visitante_id, 'fora', rodada_id, partida_id,
+               placar_oficial_visitante, placar_oficial_mandante
+        FROM acf_partidas
+        WHERE valida = TRUE AND rodada_id <= %(rodada)s AND temporada = %(temporada)s
+        AND placar_oficial_mandante IS NOT NULL AND placar_oficial_visitante IS NOT NULL
+    ),
+    ordenados AS (
+        SELECT jogos.*,
+               ROW_NUMBER() OVER (PARTITION BY clube_id, mando ORDER BY rodada_id DESC, partida_id DESC) AS posicao
+        FROM jogos
+    )
+    SELECT o.clube_id, o.mando, j.janela,
+           COUNT(*),
+           COUNT(*) FILTER (WHERE o.gols_pro > o.gols_contra),
+           COUNT(*) FILTER (WHERE o.gols_pro = o.gols_contra),
+           COUNT(*) FILTER (WHERE o.gols_pro < o.gols_contra),
+           SUM(o.gols_pro),
+           SUM(o.gols_contra),
+           COUNT(*) FILTER (WHERE o.gols_contra = 0)
+    FROM ordenados o
+    JOIN unnest(%(janelas)s::int[]) AS j(janela) ON o.posicao <= j.janela
+    GROUP BY o.clube_id, o.mando, j.janela
+'''
+
+
+def _carregar_sql(cursor, rodada_atual: int, temporada: int, janelas: Tuple[int, ...]):
+    cursor.execute(
+        CONSULTA_AGREGADOS_JANELA,
+        {'rodada': rodada_atual - 1, 'temporada': temporada, 'janelas': list(janelas)}
+    )
+
+    return {
+        (clube_id, mando, janela): AgregadoJanela(*(int(v) for v in valores))
+        for clube_id, mando, janela, *valores in cursor.fetchall()
+    }
+
+
+def agregar_partidas(partidas: TabelaPartidas, rodada_atual: int,
+                     janelas: Tuple[int, ...]) -> Dict[Tuple[int, str, int], AgregadoJanela]:
+    """
+    Agrega as partidas encerradas antes da rodada atual (vetorizado por clube × mando × janela)
+
+    Args:
+        partidas: Tabela de partidas da temporada
+        rodada_atual: Rodada atual (consideradas as rodadas até rodada_atual - 1)
+        janelas: Tamanhos de janela em ordem crescente
+    """
+    # Da mais recente para a mais antiga
+    posicoes = partidas.encerradas(rodada_atual - 1)[::-1]
+    n = len(partidas.clubes)
+
+    valores = {}
+    for mando, clubes_mando in (('casa', partidas.casa), ('fora', partidas.visitante)):
+        # Agrupar por clube mantendo a ordem de recência; posição de cada jogo no histórico do clube
+        ordem = np.argsort(clubes_mando[posicoes], kind='stable')
+        clubes = clubes_mando[posicoes][ordem]
+        pro, contra = partidas.gols_do_ponto_de_vista(posicoes[ordem], mando)
+        recencia = np.arange(len(clubes)) - np.searchsorted(clubes, clubes, side='left')
+
+        for janela in janelas:
+            na_janela = recencia < janela
+            c, p, q = clubes[na_janela], pro[na_janela], contra[na_janela]
+
+            def contar(pesos=None):
+                return np.bincount(c, weights=pesos, minlength=n).astype(np.int64).tolist()
+
+            jogos = contar()
+            vitorias, empates, derrotas = contar(p > q), contar(p == q), contar(p < q)
+            gols_pro, gols_contra, clean_sheets = contar(p), contar(q), contar(q == 0)
+            for i in np.flatnonzero(jogos).tolist():
+                valores[(partidas.clubes.clube(i), mando, janela)] = AgregadoJanela(
+                    jogos[i], vitorias[i], empates[i], derrotas[i], gols_pro[i], gols_contra[i], clean_sheets[i]
+                )
+    return valores
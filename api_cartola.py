@@ -1,8 +1,17 @@
 import requests
+import json
 import logging
+import os
+import random
+import tempfile
+import threading
 import time
 from datetime import datetime
-from config import API_URL_STATUS
+from config import (
+    API_URL_STATUS, STATUS_TIMEOUT_CONEXAO, STATUS_TIMEOUT_LEITURA, STATUS_MAX_TENTATIVAS,
+    STATUS_PRAZO_TOTAL, STATUS_CIRCUITO_FALHAS, STATUS_CIRCUITO_PAUSA, STATUS_ARQUIVO_ULTIMO,
+    STATUS_IDADE_MAXIMA_SEGUNDOS
+)
 
 logger = logging.getLogger(__name__)
 
@@ -11,15 +20,200 @@ _TEMPORADA_CACHE = None
 _TEMPORADA_CACHE_TIMESTAMP = None
 _CACHE_DURATION = 3600  # 1 hora em segundos
 
-def fetch_status_data():
-    """Obtém o status do mercado (não requer autenticação)."""
-    try:
-        response = requests.get(API_URL_STATUS, timeout=10)
+class ClienteStatus:
+    """
+    Cliente do endpoint de status do mercado
+    
+    - Sessão HTTP persistente (reuso de conexão)
+    - Requisições condicionais (ETag / If-Modified-Since): 304 reaproveita o último corpo
+    - Até max_tentativas tentativas com backoff exponencial e jitter, limitadas a prazo_total
+    - Circuit breaker: após circuito_falhas falhas seguidas, não consulta a API por
+      circuito_pausa segundos (responde na hora com o último status válido)
+    - Último status válido persistido em disco, usado como fallback após restart enquanto não
+      for mais antigo que idade_maxima segundos (0 = sem limite)
+    
+    O lock protege só o estado compartilhado (último status, validadores, circuito): requisições
+    e esperas do backoff rodam fora dele, sem bloquear as chamadas de outros jobs.
+    """
+    
+    def __init__(self, url, timeout_conexao=3.0, timeout_leitura=5.0, max_tentativas=3,
+                 prazo_total=10.0, circuito_falhas=5, circuito_pausa=120.0, arquivo_ultimo=None,
+                 idade_maxima=900.0):
+        self.url = url
+        self.timeout = (timeout_conexao, timeout_leitura)
+        self.max_tentativas = max(1, max_tentativas)
+        self.prazo_total = prazo_total
+        self.circuito_falhas = circuito_falhas
+        self.circuito_pausa = circuito_pausa
+        self.arquivo_ultimo = arquivo_ultimo
+        self.idade_maxima = idade_maxima
+        
+        self._sessao = requests.Session()
+        self._sessao.headers.update({'Accept': 'application/json'})
+        self._lock = threading.Lock()
+        self._falhas_seguidas = 0
+        self._circuito_aberto_ate = 0.0
+        
+        # Último status válido (corpo + validadores HTTP)
+        self._ultimo = None
+        self._etag = None
+        self._last_modified = None
+        self._obtido_em = None
+        self._carregar_ultimo()
+    
+    @property
+    def circuito_aberto(self) -> bool:
+        return time.monotonic() < self._circuito_aberto_ate
+    
+    def obter(self):
+        """
+        Retorna o status do mercado
+        
+        Returns:
+            (dados, origem) - origem: 'api', 'nao_modificado', 'ultimo_valido' ou None (sem dados,
+            ou último status válido mais antigo que idade_maxima)
+        """
+        with self._lock:
+            if self.circuito_aberto:
+                logger.warning("Circuito da API de status aberto; usando o último status válido")
+                return self._fallback()
+        
+        inicio = time.monotonic()
+        for tentativa in range(1, self.max_tentativas + 1):
+            try:
+                dados, origem = self._requisitar()
+                with self._lock:
+                    self._falhas_seguidas = 0
+                return dados, origem
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.warning(f"Falha ao consultar a API Cartola (status), tentativa {tentativa}/{self.max_tentativas}: {e}")
+            
+            # Backoff exponencial com jitter completo, sem ultrapassar o prazo total
+            espera = random.uniform(0, min(4.0, 0.5 * 2 ** (tentativa - 1)))
+            if tentativa == self.max_tentativas or time.monotonic() - inicio + espera > self.prazo_total:
+                break
+            time.sleep(espera)
+        
+        with self._lock:
+            self._falhas_seguidas += 1
+            if self._falhas_seguidas >= self.circuito_falhas and not self.circuito_aberto:
+                self._circuito_aberto_ate = time.monotonic() + self.circuito_pausa
+                logger.error(f"API de status falhou {self._falhas_seguidas} vezes seguidas; circuito aberto por {self.circuito_pausa:.0f}s")
+            return self._fallback()
+    
+    def _requisitar(self):
+        cabecalhos = {}
+        with self._lock:
+            ultimo = self._ultimo
+            if ultimo is not None:
+                if self._etag:
+                    cabecalhos['If-None-Match'] = self._etag
+                if self._last_modified:
+                    cabecalhos['If-Modified-Since'] = self._last_modified
+        
+        response = self._sessao.get(self.url, headers=cabecalhos, timeout=self.timeout)
+        if response.status_code == 304 and ultimo is not None:
+            with self._lock:
+                self._obtido_em = time.time()
+            return ultimo, 'nao_modificado'
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Erro ao consultar a API Cartola (status): {e}")
-        return None
+        dados = response.json()
+        if not isinstance(dados, dict):
+            raise ValueError("Resposta de status não é um objeto JSON")
+        
+        with self._lock:
+            self._ultimo = dados
+            self._etag = response.headers.get('ETag')
+            self._last_modified = response.headers.get('Last-Modified')
+            self._obtido_em = time.time()
+            salvo = {
+                'dados': self._ultimo,
+                'etag': self._etag,
+                'last_modified': self._last_modified,
+                'obtido_em': self._obtido_em,
+            }
+        self._salvar_ultimo(salvo)
+        return dados, 'api'
+    
+    def _fallback(self):
+        """Último status válido (chamado com o lock), desde que não passe de idade_maxima"""
+        if self._ultimo is None:
+            return None, None
+        idade = time.time() - (self._obtido_em or 0)
+        if self.idade_maxima and idade > self.idade_maxima:
+            logger.error(f"Último status válido ignorado: obtido há {idade:.0f}s (máximo {self.idade_maxima:.0f}s)")
+            return None, None
+        logger.warning(f"Usando último status válido (obtido há {idade:.0f}s)")
+        return self._ultimo, 'ultimo_valido'
+    
+    def _carregar_ultimo(self):
+        if not self.arquivo_ultimo:
+            return
+        try:
+            with open(self.arquivo_ultimo, 'r', encoding='utf-8') as arquivo:
+                salvo = json.load(arquivo)
+            self._ultimo = salvo['dados']
+            self._etag = salvo.get('etag')
+            self._last_modified = salvo.get('last_modified')
+            self._obtido_em = salvo.get('obtido_em')
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Último status salvo ignorado ({self.arquivo_ultimo}): {e}")
+    
+    def _salvar_ultimo(self, salvo):
+        if not self.arquivo_ultimo:
+            return
+        diretorio = os.path.dirname(os.path.abspath(self.arquivo_ultimo))
+        try:
+            os.makedirs(diretorio, exist_ok=True)
+            fd, temporario = tempfile.mkstemp(prefix='.status_', suffix='.tmp', dir=diretorio)
+            with os.fdopen(fd, 'w', encoding='utf-8') as arquivo:
+                json.dump(salvo, arquivo)
+            os.replace(temporario, self.arquivo_ultimo)
+        except OSError as e:
+            logger.warning(f"Erro ao salvar último status em {self.arquivo_ultimo}: {e}")
+
+_cliente_status = None
+
+def obter_cliente_status() -> ClienteStatus:
+    """Cliente de status do processo (criado na primeira chamada)"""
+    global _cliente_status
+    if _cliente_status is None:
+        _cliente_status = ClienteStatus(
+            API_URL_STATUS,
+            timeout_conexao=STATUS_TIMEOUT_CONEXAO,
+            timeout_leitura=STATUS_TIMEOUT_LEITURA,
+            max_tentativas=STATUS_MAX_TENTATIVAS,
+            prazo_total=STATUS_PRAZO_TOTAL,
+            circuito_falhas=STATUS_CIRCUITO_FALHAS,
+            circuito_pausa=STATUS_CIRCUITO_PAUSA,
+            arquivo_ultimo=STATUS_ARQUIVO_ULTIMO or None,
+            idade_maxima=STATUS_IDADE_MAXIMA_SEGUNDOS,
+        )
+    return _cliente_status
+
+def obter_status_mercado():
+    """Status do mercado com a origem: (dados, origem), como ClienteStatus.obter
+    
+    Com origem 'ultimo_valido' o status veio do fallback (a API falhou): quem detecta mudanças
+    de status (ex.: abertura do mercado) não deve tratá-lo como uma leitura nova.
+    """
+    dados, origem = obter_cliente_status().obter()
+    if dados is None:
+        logger.error("Erro ao consultar a API Cartola (status): sem resposta e sem último status válido recente")
+    return dados, origem
+
+def fetch_status_data():
+    """Obtém o status do mercado (não requer autenticação).
+    
+    Em caso de falha da API, retorna o último status válido se não for mais antigo que
+    STATUS_IDADE_MAXIMA_SEGUNDOS (ou None). Para saber a origem, use obter_status_mercado.
+    """
+    dados, origem = obter_status_mercado()
+    if origem == 'ultimo_valido':
+        logger.warning(f"Status do mercado da rodada {dados.get('rodada_atual')} vem do último status válido (API indisponível)")
+    return dados
 
 def get_temporada_atual() -> int:
     """
@@ -53,3 +247,27 @@ def get_temporada_atual() -> int:
     ano_atual = datetime.now().year
     logger.info(f"Usando ano atual como temporada (fallback): {ano_atual}")
     return ano_atual
+
+def temporada_do_status(status_data) -> int:
+    """
+    Temporada a partir de um status já obtido (sem nova requisição).
+    Também atualiza o cache de get_temporada_atual.
+    Fallback para ano atual se o status não trouxer a temporada.
+    """
+    global _TEMPORADA_CACHE, _TEMPORADA_CACHE_TIMESTAMP
+    
+    if status_data and 'temporada' in status_data:
+        try:
+            temporada = int(status_data['temporada'])
+            _TEMPORADA_CACHE = temporada
+            _TEMPORADA_CACHE_TIMESTAMP = time.time()
+            return temporada
+        except (TypeError, ValueError):
+            logger.error(f"Temporada inválida no status: {status_data['temporada']}")
+    
+    # Sem status: usar a última temporada conhecida ou o ano atual, sem consultar a API
+    if _TEMPORADA_CACHE is not None:
+        return _TEMPORADA_CACHE
+    ano_atual = datetime.now().year
+    logger.info(f"Usando ano atual como temporada (fallback): {ano_atual}")
+    return ano_atual
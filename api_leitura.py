@@ -0,0 +1,360 @@
+"""
+API HTTP de leitura embutida no calculador
+
+Serve peso_jogo e peso_SG de uma rodada para um par de perfis (jogo × SG) a partir de um
+cache em memória atualizado na publicação de cada ciclo. As respostas de todos os pares são
+pré-serializadas (JSON e JSON gzip) com ETag, então uma leitura nunca toca o PostgreSQL.
+
+Endpoints:
+    GET /pesos?perfil_jogo={id}&perfil_sg={id}[&rodada={r}][&temporada={t}]
+        Sem rodada nem temporada, usa a última rodada publicada; só com a temporada, a última
+        rodada da temporada em memória (404 se nenhuma); só com a rodada, a temporada mais recente
+    GET /saude
+    GET /metricas
+        Contadores do calculador (ciclos, estouros de orçamento, perfis obsoletos)
+    GET /calcular?tipo={jogo|sg}&metodo={janela|ewma|ajustado|rating|poisson}&janela={n}[&expoente={e}][&agressividade={a}]
+        Perfil sob demanda calculado dos insumos do último ciclo (ver calculo_sob_demanda.py)
+    GET /cenarios?tipo={jogo|sg}&perfil={id}
+        Sensibilidade dos pesos do perfil na próxima rodada a todas as combinações de resultados
+        da rodada atual (ver cenarios_rodada.py)
+    GET /simulacao?tipo={jogo|sg}&perfil={id}
+        Média e percentis dos pesos do perfil na rodada atual sobre reamostragens bootstrap das
+        últimas partidas de cada clube (ver simulacao_bootstrap.py)
+
+Perfis marcados como obsoletos (obsoleto_jogo / obsoleto_sg) estouraram o orçamento de tempo
+ou falharam no último ciclo e mantêm os pesos da publicação anterior.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+from metricas import metricas
+
+logger = logging.getLogger(__name__)
+
+# Quantas rodadas manter em memória (a atual e a anterior bastam para os consumidores)
+RODADAS_EM_MEMORIA = 2
+
+
+class RespostaPreparada:
+    """Corpo JSON de uma combinação já serializado e comprimido"""
+
+    __slots__ = ('corpo', 'corpo_gzip', 'etag')
+
+    def __init__(self, corpo: bytes):
+        self.corpo = corpo
+        self.corpo_gzip = gzip.compress(corpo, compresslevel=6)
+        self.etag = '"' + hashlib.sha1(corpo).hexdigest()[:20] + '"'
+
+
+class CacheLeitura:
+    """Cache em memória das respostas da API, indexado por (temporada, rodada)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rodadas: Dict[Tuple[int, int], Dict[Tuple[int, int], RespostaPreparada]] = {}
+        self._ultima: Optional[Tuple[int, int]] = None
+
+    def atualizar(self, temporada: int, rodada: int, pesos_jogo: Dict[int, Dict[int, float]],
+                  pesos_sg: Dict[int, Dict[int, float]], obsoletos: Optional[Dict[str, List[int]]] = None):
+        """
+        Pré-serializa as respostas de todas as combinações de perfis da rodada
+
+        Args:
+            temporada: Temporada publicada
+            rodada: Rodada publicada
+            pesos_jogo: {perfil_id: {clube_id: peso_jogo}}
+            pesos_sg: {perfil_id: {clube_id: peso_sg}}
+            obsoletos: {'jogo': [perfil_id], 'sg': [perfil_id]} - perfis com pesos da publicação anterior
+        """
+        obsoletos_jogo = set((obsoletos or {}).get('jogo', ()))
+        obsoletos_sg = set((obsoletos or {}).get('sg', ()))
+        respostas = {}
+        for perfil_jogo, clubes_jogo in pesos_jogo.items():
+            for perfil_sg, clubes_sg in pesos_sg.items():
+                clubes = sorted(set(clubes_jogo) | set(clubes_sg))
+                corpo = json.dumps({
+                    'temporada': temporada,
+                    'rodada': rodada,
+                    'perfil_jogo': perfil_jogo,
+                    'perfil_sg': perfil_sg,
+                    'obsoleto_jogo': perfil_jogo in obsoletos_jogo,
+                    'obsoleto_sg': perfil_sg in obsoletos_sg,
+                    'clubes': [
+                        {
+                            'clube_id': clube_id,
+                            'peso_jogo': clubes_jogo.get(clube_id),
+                            'peso_sg': clubes_sg.get(clube_id),
+                        }
+                        for clube_id in clubes
+                    ],
+                }, separators=(',', ':')).encode('utf-8')
+                respostas[(perfil_jogo, perfil_sg)] = RespostaPreparada(corpo)
+
+        with self._lock:
+            self._rodadas[(temporada, rodada)] = respostas
+            if self._ultima is None or (temporada, rodada) >= self._ultima:
+                self._ultima = (temporada, rodada)
+            # Descartar rodadas antigas
+            for chave in sorted(self._rodadas)[:-RODADAS_EM_MEMORIA]:
+                del self._rodadas[chave]
+
+        logger.info(f"Cache da API de leitura atualizado: rodada {rodada}/{temporada} ({len(respostas)} combinações)")
+
+    def obter(self, perfil_jogo: int, perfil_sg: int, temporada: Optional[int] = None,
+              rodada: Optional[int] = None) -> Optional[RespostaPreparada]:
+        """Retorna a resposta pré-serializada da combinação (ou None se não publicada)"""
+        with self._lock:
+            chave = self._ultima
+            if rodada is not None and chave is not None:
+                chave = (temporada if temporada is not None else chave[0], rodada)
+            elif temporada is not None:
+                # Sem rodada: última rodada da temporada pedida (nunca outra temporada)
+                chave = max((c for c in self._rodadas if c[0] == temporada), default=None)
+            respostas = self._rodadas.get(chave) if chave else None
+        if respostas is None:
+            return None
+        return respostas.get((perfil_jogo, perfil_sg))
+
+    @property
+    def ultima_rodada(self) -> Optional[Tuple[int, int]]:
+        with self._lock:
+            return self._ultima
+
+
+# Cache único do processo, atualizado pela etapa de publicação
+cache_leitura = CacheLeitura()
+
+
+def _aceita_gzip(accept_encoding: Optional[str]) -> bool:
+    """Verifica se o cabeçalho Accept-Encoding aceita gzip (q=0 recusa; '*' vale para gzip)"""
+    qualidades = {}
+    for item in (accept_encoding or '').split(','):
+        codificacao, *parametros = [parte.strip() for parte in item.split(';')]
+        if not codificacao:
+            continue
+        q = 1.0
+        for parametro in parametros:
+            nome, _, valor = parametro.partition('=')
+            if nome.strip().lower() == 'q':
+                try:
+                    q = float(valor)
+                except ValueError:
+                    q = 0.0
+        qualidades[codificacao.lower()] = q
+    q = qualidades.get('gzip', qualidades.get('x-gzip', qualidades.get('*', 0.0)))
+    return q > 0
+
+
+def _etag_confere(if_none_match: Optional[str], etag: str) -> bool:
+    """Verifica o cabeçalho If-None-Match (aceita lista, '*' e ETags fracas)"""
+    if not if_none_match:
+        return False
+    for candidata in if_none_match.split(','):
+        candidata = candidata.strip()
+        if candidata.startswith('W/'):
+            candidata = candidata[2:]
+        if candidata == '*' or candidata == etag:
+            return True
+    return False
+
+
+class _HandlerLeitura(BaseHTTPRequestHandler):
+    """Handler HTTP da API de leitura (somente GET/HEAD)"""
+
+    server_version = 'CartolaCalculador/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    def do_HEAD(self):
+        self._responder(enviar_corpo=False)
+
+    def do_GET(self):
+        self._responder(enviar_corpo=True)
+
+    def _responder(self, enviar_corpo: bool):
+        url = urlparse(self.path)
+
+        if url.path == '/saude':
+            ultima = cache_leitura.ultima_rodada
+            corpo = json.dumps({
+                'status': 'ok' if ultima else 'sem_dados',
+                'temporada': ultima[0] if ultima else None,
+                'rodada': ultima[1] if ultima else None,
+            }).encode('utf-8')
+            self._enviar(200, corpo, 'application/json', enviar_corpo=enviar_corpo)
+            return
+
+        if url.path == '/metricas':
+            corpo = json.dumps(metricas.resumo()).encode('utf-8')
+            self._enviar(200, corpo, 'application/json', {'Cache-Control': 'no-store'}, enviar_corpo)
+            return
+
+        if url.path == '/calcular':
+            self._responder_sob_demanda(url, enviar_corpo)
+            return
+
+        if url.path == '/cenarios':
+            self._responder_cenarios(url, enviar_corpo)
+            return
+
+        if url.path == '/simulacao':
+            self._responder_simulacao(url, enviar_corpo)
+            return
+
+        if url.path != '/pesos':
+            self._enviar_erro(404, 'Recurso não encontrado', enviar_corpo)
+            return
+
+        parametros = parse_qs(url.query)
+        try:
+            perfil_jogo = int(parametros['perfil_jogo'][0])
+            perfil_sg = int(parametros['perfil_sg'][0])
+            rodada = int(parametros['rodada'][0]) if 'rodada' in parametros else None
+            temporada = int(parametros['temporada'][0]) if 'temporada' in parametros else None
+        except (KeyError, ValueError):
+            self._enviar_erro(400, 'Parâmetros obrigatórios: perfil_jogo e perfil_sg (inteiros)', enviar_corpo)
+            return
+
+        resposta = cache_leitura.obter(perfil_jogo, perfil_sg, temporada=temporada, rodada=rodada)
+        if resposta is None:
+            self._enviar_erro(404, 'Combinação não publicada', enviar_corpo)
+            return
+
+        self._enviar_resposta(resposta, {'Cache-Control': 'public, max-age=60'}, enviar_corpo)
+
+    def _responder_sob_demanda(self, url, enviar_corpo: bool):
+        from calculo_sob_demanda import EspecificacaoPerfil, calculador_sob_demanda
+
+        try:
+            especificacao = EspecificacaoPerfil.de_parametros(parse_qs(url.query))
+        except ValueError as e:
+            self._enviar_erro(400, str(e), enviar_corpo)
+            return
+
+        try:
+            resposta, do_cache = calculador_sob_demanda.obter(especificacao)
+        except Exception as e:
+            logger.error(f"Erro ao calcular perfil sob demanda {especificacao}: {e}", exc_info=True)
+            self._enviar_erro(500, 'Erro ao calcular o perfil', enviar_corpo)
+            return
+        if resposta is None:
+            self._enviar_erro(503, 'Insumos do ciclo ainda não disponíveis', enviar_corpo)
+            return
+
+        cabecalhos = {'Cache-Control': 'public, max-age=60', 'X-Cache': 'HIT' if do_cache else 'MISS'}
+        self._enviar_resposta(resposta, cabecalhos, enviar_corpo)
+
+    def _responder_cenarios(self, url, enviar_corpo: bool):
+        from cenarios_rodada import calculador_cenarios
+
+        parametros = parse_qs(url.query)
+        try:
+            tipo = parametros['tipo'][0]
+            perfil_id = int(parametros['perfil'][0])
+            if tipo not in ('jogo', 'sg'):
+                raise ValueError(tipo)
+        except (KeyError, ValueError):
+            self._enviar_erro(400, 'Parâmetros obrigatórios: tipo (jogo ou sg) e perfil (inteiro)', enviar_corpo)
+            return
+
+        try:
+            resposta = calculador_cenarios.obter(tipo, perfil_id)
+        except KeyError:
+            self._enviar_erro(404, f"Perfil {perfil_id} ({tipo}) não registrado", enviar_corpo)
+            return
+        except ValueError as e:
+            self._enviar_erro(422, str(e), enviar_corpo)
+            return
+        except Exception as e:
+            logger.error(f"Erro ao calcular os cenários do perfil {perfil_id} ({tipo}): {e}", exc_info=True)
+            self._enviar_erro(500, 'Erro ao calcular os cenários', enviar_corpo)
+            return
+        if resposta is None:
+            self._enviar_erro(503, 'Insumos do ciclo ainda não disponíveis', enviar_corpo)
+            return
+
+        self._enviar_resposta(resposta, {'Cache-Control': 'public, max-age=60'}, enviar_corpo)
+
+    def _responder_simulacao(self, url, enviar_corpo: bool):
+        from simulacao_bootstrap import calculador_simulacao
+
+        parametros = parse_qs(url.query)
+        try:
+            tipo = parametros['tipo'][0]
+            perfil_id = int(parametros['perfil'][0])
+            if tipo not in ('jogo', 'sg'):
+                raise ValueError(tipo)
+        except (KeyError, ValueError):
+            self._enviar_erro(400, 'Parâmetros obrigatórios: tipo (jogo ou sg) e perfil (inteiro)', enviar_corpo)
+            return
+
+        try:
+            resposta = calculador_simulacao.obter(tipo, perfil_id)
+        except KeyError:
+            self._enviar_erro(404, f"Perfil {perfil_id} ({tipo}) não registrado", enviar_corpo)
+            return
+        except ValueError as e:
+            self._enviar_erro(422, str(e), enviar_corpo)
+            return
+        except Exception as e:
+            logger.error(f"Erro ao simular o perfil {perfil_id} ({tipo}): {e}", exc_info=True)
+            self._enviar_erro(500, 'Erro ao simular o perfil', enviar_corpo)
+            return
+        if resposta is None:
+            self._enviar_erro(503, 'Insumos do ciclo ainda não disponíveis', enviar_corpo)
+            return
+
+        self._enviar_resposta(resposta, {'Cache-Control': 'public, max-age=60'}, enviar_corpo)
+
+    def _enviar_resposta(self, resposta: RespostaPreparada, cabecalhos: Dict[str, str], enviar_corpo: bool):
+        """Envia uma resposta pré-serializada (ETag/304 e gzip conforme os cabeçalhos do pedido)"""
+        cabecalhos = dict(cabecalhos, ETag=resposta.etag, Vary='Accept-Encoding')
+
+        if _etag_confere(self.headers.get('If-None-Match'), resposta.etag):
+            self._enviar(304, b'', None, cabecalhos, enviar_corpo=False)
+            return
+
+        if _aceita_gzip(self.headers.get('Accept-Encoding')):
+            cabecalhos['Content-Encoding'] = 'gzip'
+            self._enviar(200, resposta.corpo_gzip, 'application/json', cabecalhos, enviar_corpo)
+        else:
+            self._enviar(200, resposta.corpo, 'application/json', cabecalhos, enviar_corpo)
+
+    def _enviar_erro(self, codigo: int, mensagem: str, enviar_corpo: bool):
+        corpo = json.dumps({'erro': mensagem}).encode('utf-8')
+        self._enviar(codigo, corpo, 'application/json', enviar_corpo=enviar_corpo)
+
+    def _enviar(self, codigo: int, corpo: bytes, content_type: Optional[str],
+                cabecalhos: Optional[Dict[str, str]] = None, enviar_corpo: bool = True):
+        self.send_response(codigo)
+        if content_type:
+            self.send_header('Content-Type', content_type)
+        for nome, valor in (cabecalhos or {}).items():
+            self.send_header(nome, valor)
+        self.send_header('Content-Length', str(len(corpo) if codigo != 304 else 0))
+        self.end_headers()
+        if enviar_corpo and codigo != 304:
+            self.wfile.write(corpo)
+
+    def log_message(self, format, *args):
+        # Milhares de leituras por segundo: não poluir o log com cada requisição
+        logger.debug("%s - %s" % (self.address_string(), format % args))
+
+
+def iniciar_api_leitura(host: str, porta: int) -> ThreadingHTTPServer:
+    """
+    Inicia a API de leitura em uma thread daemon
+
+    Returns:
+        Instância do servidor (use shutdown() para parar)
+    """
+    servidor = ThreadingHTTPServer((host, porta), _HandlerLeitura)
+    servidor.daemon_threads = True
+    thread = threading.Thread(target=servidor.serve_forever, name='api-leitura', daemon=True)
+    thread.start()
+    logger.info(f"API de leitura escutando em http://{host}:{porta}")
+    return servidor
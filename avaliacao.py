@@ -0,0 +1,135 @@
+"""
+Avaliação dos perfis contra os resultados reais das rodadas já disputadas
+
+    peso do jogo: taxa de acerto do favorito (sinal do peso do mandante × resultado),
+                  desconsiderando empates
+    peso do SG:   AUC do peso_sg como preditor de clean sheet (probabilidade de um clube que
+                  não sofreu gols ter peso maior que um que sofreu)
+"""
+import logging
+from typing import Dict, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+def calcular_auc(scores: Sequence[float], positivos: Sequence[bool]) -> float:
+    """AUC (Mann-Whitney) com ranks médios para empates; None sem as duas classes"""
+    n_pos = sum(1 for p in positivos if p)
+    n_neg = len(positivos) - n_pos
+    if n_pos == 0 or n_neg == 0:
+        return None
+
+    ordem = sorted(range(len(scores)), key=lambda i: scores[i])
+    ranks = [0.0] * len(scores)
+    i = 0
+    while i < len(ordem):
+        j = i
+        while j + 1 < len(ordem) and scores[ordem[j + 1]] == scores[ordem[i]]:
+            j += 1
+        rank_medio = (i + j) / 2 + 1
+        for k in range(i, j + 1):
+            ranks[ordem[k]] = rank_medio
+        i = j + 1
+
+    soma_ranks_pos = sum(r for r, p in zip(ranks, positivos) if p)
+    return (soma_ranks_pos - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg)
+
+
+def avaliar_peso_jogo(cursor, temporada: int, rodada_inicial: int, rodada_final: int) -> Dict[int, Dict]:
+    """
+    Taxa de acerto de cada perfil de peso do jogo nas rodadas do intervalo
+
+    Returns:
+        {perfil_id: {'partidas', 'empates', 'acertos', 'taxa_acerto'}}
+    """
+    cursor.execute('''
+        SELECT pj.perfil_id, pj.peso_jogo, p.placar_oficial_mandante, p.placar_oficial_visitante
+        FROM acp_peso_jogo_perfis pj
+        JOIN acf_partidas p ON p.clube_casa_id = pj.clube_id AND p.rodada_id = pj.rodada_atual
+            AND p.temporada = pj.temporada AND p.valida = TRUE
+        WHERE pj.temporada = %s AND pj.rodada_atual BETWEEN %s AND %s
+        AND p.placar_oficial_mandante IS NOT NULL AND p.placar_oficial_visitante IS NOT NULL
+    ''', (temporada, rodada_inicial, rodada_final))
+
+    resultado: Dict[int, Dict] = {}
+    for perfil_id, peso, gols_mandante, gols_visitante in cursor.fetchall():
+        metricas = resultado.setdefault(perfil_id, {'partidas': 0, 'empates': 0, 'acertos': 0})
+        metricas['partidas'] += 1
+        if gols_mandante == gols_visitante:
+            metricas['empates'] += 1
+        elif (peso > 0) == (gols_mandante > gols_visitante):
+            metricas['acertos'] += 1
+
+    for metricas in resultado.values():
+        decididas = metricas['partidas'] - metricas['empates']
+        metricas['taxa_acerto'] = metricas['acertos'] / decididas if decididas > 0 else None
+    return resultado
+
+
+def avaliar_peso_sg(cursor, temporada: int, rodada_inicial: int, rodada_final: int) -> Dict[int, Dict]:
+    """
+    AUC de cada perfil de peso do SG como preditor de clean sheet nas rodadas do intervalo
+
+    Returns:
+        {perfil_id: {'clubes', 'clean_sheets', 'auc'}}
+    """
+    cursor.execute('''
+        SELECT ps.perfil_id, ps.peso_sg,
+               CASE WHEN p.clube_casa_id = ps.clube_id
+                    THEN p.placar_oficial_visitante ELSE p.placar_oficial_mandante END AS gols_sofridos
+        FROM acp_peso_sg_perfis ps
+        JOIN acf_partidas p ON (p.clube_casa_id = ps.clube_id OR p.clube_visitante_id = ps.clube_id)
+            AND p.rodada_id = ps.rodada_atual AND p.temporada = ps.temporada AND p.valida = TRUE
+        WHERE ps.temporada = %s AND ps.rodada_atual BETWEEN %s AND %s
+        AND p.placar_oficial_mandante IS NOT NULL AND p.placar_oficial_visitante IS NOT NULL
+    ''', (temporada, rodada_inicial, rodada_final))
+
+    por_perfil: Dict[int, List] = {}
+    for perfil_id, peso_sg, gols_sofridos in cursor.fetchall():
+        por_perfil.setdefault(perfil_id, []).append((float(peso_sg), gols_sofridos == 0))
+
+    resultado = {}
+    for perfil_id, linhas in por_perfil.items():
+        scores = [peso for peso, _ in linhas]
+        positivos = [clean_sheet for _, clean_sheet in linhas]
+        resultado[perfil_id] = {
+            'clubes': len(linhas),
+            'clean_sheets': sum(positivos),
+            'auc': calcular_auc(scores, positivos),
+        }
+    return resultado
+
+
+def exibir_avaliacao(avaliacao_jogo: Dict[int, Dict], avaliacao_sg: Dict[int, Dict]):
+    """Exibe as métricas no log, no mesmo formato tabular dos rankings"""
+    logger.info(f"\n{'='*70}")
+    logger.info("AVALIAÇÃO - PESO DO JOGO (acerto do favorito, sem empates)")
+    logger.info(f"{'='*70}")
+    logger.info(f"{'Perfil':<8} {'Partidas':<10} {'Empates':<10} {'Acertos':<10} {'Taxa':<10}")
+    for perfil_id in sorted(avaliacao_jogo):
+        m = avaliacao_jogo[perfil_id]
+        taxa = f"{m['taxa_acerto']:.1%}" if m['taxa_acerto'] is not None else '-'
+        logger.info(f"{perfil_id:<8} {m['partidas']:<10} {m['empates']:<10} {m['acertos']:<10} {taxa:<10}")
+
+    logger.info(f"\n{'='*70}")
+    logger.info("AVALIAÇÃO - PESO DO SG (AUC para clean sheet)")
+    logger.info(f"{'='*70}")
+    logger.info(f"{'Perfil':<8} {'Clubes':<10} {'SG':<10} {'AUC':<10}")
+    for perfil_id in sorted(avaliacao_sg):
+        m = avaliacao_sg[perfil_id]
+        auc = f"{m['auc']:.3f}" if m['auc'] is not None else '-'
+        logger.info(f"{perfil_id:<8} {m['clubes']:<10} {m['clean_sheets']:<10} {auc:<10}")
+
+
+def exibir_grade_elo(avaliacao_grade: List[Dict], limite: int = 10):
+    """Exibe as melhores configurações da grade ELO (ajustar_grade), menor Brier primeiro"""
+    logger.info(f"\n{'='*70}")
+    logger.info("AVALIAÇÃO - GRADE ELO (expectativa do mandante)")
+    logger.info(f"{'='*70}")
+    logger.info(f"{'K':<8} {'Divisor':<10} {'Mando':<10} {'Brier':<10} {'Log-loss':<10} {'Brier (mando)':<14} {'Log-loss (mando)':<16}")
+    for a in avaliacao_grade[:limite]:
+        c = a['configuracao']
+        logger.info(
+            f"{c.k_factor:<8g} {c.divisor:<10g} {c.vantagem_casa:<10g} {a['brier']:<10.4f} {a['log_loss']:<10.4f} "
+            f"{a['brier_mando']:<14.4f} {a['log_loss_mando']:<16.4f}"
+        )
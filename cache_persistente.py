@@ -0,0 +1,199 @@
+"""
+Cache persistente entre ciclos para resultados intermediários
+
+Guarda em disco (SQLite local) valores caros de recalcular — matriz de setores, tabela de
+classificação por rodada e ratings por rodada — com chaves derivadas do hash do conteúdo
+das entradas. Um ciclo sem mudança nos dados (ou um restart do container) reaproveita os
+valores em vez de recalculá-los. O tamanho total é limitado com despejo LRU.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from config import CACHE_DIR, CACHE_MAX_MB
+
+logger = logging.getLogger(__name__)
+
+NOME_ARQUIVO = 'cache_calculador.sqlite3'
+# Versão do formato dos valores: incrementar quando o cálculo de algum valor cacheado mudar
+VERSAO_CACHE = 1
+
+
+def gerar_chave(namespace: str, *partes) -> str:
+    """Chave do cache: namespace + hash das partes que identificam as entradas do cálculo"""
+    conteudo = '|'.join(str(parte) for parte in (VERSAO_CACHE, namespace) + partes)
+    return f"{namespace}:{hashlib.sha256(conteudo.encode('utf-8')).hexdigest()}"
+
+
+class CachePersistente:
+    """Armazenamento chave → valor (pickle) em SQLite com limite de tamanho e despejo LRU"""
+
+    def __init__(self, diretorio: str, max_bytes: int):
+        os.makedirs(diretorio, exist_ok=True)
+        self.caminho = os.path.join(diretorio, NOME_ARQUIVO)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.caminho, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS entradas (
+                chave TEXT PRIMARY KEY,
+                valor BLOB NOT NULL,
+                tamanho INTEGER NOT NULL,
+                ultimo_acesso REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_entradas_acesso ON entradas(ultimo_acesso)')
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter(self, chave: str) -> Optional[Any]:
+        """Retorna o valor (ou None) e marca o acesso para a política LRU"""
+        with self._lock:
+            linha = self._conn.execute('SELECT valor FROM entradas WHERE chave = ?', (chave,)).fetchone()
+            if linha is None:
+                self.falhas += 1
+                return None
+            self._conn.execute('UPDATE entradas SET ultimo_acesso = ? WHERE chave = ?', (time.time(), chave))
+            self.acertos += 1
+        try:
+            return pickle.loads(linha[0])
+        except Exception as e:
+            logger.warning(f"Entrada de cache corrompida ({chave}): {e}")
+            self.remover(chave)
+            return None
+
+    def gravar(self, chave: str, valor: Any):
+        """Grava o valor e despeja as entradas menos usadas se o limite for excedido"""
+        dados = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(dados) > self.max_bytes:
+            logger.debug(f"Valor maior que o limite do cache, não armazenado: {chave}")
+            return
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO entradas (chave, valor, tamanho, ultimo_acesso) VALUES (?, ?, ?, ?)',
+                (chave, sqlite3.Binary(dados), len(dados), time.time())
+            )
+            self._despejar()
+
+    def remover(self, chave: str):
+        with self._lock:
+            self._conn.execute('DELETE FROM entradas WHERE chave = ?', (chave,))
+
+    def _despejar(self):
+        total = self._conn.execute('SELECT COALESCE(SUM(tamanho), 0) FROM entradas').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        removidos = 0
+        for chave, tamanho in self._conn.execute(
+            'SELECT chave, tamanho FROM entradas ORDER BY ultimo_acesso'
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute('DELETE FROM entradas WHERE chave = ?', (chave,))
+            total -= tamanho
+            removidos += 1
+        logger.debug(f"Cache persistente: {removidos} entradas despejadas (LRU)")
+
+    def obter_ou_calcular(self, chave: str, calcular: Callable[[], Any]) -> Any:
+        """Retorna o valor cacheado ou calcula, grava e retorna"""
+        valor = self.obter(chave)
+        if valor is not None:
+            return valor
+        valor = calcular()
+        if valor is not None:
+            try:
+                self.gravar(chave, valor)
+            except (sqlite3.Error, pickle.PicklingError) as e:
+                logger.warning(f"Erro ao gravar no cache persistente: {e}")
+        return valor
+
+
+_CACHE: Optional[CachePersistente] = None
+_CACHE_INICIALIZADO = False
+_CACHE_LOCK = threading.Lock()
+
+
+def obter_cache() -> Optional[CachePersistente]:
+    """Cache do processo (None se desabilitado ou se o diretório não puder ser usado)"""
+    global _CACHE, _CACHE_INICIALIZADO
+    if _CACHE_INICIALIZADO:
+        return _CACHE
+    with _CACHE_LOCK:
+        if not _CACHE_INICIALIZADO:
+            if CACHE_DIR:
+                try:
+                    _CACHE = CachePersistente(CACHE_DIR, CACHE_MAX_MB * 1024 * 1024)
+                    logger.info(f"Cache persistente em {_CACHE.caminho} (limite {CACHE_MAX_MB} MB)")
+                except (OSError, sqlite3.Error) as e:
+                    logger.warning(f"Cache persistente desabilitado ({CACHE_DIR}): {e}")
+            _CACHE_INICIALIZADO = True
+    return _CACHE
+
+
+def cacheado(namespace: str, impressao: Optional[str], partes: tuple, calcular: Callable[[], Any]) -> Any:
+    """
+    Aplica o cache persistente a um cálculo
+
+    Sem impressão dos dados (ou com o cache desabilitado), apenas calcula.
+
+    Args:
+        namespace: Tipo do valor (ex.: 'setores', 'tabela', 'ratings')
+        impressao: Hash do conteúdo dos dados de entrada
+        partes: Demais parâmetros que identificam o cálculo (rodada, temporada...)
+        calcular: Função sem argumentos que produz o valor
+    """
+    cache = obter_cache()
+    if cache is None or not impressao:
+        return calcular()
+    return cache.obter_ou_calcular(gerar_chave(namespace, impressao, *partes), calcular)
+
+
+def calcular_impressoes(cursor, temporada: int) -> Dict[str, str]:
+    """
+    Calcula no banco o hash do conteúdo dos dados de entrada dos cálculos
+
+    Returns:
+        {'partidas': hash das partidas da temporada (+ clubes),
+         'atletas': hash dos atletas status 7,
+         'atletas_provaveis': hash dos atletas prováveis}
+    """
+    cursor.execute('''
+        SELECT
+            (SELECT md5(COALESCE(string_agg(
+                concat_ws(',', partida_id, rodada_id, clube_casa_id, clube_visitante_id,
+                          placar_oficial_mandante, placar_oficial_visitante, valida),
+                ';' ORDER BY partida_id), ''))
+             FROM acf_partidas WHERE temporada = %s),
+            (SELECT md5(COALESCE(string_agg(id::text, ',' ORDER BY id), '')) FROM acf_clubes),
+            (SELECT md5(COALESCE(string_agg(
+                concat_ws(',', atleta_id, clube_id, posicao_id, media_num, jogos_num),
+                ';' ORDER BY atleta_id), ''))
+             FROM acf_atletas WHERE status_id = 7)
+    ''', (temporada,))
+    partidas, clubes, atletas = cursor.fetchone()
+
+    impressoes = {
+        'partidas': f"{partidas}:{clubes}",
+        'atletas': atletas,
+    }
+
+    cursor.execute("SELECT to_regclass('provaveis_cartola') IS NOT NULL")
+    if cursor.fetchone()[0]:
+        cursor.execute('''
+            SELECT md5(COALESCE(string_agg(
+                concat_ws(',', a.atleta_id, a.clube_id, a.posicao_id, a.media_num, a.jogos_num),
+                ';' ORDER BY a.atleta_id), ''))
+            FROM acf_atletas a
+            JOIN provaveis_cartola p ON a.atleta_id = p.atleta_id
+            WHERE p.status = 'provavel'
+        ''')
+        impressoes['atletas_provaveis'] = cursor.fetchone()[0]
+
+    return impressoes
@@ -3,42 +3,148 @@ Cálculo de peso do jogo baseado em sistema de rating (ELO)
 Usa a diferença de rating entre os times para determinar o peso
 """
 import logging
-import math
+import numpy as np
 from psycopg2.extras import execute_values
-from database import get_db_connection
+from database import get_db_connection, ERROS_PRAZO
 from calculo_rating import (
-    calcular_ratings_historicos,
+    configuracao_elo,
+    modo_rating_perfil,
     calcular_rating_recente,
     calcular_diferenca_rating_peso
 )
-from calculo_peso_jogo import calculate_team_sector_analysis
+from motor_setores import carregar_matriz_setores
+from modelo_dados import carregar_tabela_partidas
+from motor_elo import replay_grade
 from api_cartola import get_temporada_atual
 
 logger = logging.getLogger(__name__)
 
-def calculate_peso_jogo_for_profile_rating(conn, rodada_atual, perfil, usar_provaveis_cartola=False, cache_setores=None):
+def peso_rating_confronto(rating_casa, rating_visitante, razoes):
+    """Peso do jogo do mandante a partir dos ratings recentes e das razões dos setores
+    
+    Aceita ratings escalares ou arrays (motor de cenários: um rating por cenário).
+    """
+    # Calcular peso baseado na diferença de rating
+    peso_base_rating = calcular_diferenca_rating_peso(rating_casa, rating_visitante)
+    
+    # Média dos ratios (ajuste fino)
+    ratio_ata, ratio_mei, ratio_def = razoes
+    fator_setores = ((ratio_ata + ratio_mei + ratio_def) / 3.0) - 1.0  # Centralizar em 0
+    fator_setores = fator_setores * 0.3  # Reduzir impacto (20% do ajuste, menos que antes)
+    
+    # Peso final: rating + ajuste fino de setores
+    # O peso base do rating já é calculado e deve ser o principal
+    peso_final = peso_base_rating + fator_setores
+    
+    # Para rating, usar expoente menos agressivo para manter valores maiores
+    # Usar expoente 2/3 (menos redução) para manter valores mais altos
+    # Isso mantém os valores mais próximos da escala original do rating
+    expoente = 2/3  # Sempre usar 2/3 para rating (menos agressivo que 1/2)
+    
+    # Aplicar expoente para suavizar diferenças (com o sinal da diferença)
+    return np.sign(peso_final) * np.abs(peso_final) ** expoente
+
+def calcular_pesos_rating(partidas, tabela_partidas, rodada_atual, ultimas_partidas, matriz_setores, grade_elo,
+                          configuracao, modo_rating='geral', contexto=None, log_progresso=True):
+    """Peso do jogo por rating de cada clube nas partidas da rodada (sem acesso ao banco)
+    
+    Args:
+        partidas: [(partida_id, casa_id, casa_nome, visitante_id, visitante_nome)]
+        tabela_partidas: Tabela de partidas da temporada (TabelaPartidas)
+        rodada_atual: Rodada atual
+        ultimas_partidas: Janela do rating recente
+        matriz_setores: Matriz clube × setor do ciclo
+        grade_elo: Replay em lote (GradeElo) que contém a configuração
+        configuracao: Parâmetros do ELO (ConfiguracaoElo)
+        modo_rating: 'geral' ou 'mando'
+        contexto: ContextoCiclo (pontos de cancelamento por orçamento de tempo)
+        log_progresso: Se deve registrar o progresso no log
+    
+    Returns:
+        [(clube_id, peso_jogo)]
+    """
+    # Modo 'mando': componente de mandante do clube da casa contra o de visitante do adversário
+    if modo_rating == 'mando':
+        historico_casa = grade_elo.historico_mando(configuracao, 'casa')
+        historico_fora = grade_elo.historico_mando(configuracao, 'fora')
+    else:
+        historico_casa = historico_fora = grade_elo.historico(configuracao)
+    
+    updates = []  # (clube_id, peso)
+    
+    for idx, partida in enumerate(partidas, 1):
+        partida_id, casa_id, casa_nome, visitante_id, visitante_nome = partida
+        # Ponto de cancelamento cooperativo (orçamento de tempo do ciclo/perfil)
+        if contexto is not None:
+            contexto.verificar_prazo()
+        if log_progresso and (idx % 5 == 0 or idx == len(partidas)):
+            logger.info(f"  Processando partida {idx}/{len(partidas)}: {casa_nome} vs {visitante_nome}")
+        
+        # Calcular rating recente da casa (como mandante)
+        rating_casa = calcular_rating_recente(
+            None, casa_id, rodada_atual, None, ultimas_partidas,
+            como_mandante=True, partidas=tabela_partidas, historico_ratings=historico_casa,
+            configuracao=configuracao, historico_adversarios=historico_fora
+        )
+        
+        # Calcular rating recente do visitante (como visitante)
+        rating_visitante = calcular_rating_recente(
+            None, visitante_id, rodada_atual, None, ultimas_partidas,
+            como_mandante=False, partidas=tabela_partidas, historico_ratings=historico_fora,
+            configuracao=configuracao, historico_adversarios=historico_casa
+        )
+        
+        # Razões dos setores (matriz compartilhada do ciclo)
+        peso_final = peso_rating_confronto(
+            rating_casa, rating_visitante, matriz_setores.razoes(casa_id, visitante_id)
+        )
+        
+        updates.append((casa_id, float(peso_final)))
+        updates.append((visitante_id, float(-peso_final)))
+    
+    return updates
+
+def calculate_peso_jogo_for_profile_rating(conn, rodada_atual, perfil, usar_provaveis_cartola=False, matriz_setores=None, impressoes=None,
+                                           partidas=None, grade_elo=None, contexto=None):
     """Calcula peso do jogo baseado em ratings (ELO) para um perfil específico
     
     Args:
         conn: Conexão com banco
         rodada_atual: Rodada atual
-        perfil: Dicionário com id, ultimas_partidas, descricao
+        perfil: Dicionário com id, ultimas_partidas, descricao (e opcionalmente os parâmetros do ELO
+            e modo_rating: 'geral' ou 'mando')
         usar_provaveis_cartola: Se deve usar prováveis do Cartola
-        cache_setores: Cache compartilhado de análises de setores {(clube_id, tuple(posicoes)): score_final}
+        matriz_setores: Matriz clube × setor compartilhada do ciclo (se None, será calculada)
+        impressoes: Hashes dos dados de entrada do ciclo (habilitam o cache persistente de ratings)
+        partidas: Tabela de partidas da temporada do ciclo (TabelaPartidas; se None, será carregada)
+        grade_elo: Replay em lote do ciclo (GradeElo); se não tiver a configuração do perfil, o replay é feito aqui
+        contexto: ContextoCiclo (temporada e impressões do ciclo; se None, consulta get_temporada_atual)
     """
     cursor = conn.cursor()
     perfil_id = perfil['id']
     ultimas_partidas = perfil['ultimas_partidas']
-    temporada_atual = get_temporada_atual()
-    
-    # Usar cache compartilhado se fornecido, senão criar novo
-    if cache_setores is None:
-        cache_setores = {}
+    configuracao = configuracao_elo(perfil)
+    modo_rating = modo_rating_perfil(perfil)
+    temporada_atual = contexto.temporada if contexto else get_temporada_atual()
+    if impressoes is None and contexto is not None:
+        impressoes = contexto.impressoes
+    impressao_partidas = (impressoes or {}).get('partidas')
     
     try:
-        # Calcular ratings históricos uma vez para toda a rodada
-        logger.info(f"Calculando ratings históricos até rodada {rodada_atual - 1} da temporada {temporada_atual}")
-        ratings_historicos = calcular_ratings_historicos(cursor, rodada_atual, temporada_atual)
+        # Usar matriz de setores compartilhada se fornecida, senão calcular
+        if matriz_setores is None:
+            matriz_setores = carregar_matriz_setores(cursor, usar_provaveis_cartola)
+        
+        # Partidas da temporada em arrays (uma consulta, ou a tabela do ciclo)
+        # (nome próprio: "partidas" abaixo são as partidas da rodada atual)
+        tabela_partidas = partidas
+        if tabela_partidas is None:
+            tabela_partidas = carregar_tabela_partidas(cursor, temporada_atual, impressao_partidas)
+        
+        # Calcular ratings históricos (antes de cada rodada) uma vez para toda a rodada
+        logger.info(f"Calculando ratings históricos ({modo_rating}) até rodada {rodada_atual - 1} da temporada {temporada_atual}")
+        if grade_elo is None or configuracao not in grade_elo:
+            grade_elo = replay_grade(tabela_partidas, rodada_atual, [configuracao])
         
         # Obter partidas da rodada atual
         cursor.execute('''
@@ -57,79 +163,10 @@ def calculate_peso_jogo_for_profile_rating(conn, rodada_atual, perfil, usar_prov
         
         logger.info(f"Calculando peso do jogo (RATING) - Perfil {perfil_id} ({ultimas_partidas} ultimas partidas) - {len(partidas)} partidas")
         
-        updates = []  # (clube_id, peso)
-        
-        for idx, partida in enumerate(partidas, 1):
-            partida_id, casa_id, casa_nome, visitante_id, visitante_nome = partida
-            if idx % 5 == 0 or idx == len(partidas):
-                logger.info(f"  Processando partida {idx}/{len(partidas)}: {casa_nome} vs {visitante_nome}")
-            
-            # Calcular rating recente da casa (como mandante)
-            rating_casa = calcular_rating_recente(
-                cursor, casa_id, rodada_atual, temporada_atual, ultimas_partidas,
-                como_mandante=True, ratings_historicos=ratings_historicos
-            )
-            
-            # Calcular rating recente do visitante (como visitante)
-            rating_visitante = calcular_rating_recente(
-                cursor, visitante_id, rodada_atual, temporada_atual, ultimas_partidas,
-                como_mandante=False, ratings_historicos=ratings_historicos
-            )
-            
-            # Calcular peso baseado na diferença de rating
-            peso_base_rating = calcular_diferenca_rating_peso(rating_casa, rating_visitante)
-            
-            # Opcional: Ajustar com análise de setores (para manter alguma consistência com o método original)
-            # Mas com peso menor, já que o rating já captura muito da força dos times
-            sectors = {'ata': [5], 'mei': [4], 'def': [1, 2, 3]}
-            analises = {'casa': {}, 'visitante': {}}
-            
-            for sector, posicoes in sectors.items():
-                pos_key_casa = (casa_id, tuple(posicoes))
-                pos_key_visitante = (visitante_id, tuple(posicoes))
-                
-                if pos_key_casa not in cache_setores:
-                    analises['casa'][sector] = calculate_team_sector_analysis(
-                        cursor, casa_id, posicoes, usar_provaveis_cartola
-                    )
-                    cache_setores[pos_key_casa] = analises['casa'][sector]['score_final']
-                else:
-                    analises['casa'][sector] = {'score_final': cache_setores[pos_key_casa]}
-                
-                if pos_key_visitante not in cache_setores:
-                    analises['visitante'][sector] = calculate_team_sector_analysis(
-                        cursor, visitante_id, posicoes, usar_provaveis_cartola
-                    )
-                    cache_setores[pos_key_visitante] = analises['visitante'][sector]['score_final']
-                else:
-                    analises['visitante'][sector] = {'score_final': cache_setores[pos_key_visitante]}
-            
-            # Calcular fator de ajuste baseado em setores (peso menor, apenas como refinamento)
-            ratio_ata = math.pow(analises['casa']['ata']['score_final'] / analises['visitante']['ata']['score_final'], 1/3)
-            ratio_mei = math.pow(analises['casa']['mei']['score_final'] / analises['visitante']['mei']['score_final'], 1/3)
-            ratio_def = math.pow(analises['casa']['def']['score_final'] / analises['visitante']['def']['score_final'], 1/3)
-            
-            # Média dos ratios (ajuste fino)
-            fator_setores = ((ratio_ata + ratio_mei + ratio_def) / 3.0) - 1.0  # Centralizar em 0
-            fator_setores = fator_setores * 0.3  # Reduzir impacto (20% do ajuste, menos que antes)
-            
-            # Peso final: rating + ajuste fino de setores
-            # O peso base do rating já é calculado e deve ser o principal
-            peso_final = peso_base_rating + fator_setores
-            
-            # Para rating, usar expoente menos agressivo para manter valores maiores
-            # Usar expoente 2/3 (menos redução) para manter valores mais altos
-            # Isso mantém os valores mais próximos da escala original do rating
-            expoente = 2/3  # Sempre usar 2/3 para rating (menos agressivo que 1/2)
-            
-            # Aplicar expoente para suavizar diferenças
-            if peso_final >= 0:
-                peso_final = peso_final ** expoente
-            else:
-                peso_final = -((-peso_final) ** expoente)
-            
-            updates.append((casa_id, float(peso_final)))
-            updates.append((visitante_id, float(-peso_final)))
+        updates = calcular_pesos_rating(
+            partidas, tabela_partidas, rodada_atual, ultimas_partidas, matriz_setores,
+            grade_elo, configuracao, modo_rating, contexto
+        )
         
         # Salvar no banco de dados na tabela de perfis
         if updates:
@@ -161,9 +198,14 @@ def calculate_peso_jogo_for_profile_rating(conn, rodada_atual, perfil, usar_prov
             conn.commit()
             logger.info(f"  Perfil {perfil_id} de peso do jogo (RATING) salvo: {len(updates)} clubes")
             
+    except ERROS_PRAZO:
+        # Estouro de orçamento: a família mantém os pesos anteriores do perfil
+        conn.rollback()
+        raise
     except Exception as e:
         conn.rollback()
         logger.error(f"Erro ao calcular peso do jogo (RATING) para perfil {perfil_id}: {e}", exc_info=True)
+        raise
     finally:
         cursor.close()
 
@@ -1,19 +1,186 @@
 import logging
+import numpy as np
 from psycopg2.extras import execute_values
-from psycopg2.extras import execute_values
-from database import get_db_connection
+from database import get_db_connection, ERROS_PRAZO
+from motor_setores import carregar_agregados_provaveis, calcular_fator_jogadores
+from agregados_janela import carregar_agregados_janela, JANELA_APROVEITAMENTO_SG
 from api_cartola import get_temporada_atual
 
 logger = logging.getLogger(__name__)
 
-def calculate_peso_sg_for_profile(conn, rodada_atual, perfil, usar_provaveis_cartola=False):
-    """Calcula peso do SG para um perfil específico"""
+def peso_sg_confronto(historico_casa, historico_visitante, aproveitamento_casa, aproveitamento_visitante,
+                      fator_jogadores_casa=0.5, fator_jogadores_visitante=0.5, agressividade='brando'):
+    """Pesos brutos do SG (sem normalizar) do mandante e do visitante de uma partida
+    
+    Aceita agregados com campos escalares ou arrays (simulação: um agregado por amostra); o número de
+    jogos dos agregados é sempre escalar.
+    
+    Returns:
+        (peso_sg_casa, peso_sg_visitante)
+    """
+    total_partidas_casa = historico_casa.jogos
+    media_gols_sofridos_casa = historico_casa.media_gols_contra
+    media_gols_feitos_casa = historico_casa.media_gols_pro
+    total_partidas_visitante_sofr = historico_visitante.jogos
+    media_gols_sofridos_visitante = historico_visitante.media_gols_contra
+    media_gols_feitos_visitante = historico_visitante.media_gols_pro
+    
+    # Calcular clean sheets
+    clean_sheets_casa = historico_casa.clean_sheets
+    clean_sheets_visitante = historico_visitante.clean_sheets
+    
+    # Fatores do SG
+    fator_clean_sheets_casa = clean_sheets_casa / total_partidas_casa if total_partidas_casa > 0 else 0
+    fator_clean_sheets_visitante = clean_sheets_visitante / total_partidas_visitante_sofr if total_partidas_visitante_sofr > 0 else 0
+    
+    fator_defesa_casa = np.maximum(0, 1 - (media_gols_sofridos_casa / 3.0))
+    fator_defesa_visitante = np.maximum(0, 1 - (media_gols_sofridos_visitante / 3.0))
+    
+    fator_ataque_adversario_casa = np.maximum(0, 1 - (media_gols_feitos_visitante / 3.0))
+    fator_ataque_adversario_visitante = np.maximum(0, 1 - (media_gols_feitos_casa / 3.0))
+    
+    fator_aproveitamento_casa = aproveitamento_casa
+    fator_aproveitamento_visitante = aproveitamento_visitante
+    
+    # SG composto - ajustar pesos conforme agressividade do perfil
+    if agressividade == 'agressivo':
+        # Agressivo: mais peso em clean sheets e defesa (fatores mais determinantes)
+        peso_clean_sheets = 0.3
+        peso_defesa = 0.3
+        peso_ataque_adversario = 0.15
+        peso_aproveitamento = 0.1
+        peso_jogadores = 0.15
+    else:
+        # Brando: pesos mais equilibrados (distribuição uniforme)
+        peso_clean_sheets = 0.2
+        peso_defesa = 0.2
+        peso_ataque_adversario = 0.2
+        peso_aproveitamento = 0.1
+        peso_jogadores = 0.3
+    
+    peso_sg_casa = (
+        peso_clean_sheets * fator_clean_sheets_casa +
+        peso_defesa * fator_defesa_casa +
+        peso_ataque_adversario * fator_ataque_adversario_casa +
+        peso_aproveitamento * fator_aproveitamento_casa +
+        peso_jogadores * fator_jogadores_casa
+    )
+    
+    peso_sg_visitante = (
+        peso_clean_sheets * fator_clean_sheets_visitante +
+        peso_defesa * fator_defesa_visitante +
+        peso_ataque_adversario * fator_ataque_adversario_visitante +
+        peso_aproveitamento * fator_aproveitamento_visitante +
+        peso_jogadores * fator_jogadores_visitante
+    )
+    
+    return peso_sg_casa, peso_sg_visitante
+
+def calcular_pesos_sg(partidas, agregados, ultimas_partidas, agressividade='brando', agregados_provaveis=None,
+                      usar_provaveis_cartola=False, contexto=None, log_progresso=True, normalizar=True):
+    """Peso do SG (normalizado entre 0.1 e 1.0) de cada clube nas partidas da rodada (sem acesso ao banco)
+    
+    Args:
+        partidas: [(partida_id, casa_id, casa_nome, visitante_id, visitante_nome)]
+        agregados: AgregadosJanela ou EstadoForma com ultimas_partidas e JANELA_APROVEITAMENTO_SG
+        ultimas_partidas: Janela (ou meia-vida) do perfil
+        agressividade: 'brando' ou 'agressivo'
+        agregados_provaveis: Médias de defesa/ataque dos prováveis (com usar_provaveis_cartola)
+        usar_provaveis_cartola: Se deve usar prováveis do Cartola no fator de jogadores
+        contexto: ContextoCiclo (pontos de cancelamento por orçamento de tempo)
+        log_progresso: Se deve registrar o progresso no log
+        normalizar: Se False, devolve os pesos brutos (a normalização depende de todos os clubes da rodada)
+    
+    Returns:
+        [(clube_id, peso_sg)]
+    """
+    updates = []  # (clube_id, peso_sg)
+    
+    for idx, partida in enumerate(partidas, 1):
+        partida_id, casa_id, casa_nome, visitante_id, visitante_nome = partida
+        # Ponto de cancelamento cooperativo (orçamento de tempo do ciclo/perfil)
+        if contexto is not None:
+            contexto.verificar_prazo()
+        if log_progresso and (idx % 5 == 0 or idx == len(partidas)):
+            logger.info(f"  Processando partida {idx}/{len(partidas)}: {casa_nome} vs {visitante_nome}")
+        
+        # Histórico da casa como mandante e do visitante como visitante (agregados do ciclo)
+        historico_casa = agregados.obter(casa_id, 'casa', ultimas_partidas)
+        historico_visitante = agregados.obter(visitante_id, 'fora', ultimas_partidas)
+        
+        # Calcular aproveitamento recente (últimas 3 partidas)
+        aproveitamento_casa = agregados.obter(casa_id, 'casa', JANELA_APROVEITAMENTO_SG).aproveitamento
+        aproveitamento_visitante = agregados.obter(visitante_id, 'fora', JANELA_APROVEITAMENTO_SG).aproveitamento
+        
+        # Fator de jogadores prováveis (simplificado - pode ser expandido)
+        fator_jogadores_casa = 0.5
+        fator_jogadores_visitante = 0.5
+        
+        if usar_provaveis_cartola:
+            fator_jogadores_casa = calcular_fator_jogadores(agregados_provaveis, casa_id, visitante_id)
+            fator_jogadores_visitante = calcular_fator_jogadores(agregados_provaveis, visitante_id, casa_id)
+        
+        peso_sg_casa, peso_sg_visitante = peso_sg_confronto(
+            historico_casa, historico_visitante, aproveitamento_casa, aproveitamento_visitante,
+            fator_jogadores_casa, fator_jogadores_visitante, agressividade
+        )
+        
+        updates.append((casa_id, float(peso_sg_casa)))
+        updates.append((visitante_id, float(peso_sg_visitante)))
+    
+    # Normalizar valores
+    if not updates or not normalizar:
+        return updates
+    normalizados = normalizar_pesos_sg([peso for _, peso in updates])
+    return [(clube_id, peso) for (clube_id, _), peso in zip(updates, normalizados.tolist())]
+
+def normalizar_pesos_sg(valores):
+    """Normaliza os pesos do SG da rodada entre 0.1 e 1.0 (0.5 se todos iguais)
+    
+    Args:
+        valores: Pesos brutos dos clubes da rodada; em um array 2D, cada linha é uma rodada
+            (motor de cenários: uma linha por cenário)
+    
+    Returns:
+        Array com a mesma forma de valores
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    min_sg = valores.min(axis=-1, keepdims=True)
+    amplitude = valores.max(axis=-1, keepdims=True) - min_sg
+    with np.errstate(divide='ignore', invalid='ignore'):
+        normalized = (valores - min_sg) / amplitude
+    return np.where(amplitude > 0, 0.1 + (normalized * 0.9), 0.5)
+
+def calculate_peso_sg_for_profile(conn, rodada_atual, perfil, usar_provaveis_cartola=False, agregados_provaveis=None,
+                                  agregados=None, contexto=None):
+    """Calcula peso do SG para um perfil específico
+    
+    Args:
+        conn: Conexão com banco
+        rodada_atual: Rodada atual
+        perfil: Dicionário com id, ultimas_partidas, agressividade, descricao
+        usar_provaveis_cartola: Se deve usar prováveis do Cartola no fator de jogadores
+        agregados_provaveis: Médias de defesa/ataque dos prováveis do ciclo (se None, serão carregadas)
+        agregados: Agregados por janela do ciclo (AgregadosJanela, ou EstadoForma nos perfis EWMA;
+            se None, serão carregados)
+        contexto: ContextoCiclo (temporada do ciclo; se None, consulta get_temporada_atual)
+    """
     cursor = conn.cursor()
     perfil_id = perfil['id']
     ultimas_partidas = perfil['ultimas_partidas']
-    temporada_atual = get_temporada_atual()
+    temporada_atual = contexto.temporada if contexto else get_temporada_atual()
     
     try:
+        # Agregados de prováveis de todos os clubes (uma consulta por ciclo)
+        if usar_provaveis_cartola and agregados_provaveis is None:
+            agregados_provaveis = carregar_agregados_provaveis(cursor)
+        
+        # Agregados das últimas partidas de todos os clubes (uma consulta)
+        if agregados is None:
+            agregados = carregar_agregados_janela(
+                cursor, rodada_atual, temporada_atual, [ultimas_partidas, JANELA_APROVEITAMENTO_SG]
+            )
+        
         # Obter partidas da rodada atual
         cursor.execute('''
             SELECT p.partida_id, p.clube_casa_id, c1.nome_fantasia AS casa_nome, 
@@ -31,239 +198,12 @@ def calculate_peso_sg_for_profile(conn, rodada_atual, perfil, usar_provaveis_car
         
         logger.info(f"Calculando peso do SG - Perfil {perfil_id} ({ultimas_partidas} ultimas partidas) - {len(partidas)} partidas")
         
-        updates = []  # (clube_id, peso_sg)
-        
-        for idx, partida in enumerate(partidas, 1):
-            partida_id, casa_id, casa_nome, visitante_id, visitante_nome = partida
-            if idx % 5 == 0 or idx == len(partidas):
-                logger.info(f"  Processando partida {idx}/{len(partidas)}: {casa_nome} vs {visitante_nome}")
-            
-            # Calcular gols sofridos pela casa como mandante
-            query_gols_sofridos_casa = '''
-                SELECT placar_oficial_visitante
-                FROM acf_partidas
-                WHERE clube_casa_id = %s AND valida = TRUE AND rodada_id <= %s AND temporada = %s
-                AND placar_oficial_visitante IS NOT NULL
-                ORDER BY rodada_id DESC
-                LIMIT %s
-            '''
-            params = (casa_id, rodada_atual - 1, temporada_atual, ultimas_partidas)
-            
-            cursor.execute(query_gols_sofridos_casa, params)
-            gols_sofridos_casa = cursor.fetchall()
-            total_gols_sofridos_casa = sum(gols[0] for gols in gols_sofridos_casa)
-            total_partidas_casa = len(gols_sofridos_casa)
-            media_gols_sofridos_casa = total_gols_sofridos_casa / total_partidas_casa if total_partidas_casa > 0 else 0
-            
-            # Calcular gols feitos pelo visitante como visitante
-            query_gols_feitos_visitante = '''
-                SELECT placar_oficial_visitante
-                FROM acf_partidas
-                WHERE clube_visitante_id = %s AND valida = TRUE AND rodada_id <= %s AND temporada = %s
-                AND placar_oficial_visitante IS NOT NULL
-                ORDER BY rodada_id DESC
-                LIMIT %s
-            '''
-            params = (visitante_id, rodada_atual - 1, temporada_atual, ultimas_partidas)
-            
-            cursor.execute(query_gols_feitos_visitante, params)
-            gols_feitos_visitante = cursor.fetchall()
-            total_gols_feitos_visitante = sum(gols[0] for gols in gols_feitos_visitante)
-            total_partidas_visitante = len(gols_feitos_visitante)
-            media_gols_feitos_visitante = total_gols_feitos_visitante / total_partidas_visitante if total_partidas_visitante > 0 else 0
-            
-            # Calcular gols sofridos pelo visitante como visitante
-            query_gols_sofridos_visitante = '''
-                SELECT placar_oficial_mandante
-                FROM acf_partidas
-                WHERE clube_visitante_id = %s AND valida = TRUE AND rodada_id <= %s AND temporada = %s
-                AND placar_oficial_mandante IS NOT NULL
-                ORDER BY rodada_id DESC
-                LIMIT %s
-            '''
-            params = (visitante_id, rodada_atual - 1, temporada_atual, ultimas_partidas)
-            
-            cursor.execute(query_gols_sofridos_visitante, params)
-            gols_sofridos_visitante = cursor.fetchall()
-            total_gols_sofridos_visitante = sum(gols[0] for gols in gols_sofridos_visitante)
-            total_partidas_visitante_sofr = len(gols_sofridos_visitante)
-            media_gols_sofridos_visitante = total_gols_sofridos_visitante / total_partidas_visitante_sofr if total_partidas_visitante_sofr > 0 else 0
-            
-            # Calcular gols feitos pela casa como mandante
-            query_gols_feitos_casa = '''
-                SELECT placar_oficial_mandante
-                FROM acf_partidas
-                WHERE clube_casa_id = %s AND valida = TRUE AND rodada_id <= %s AND temporada = %s
-                AND placar_oficial_mandante IS NOT NULL
-                ORDER BY rodada_id DESC
-                LIMIT %s
-            '''
-            params = (casa_id, rodada_atual - 1, temporada_atual, ultimas_partidas)
-            
-            cursor.execute(query_gols_feitos_casa, params)
-            gols_feitos_casa = cursor.fetchall()
-            total_gols_feitos_casa = sum(gols[0] for gols in gols_feitos_casa)
-            total_partidas_casa_feitos = len(gols_feitos_casa)
-            media_gols_feitos_casa = total_gols_feitos_casa / total_partidas_casa_feitos if total_partidas_casa_feitos > 0 else 0
-            
-            # Calcular clean sheets
-            clean_sheets_casa = sum(1 for gols in gols_sofridos_casa if gols[0] == 0)
-            clean_sheets_visitante = sum(1 for gols in gols_sofridos_visitante if gols[0] == 0)
-            
-            # Calcular aproveitamento recente (últimas 3 partidas)
-            cursor.execute('''
-                SELECT placar_oficial_mandante, placar_oficial_visitante
-                FROM acf_partidas
-                WHERE clube_casa_id = %s AND valida = TRUE AND rodada_id <= %s AND temporada = %s
-                AND placar_oficial_mandante IS NOT NULL
-                ORDER BY rodada_id DESC
-                LIMIT 3
-            ''', (casa_id, rodada_atual - 1, temporada_atual))
-            partidas_casa = cursor.fetchall()
-            
-            cursor.execute('''
-                SELECT placar_oficial_mandante, placar_oficial_visitante
-                FROM acf_partidas
-                WHERE clube_visitante_id = %s AND valida = TRUE AND rodada_id <= %s AND temporada = %s
-                AND placar_oficial_mandante IS NOT NULL
-                ORDER BY rodada_id DESC
-                LIMIT 3
-            ''', (visitante_id, rodada_atual - 1, temporada_atual))
-            partidas_visitante = cursor.fetchall()
-            
-            pontos_casa = 0
-            for partida in partidas_casa:
-                placar_mandante, placar_visitante = partida
-                if placar_mandante > placar_visitante:
-                    pontos_casa += 3
-                elif placar_mandante == placar_visitante:
-                    pontos_casa += 1
-            
-            pontos_visitante = 0
-            for partida in partidas_visitante:
-                placar_mandante, placar_visitante = partida
-                if placar_visitante > placar_mandante:
-                    pontos_visitante += 3
-                elif placar_visitante == placar_mandante:
-                    pontos_visitante += 1
-            
-            aproveitamento_casa = pontos_casa / (len(partidas_casa) * 3) if partidas_casa else 0
-            aproveitamento_visitante = pontos_visitante / (len(partidas_visitante) * 3) if partidas_visitante else 0
-            
-            # Fatores do SG
-            fator_clean_sheets_casa = clean_sheets_casa / total_partidas_casa if total_partidas_casa > 0 else 0
-            fator_clean_sheets_visitante = clean_sheets_visitante / total_partidas_visitante_sofr if total_partidas_visitante_sofr > 0 else 0
-            
-            fator_defesa_casa = max(0, 1 - (media_gols_sofridos_casa / 3.0))
-            fator_defesa_visitante = max(0, 1 - (media_gols_sofridos_visitante / 3.0))
-            
-            fator_ataque_adversario_casa = max(0, 1 - (media_gols_feitos_visitante / 3.0))
-            fator_ataque_adversario_visitante = max(0, 1 - (media_gols_feitos_casa / 3.0))
-            
-            fator_aproveitamento_casa = aproveitamento_casa
-            fator_aproveitamento_visitante = aproveitamento_visitante
-            
-            # Fator de jogadores prováveis (simplificado - pode ser expandido)
-            fator_jogadores_casa = 0.5
-            fator_jogadores_visitante = 0.5
-            
-            if usar_provaveis_cartola:
-                posicoes_defesa = [1, 2, 3, 6]
-                
-                cursor.execute('''
-                    SELECT AVG(a.media_num) as media_defesa, COUNT(*) as total_jogadores
-                    FROM acf_atletas a
-                    JOIN provaveis_cartola p ON a.atleta_id = p.atleta_id
-                    WHERE a.clube_id = %s AND a.posicao_id = ANY(%s) AND p.status = 'provavel'
-                ''', (casa_id, posicoes_defesa))
-                defesa_casa = cursor.fetchone()
-                
-                cursor.execute('''
-                    SELECT AVG(a.media_num) as media_ataque, COUNT(*) as total_jogadores
-                    FROM acf_atletas a
-                    JOIN provaveis_cartola p ON a.atleta_id = p.atleta_id
-                    WHERE a.clube_id = %s AND a.posicao_id IN (4, 5) AND p.status = 'provavel'
-                ''', (visitante_id,))
-                ataque_visitante = cursor.fetchone()
-                
-                cursor.execute('''
-                    SELECT AVG(a.media_num) as media_defesa, COUNT(*) as total_jogadores
-                    FROM acf_atletas a
-                    JOIN provaveis_cartola p ON a.atleta_id = p.atleta_id
-                    WHERE a.clube_id = %s AND a.posicao_id = ANY(%s) AND p.status = 'provavel'
-                ''', (visitante_id, posicoes_defesa))
-                defesa_visitante = cursor.fetchone()
-                
-                cursor.execute('''
-                    SELECT AVG(a.media_num) as media_ataque, COUNT(*) as total_jogadores
-                    FROM acf_atletas a
-                    JOIN provaveis_cartola p ON a.atleta_id = p.atleta_id
-                    WHERE a.clube_id = %s AND a.posicao_id IN (4, 5) AND p.status = 'provavel'
-                ''', (casa_id,))
-                ataque_casa = cursor.fetchone()
-                
-                if defesa_casa and defesa_casa[0] and ataque_visitante and ataque_visitante[0]:
-                    fator_jogadores_casa = max(0.1, min(1.0, 
-                        (defesa_casa[0] / 10.0) - (ataque_visitante[0] / 10.0) + 0.5
-                    ))
-                
-                if defesa_visitante and defesa_visitante[0] and ataque_casa and ataque_casa[0]:
-                    fator_jogadores_visitante = max(0.1, min(1.0, 
-                        (defesa_visitante[0] / 10.0) - (ataque_casa[0] / 10.0) + 0.5
-                    ))
-            
-            # SG composto - ajustar pesos conforme agressividade do perfil
-            agressividade = perfil.get('agressividade', 'brando')
-            
-            if agressividade == 'agressivo':
-                # Agressivo: mais peso em clean sheets e defesa (fatores mais determinantes)
-                peso_clean_sheets = 0.3
-                peso_defesa = 0.3
-                peso_ataque_adversario = 0.15
-                peso_aproveitamento = 0.1
-                peso_jogadores = 0.15
-            else:
-                # Brando: pesos mais equilibrados (distribuição uniforme)
-                peso_clean_sheets = 0.2
-                peso_defesa = 0.2
-                peso_ataque_adversario = 0.2
-                peso_aproveitamento = 0.1
-                peso_jogadores = 0.3
-            
-            peso_sg_casa = (
-                peso_clean_sheets * fator_clean_sheets_casa +
-                peso_defesa * fator_defesa_casa +
-                peso_ataque_adversario * fator_ataque_adversario_casa +
-                peso_aproveitamento * fator_aproveitamento_casa +
-                peso_jogadores * fator_jogadores_casa
-            )
-            
-            peso_sg_visitante = (
-                peso_clean_sheets * fator_clean_sheets_visitante +
-                peso_defesa * fator_defesa_visitante +
-                peso_ataque_adversario * fator_ataque_adversario_visitante +
-                peso_aproveitamento * fator_aproveitamento_visitante +
-                peso_jogadores * fator_jogadores_visitante
-            )
-            
-            updates.append((casa_id, peso_sg_casa))
-            updates.append((visitante_id, peso_sg_visitante))
+        updates_normalizados = calcular_pesos_sg(
+            partidas, agregados, ultimas_partidas, perfil.get('agressividade', 'brando'),
+            agregados_provaveis, usar_provaveis_cartola, contexto
+        )
         
-        # Normalizar valores
-        if updates:
-            sg_values = [peso for _, peso in updates]
-            min_sg = min(sg_values)
-            max_sg = max(sg_values)
-            
-            updates_normalizados = []
-            for clube_id, peso_sg in updates:
-                if max_sg > min_sg:
-                    normalized = (peso_sg - min_sg) / (max_sg - min_sg)
-                    peso_sg_normalizado = 0.1 + (normalized * 0.9)
-                else:
-                    peso_sg_normalizado = 0.5
-                updates_normalizados.append((clube_id, peso_sg_normalizado))
-            
+        if updates_normalizados:
             # Deletar registros antigos do perfil para esta rodada
             cursor.execute('''
                 DELETE FROM acp_peso_sg_perfis 
@@ -292,9 +232,14 @@ def calculate_peso_sg_for_profile(conn, rodada_atual, perfil, usar_provaveis_car
             conn.commit()
             logger.info(f"  Perfil {perfil_id} de peso do SG salvo: {len(updates_normalizados)} clubes")
             
+    except ERROS_PRAZO:
+        # Estouro de orçamento: a família mantém os pesos anteriores do perfil
+        conn.rollback()
+        raise
     except Exception as e:
         conn.rollback()
         logger.error(f"Erro ao calcular peso do SG para perfil {perfil_id}: {e}", exc_info=True)
+        raise
     finally:
         cursor.close()
 
@@ -0,0 +1,150 @@
+"""
+Peso do SG pelo modelo de Poisson (Dixon-Coles): probabilidade de clean sheet de cada clube na rodada
+
+O peso parte da probabilidade (0 a 1) de o clube não sofrer gols, pelas forças de ataque e defesa
+por mando ajustadas à temporada (modelo_poisson), e é normalizado entre 0.1 e 1.0 como nos demais
+métodos de SG (normalizar_pesos_sg). A probabilidade fica na coluna prob_clean_sheet.
+"""
+import logging
+import numpy as np
+from psycopg2.extras import execute_values
+from database import ERROS_PRAZO
+from api_cartola import get_temporada_atual
+from modelo_dados import carregar_tabela_partidas
+from modelo_poisson import ajustar_poisson
+from calculo_peso_sg import normalizar_pesos_sg
+
+logger = logging.getLogger(__name__)
+
+def calcular_pesos_sg_poisson(partidas, tabela_partidas, modelo, contexto=None, log_progresso=True, normalizar=True):
+    """Peso do SG de cada clube nas partidas da rodada pela probabilidade de clean sheet, sem acesso ao banco
+    
+    Args:
+        partidas: [(partida_id, casa_id, casa_nome, visitante_id, visitante_nome)]
+        tabela_partidas: Tabela de partidas da temporada (índice de clubes do modelo)
+        modelo: ModeloPoisson da meia-vida do perfil
+        contexto: ContextoCiclo (pontos de cancelamento por orçamento de tempo)
+        log_progresso: Se deve registrar o progresso no log
+        normalizar: Se False, retorna a probabilidade de clean sheet sem normalizar
+    
+    Returns:
+        [(clube_id, peso_sg)]
+    """
+    if not partidas:
+        return []
+    if contexto is not None:
+        contexto.verificar_prazo()
+    
+    # Todas as partidas da rodada de uma vez: P(adversário não marcar) = exp(-gols esperados do adversário)
+    # (clube sem partidas na temporada: forças médias, iguais a 1)
+    clubes = tabela_partidas.clubes
+    casa = np.array([clubes.get(p[1]) for p in partidas])
+    visitante = np.array([clubes.get(p[3]) for p in partidas])
+    gols_casa, gols_visitante = modelo.gols_esperados(np.maximum(casa, 0), np.maximum(visitante, 0))
+    gols_casa = np.where((casa < 0) | (visitante < 0), modelo.base_casa, gols_casa)
+    gols_visitante = np.where((casa < 0) | (visitante < 0), modelo.base_fora, gols_visitante)
+    sg_casa, sg_visitante = np.exp(-gols_visitante), np.exp(-gols_casa)
+    
+    updates = []  # (clube_id, peso_sg)
+    for idx, partida in enumerate(partidas, 1):
+        partida_id, casa_id, casa_nome, visitante_id, visitante_nome = partida
+        if log_progresso and (idx % 5 == 0 or idx == len(partidas)):
+            logger.info(f"  Processando partida {idx}/{len(partidas)}: {casa_nome} vs {visitante_nome} "
+                        f"(gols esperados {gols_casa[idx - 1]:.2f} x {gols_visitante[idx - 1]:.2f})")
+        updates.append((casa_id, float(sg_casa[idx - 1])))
+        updates.append((visitante_id, float(sg_visitante[idx - 1])))
+    
+    if not normalizar:
+        return updates
+    normalizados = normalizar_pesos_sg([peso for _, peso in updates])
+    return [(clube_id, peso) for (clube_id, _), peso in zip(updates, normalizados.tolist())]
+
+def calculate_peso_sg_for_profile_poisson(conn, rodada_atual, perfil, partidas=None, modelos=None, contexto=None):
+    """Calcula peso do SG (probabilidade de clean sheet do modelo de Poisson, normalizada) para um perfil específico
+    
+    Args:
+        conn: Conexão com banco
+        rodada_atual: Rodada atual
+        perfil: Dicionário com id, ultimas_partidas (meia-vida, em rodadas), descricao
+        partidas: Tabela de partidas da temporada do ciclo (TabelaPartidas; se None, será carregada)
+        modelos: Modelos de Poisson do ciclo (ModelosPoisson); sem a meia-vida do perfil, o ajuste é feito aqui
+        contexto: ContextoCiclo (temporada do ciclo; se None, consulta get_temporada_atual)
+    """
+    cursor = conn.cursor()
+    perfil_id = perfil['id']
+    meia_vida = perfil['ultimas_partidas']
+    temporada_atual = contexto.temporada if contexto else get_temporada_atual()
+    impressao_partidas = contexto.impressoes.get('partidas') if contexto is not None else None
+    
+    try:
+        # Partidas da temporada em arrays (uma consulta, ou a tabela do ciclo)
+        # (nome próprio: "partidas" abaixo são as partidas da rodada atual)
+        tabela_partidas = partidas
+        if tabela_partidas is None:
+            tabela_partidas = carregar_tabela_partidas(cursor, temporada_atual, impressao_partidas)
+        
+        if modelos is not None and meia_vida in modelos.meias_vidas:
+            modelo = modelos.obter(meia_vida)
+        else:
+            modelo = ajustar_poisson(tabela_partidas, rodada_atual, meia_vida)
+        
+        # Obter partidas da rodada atual
+        cursor.execute('''
+            SELECT p.partida_id, p.clube_casa_id, c1.nome_fantasia AS casa_nome, 
+                   p.clube_visitante_id, c2.nome_fantasia AS visitante_nome
+            FROM acf_partidas p
+            JOIN acf_clubes c1 ON p.clube_casa_id = c1.id
+            JOIN acf_clubes c2 ON p.clube_visitante_id = c2.id
+            WHERE p.rodada_id = %s AND p.temporada = %s AND p.valida = TRUE
+        ''', (rodada_atual, temporada_atual))
+        partidas = cursor.fetchall()
+        
+        if not partidas:
+            logger.warning(f"Nenhuma partida encontrada para rodada {rodada_atual}")
+            return
+        
+        logger.info(f"Calculando peso do SG (POISSON) - Perfil {perfil_id} (meia-vida {meia_vida} rodadas) - {len(partidas)} partidas")
+        
+        probabilidades = calcular_pesos_sg_poisson(partidas, tabela_partidas, modelo, contexto, normalizar=False)
+        
+        if probabilidades:
+            normalizados = normalizar_pesos_sg([prob for _, prob in probabilidades])
+            # Deletar registros antigos do perfil para esta rodada
+            cursor.execute('''
+                DELETE FROM acp_peso_sg_perfis 
+                WHERE perfil_id = %s AND rodada_atual = %s AND temporada = %s
+            ''', (perfil_id, rodada_atual, temporada_atual))
+            
+            # Inserir novos valores
+            insert_data = [
+                (perfil_id, rodada_atual, clube_id, peso_sg, prob, meia_vida, temporada_atual)
+                for (clube_id, prob), peso_sg in zip(probabilidades, normalizados.tolist())
+            ]
+            
+            execute_values(
+                cursor,
+                '''
+                INSERT INTO acp_peso_sg_perfis (perfil_id, rodada_atual, clube_id, peso_sg, prob_clean_sheet,
+                                                ultimas_partidas, temporada)
+                VALUES %s
+                ON CONFLICT (perfil_id, rodada_atual, clube_id, temporada) 
+                DO UPDATE SET peso_sg = EXCLUDED.peso_sg, prob_clean_sheet = EXCLUDED.prob_clean_sheet, created_at = NOW()
+                ''',
+                insert_data,
+                template=None,
+                page_size=1000
+            )
+            
+            conn.commit()
+            logger.info(f"  Perfil {perfil_id} de peso do SG (POISSON) salvo: {len(probabilidades)} clubes")
+            
+    except ERROS_PRAZO:
+        # Estouro de orçamento: a família mantém os pesos anteriores do perfil
+        conn.rollback()
+        raise
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erro ao calcular peso do SG (POISSON) para perfil {perfil_id}: {e}", exc_info=True)
+        raise
+    finally:
+        cursor.close()
@@ -1,37 +1,65 @@
 """
 Módulo para calcular ratings dos times estilo ELO (FIDE)
 Todos os times começam com 1000 pontos e o rating é atualizado a cada partida
+
+O replay da temporada é feito pelo motor em lote (motor_elo.py). Perfis de rating podem
+definir os parâmetros do ELO: k_factor, divisor_elo e vantagem_casa (padrão: 20, 400 e 0), e o
+modo_rating: 'geral' (um rating por clube) ou 'mando' (componentes separados de mandante e de
+visitante, calculados na mesma passada do replay).
 """
 import logging
-from typing import Dict, Tuple, Optional
+from typing import Dict, Optional
+
+import numpy as np
+
+from cache_persistente import cacheado
+from modelo_dados import TabelaPartidas, carregar_tabela_partidas
+from motor_elo import (
+    RATING_INICIAL, K_FACTOR, DIVISOR_ELO, MODOS_RATING, ConfiguracaoElo, CONFIGURACAO_PADRAO, replay_grade
+)
 
 logger = logging.getLogger(__name__)
 
-# Constantes do sistema ELO
-RATING_INICIAL = 1000
-K_FACTOR = 20  # Fator de ajuste (quanto maior, mais rápido o rating muda)
-DIVISOR_ELO = 400  # Divisor padrão do ELO
 
-def calcular_rating_esperado(rating_time: float, rating_adversario: float) -> float:
+def configuracao_elo(perfil: Dict) -> ConfiguracaoElo:
+    """Parâmetros do ELO de um perfil de rating (padrões para as chaves ausentes)"""
+    return ConfiguracaoElo(
+        float(perfil.get('k_factor', K_FACTOR)),
+        float(perfil.get('divisor_elo', DIVISOR_ELO)),
+        float(perfil.get('vantagem_casa', 0.0)),
+    )
+
+
+def modo_rating_perfil(perfil: Dict) -> str:
+    """Modo de rating do perfil ('geral' se ausente)"""
+    modo = perfil.get('modo_rating', 'geral')
+    if modo not in MODOS_RATING:
+        raise ValueError(f"modo_rating inválido no perfil {perfil.get('id')}: {modo} (use {', '.join(MODOS_RATING)})")
+    return modo
+
+
+def calcular_rating_esperado(rating_time: float, rating_adversario: float, divisor: float = DIVISOR_ELO) -> float:
     """
     Calcula a probabilidade esperada de vitória baseada nos ratings
     
     Args:
         rating_time: Rating do time
         rating_adversario: Rating do adversário
+        divisor: Divisor do ELO (padrão 400)
     
     Returns:
         Probabilidade esperada (0.0-1.0)
     """
     diferenca = rating_adversario - rating_time
-    return 1.0 / (1.0 + (10 ** (diferenca / DIVISOR_ELO)))
+    return 1.0 / (1.0 + (10 ** (diferenca / divisor)))
 
 
 def atualizar_rating(
     rating_atual: float,
     rating_adversario: float,
     resultado: float,  # 1.0 = vitória, 0.5 = empate, 0.0 = derrota
-    k_factor: float = K_FACTOR
+    k_factor: float = K_FACTOR,
+    divisor: float = DIVISOR_ELO
 ) -> float:
     """
     Atualiza o rating após uma partida
@@ -41,16 +69,19 @@ def atualizar_rating(
         rating_adversario: Rating do adversário
         resultado: 1.0 para vitória, 0.5 para empate, 0.0 para derrota
         k_factor: Fator de ajuste (padrão 20)
+        divisor: Divisor do ELO (padrão 400)
     
     Returns:
         Novo rating
     """
-    rating_esperado = calcular_rating_esperado(rating_atual, rating_adversario)
+    rating_esperado = calcular_rating_esperado(rating_atual, rating_adversario, divisor)
     novo_rating = rating_atual + k_factor * (resultado - rating_esperado)
     return novo_rating
 
 
-def calcular_ratings_historicos(cursor, rodada_atual: int, ano: int) -> Dict[int, float]:
+def calcular_ratings_historicos(cursor, rodada_atual: int, ano: int, impressao: Optional[str] = None,
+                                partidas: Optional[TabelaPartidas] = None,
+                                configuracao: ConfiguracaoElo = CONFIGURACAO_PADRAO) -> Dict[int, float]:
     """
     Calcula os ratings de todos os times considerando todas as partidas até a rodada atual
     
@@ -60,74 +91,38 @@ def calcular_ratings_historicos(cursor, rodada_atual: int, ano: int) -> Dict[int
         cursor: Cursor do banco de dados
         rodada_atual: Rodada atual (calcula até rodada_atual - 1)
         ano: Ano da temporada
+        impressao: Hash dos dados de partidas; quando informado, usa o cache persistente
+        partidas: Tabela de partidas do ciclo (se None, será carregada)
+        configuracao: Parâmetros do ELO
     
     Returns:
         Dicionário {clube_id: rating_atual}
     """
-    # Buscar todas as partidas válidas até a rodada anterior em ordem cronológica
-    cursor.execute('''
-        SELECT 
-            rodada_id,
-            clube_casa_id,
-            clube_visitante_id,
-            placar_oficial_mandante,
-            placar_oficial_visitante
-        FROM acf_partidas
-        WHERE valida = TRUE 
-        AND rodada_id < %s
-        AND temporada = %s
-        AND placar_oficial_mandante IS NOT NULL  
-        AND placar_oficial_visitante IS NOT NULL
-        ORDER BY rodada_id, partida_id
-    ''', (rodada_atual, ano))
-    
-    partidas = cursor.fetchall()
-    
-    # Inicializar ratings de todos os times
-    ratings = {}
-    
-    # Primeiro, identificar todos os times
-    cursor.execute('''
-        SELECT DISTINCT id FROM acf_clubes
-    ''')
-    todos_clubes = cursor.fetchall()
-    
-    for (clube_id,) in todos_clubes:
-        ratings[clube_id] = RATING_INICIAL
-    
-    # Processar partidas em ordem cronológica
-    for rodada_id, casa_id, visitante_id, placar_casa, placar_visitante in partidas:
-        # Garantir que os times existem no dicionário
-        if casa_id not in ratings:
-            ratings[casa_id] = RATING_INICIAL
-        if visitante_id not in ratings:
-            ratings[visitante_id] = RATING_INICIAL
-        
-        # Obter ratings atuais
-        rating_casa = ratings[casa_id]
-        rating_visitante = ratings[visitante_id]
-        
-        # Determinar resultado
-        if placar_casa > placar_visitante:
-            # Vitória da casa
-            resultado_casa = 1.0
-            resultado_visitante = 0.0
-        elif placar_casa < placar_visitante:
-            # Vitória do visitante
-            resultado_casa = 0.0
-            resultado_visitante = 1.0
-        else:
-            # Empate
-            resultado_casa = 0.5
-            resultado_visitante = 0.5
-        
-        # Atualizar ratings
-        ratings[casa_id] = atualizar_rating(rating_casa, rating_visitante, resultado_casa)
-        ratings[visitante_id] = atualizar_rating(rating_visitante, rating_casa, resultado_visitante)
+    def calcular():
+        tabela = partidas if partidas is not None else carregar_tabela_partidas(cursor, ano, impressao)
+        ratings = calcular_historico_ratings(tabela, rodada_atual, configuracao)[rodada_atual]
+        logger.info(f"Ratings calculados para {len(ratings)} times até rodada {rodada_atual - 1}")
+        return {tabela.clubes.clube(i): float(rating) for i, rating in enumerate(ratings)}
+    
+    partes = (ano, rodada_atual) if configuracao == CONFIGURACAO_PADRAO else (ano, rodada_atual, *configuracao)
+    return cacheado('ratings', impressao, partes, calcular)
+
+
+def calcular_historico_ratings(partidas: TabelaPartidas, ate_rodada: int,
+                               configuracao: ConfiguracaoElo = CONFIGURACAO_PADRAO) -> np.ndarray:
+    """
+    Replay cronológico do ELO guardando os ratings antes de cada rodada
     
-    logger.info(f"Ratings calculados para {len(ratings)} times até rodada {rodada_atual - 1}")
+    Args:
+        partidas: Tabela de partidas da temporada
+        ate_rodada: Última linha do histórico (replay até ate_rodada - 1)
+        configuracao: Parâmetros do ELO
     
-    return ratings
+    Returns:
+        Array (ate_rodada + 1) × clubes: linha r = ratings de todos os clubes (índice denso)
+        antes da rodada r
+    """
+    return replay_grade(partidas, ate_rodada, [configuracao]).historico(configuracao)
 
 
 def calcular_rating_recente(
@@ -137,7 +132,12 @@ def calcular_rating_recente(
     ano: int,
     ultimas_partidas: int,
     como_mandante: bool = True,
-    ratings_historicos: Optional[Dict[int, float]] = None
+    ratings_historicos: Optional[Dict[int, float]] = None,
+    impressao: Optional[str] = None,
+    partidas: Optional[TabelaPartidas] = None,
+    historico_ratings: Optional[np.ndarray] = None,
+    configuracao: ConfiguracaoElo = CONFIGURACAO_PADRAO,
+    historico_adversarios: Optional[np.ndarray] = None
 ) -> float:
     """
     Calcula o rating do time considerando apenas as últimas N partidas
@@ -153,84 +153,68 @@ def calcular_rating_recente(
         ultimas_partidas: Número de últimas partidas a considerar
         como_mandante: Se True, considera partidas como mandante; se False, como visitante
         ratings_historicos: Ratings históricos de todos os times (se None, será calculado)
+        impressao: Hash dos dados de partidas (habilita o cache persistente dos ratings)
+        partidas: Tabela de partidas do ciclo (se None, será carregada)
+        historico_ratings: Ratings antes de cada rodada (calcular_historico_ratings até rodada_atual,
+            com a mesma configuração); dispensa novos replays do ELO
+        configuracao: Parâmetros do ELO (K, divisor e vantagem de mando)
+        historico_adversarios: Ratings de referência dos adversários (mesmo formato de historico_ratings;
+            padrão: o próprio historico_ratings). No modo 'mando', historico_ratings é o componente do
+            clube com o mando e historico_adversarios o componente oposto
     
     Returns:
         Rating recente do time
     """
-    if ratings_historicos is None:
-        ratings_historicos = calcular_ratings_historicos(cursor, rodada_atual, ano)
-    
-    # Buscar últimas N partidas
-    if como_mandante:
-        cursor.execute('''
-            SELECT 
-                clube_visitante_id,
-                placar_oficial_mandante,
-                placar_oficial_visitante,
-                rodada_id
-            FROM acf_partidas
-            WHERE clube_casa_id = %s 
-            AND valida = TRUE 
-            AND rodada_id < %s
-            AND temporada = %s
-            AND placar_oficial_mandante IS NOT NULL
-            ORDER BY rodada_id DESC
-            LIMIT %s
-        ''', (clube_id, rodada_atual, ano, ultimas_partidas))
+    if partidas is None:
+        partidas = carregar_tabela_partidas(cursor, ano, impressao)
+    
+    clube = partidas.clubes.get(clube_id)
+    if historico_ratings is not None:
+        if clube < 0:
+            return float(RATING_INICIAL)
+        if historico_adversarios is None:
+            historico_adversarios = historico_ratings
+        ratings_finais = historico_ratings[rodada_atual].tolist()
+        ratings_adversarios = historico_adversarios[rodada_atual].tolist()
     else:
-        cursor.execute('''
-            SELECT 
-                clube_casa_id,
-                placar_oficial_mandante,
-                placar_oficial_visitante,
-                rodada_id
-            FROM acf_partidas
-            WHERE clube_visitante_id = %s 
-            AND valida = TRUE 
-            AND rodada_id < %s
-            AND temporada = %s
-            AND placar_oficial_visitante IS NOT NULL
-            ORDER BY rodada_id DESC
-            LIMIT %s
-        ''', (clube_id, rodada_atual, ano, ultimas_partidas))
-    
-    partidas_recentes = cursor.fetchall()
-    
-    if not partidas_recentes:
+        if ratings_historicos is None:
+            ratings_historicos = calcular_ratings_historicos(cursor, rodada_atual, ano, impressao, partidas, configuracao)
+        if clube < 0:
+            return ratings_historicos.get(clube_id, RATING_INICIAL)
+        ratings_finais = [ratings_historicos.get(c, RATING_INICIAL) for c in partidas.clubes.ids.tolist()]
+        ratings_adversarios = ratings_finais
+    
+    # Últimas N partidas com o mando, da mais antiga para a mais recente
+    mando = 'casa' if como_mandante else 'fora'
+    posicoes = partidas.ultimas_do_clube(clube, mando, rodada_atual - 1, ultimas_partidas)[::-1]
+    
+    if len(posicoes) == 0:
         # Se não há partidas, retornar rating histórico
-        return ratings_historicos.get(clube_id, RATING_INICIAL)
-    
-    # Ordenar por rodada (mais antiga primeiro) para processar em ordem cronológica
-    partidas_recentes = sorted(partidas_recentes, key=lambda x: x[3])
+        return ratings_finais[clube]
     
     # Calcular rating base: rating antes da primeira partida recente
-    primeira_rodada = partidas_recentes[0][3]
-    ratings_antes = calcular_ratings_historicos(cursor, primeira_rodada, ano)
-    rating_atual = ratings_antes.get(clube_id, RATING_INICIAL)
+    primeira_rodada = int(partidas.rodada[posicoes[0]])
+    if historico_ratings is not None:
+        rating_atual = float(historico_ratings[primeira_rodada, clube])
+    else:
+        ratings_antes = calcular_ratings_historicos(cursor, primeira_rodada, ano, impressao, partidas, configuracao)
+        rating_atual = ratings_antes.get(clube_id, RATING_INICIAL)
+    
+    adversarios = (partidas.visitante if como_mandante else partidas.casa)[posicoes]
+    resultados = partidas.resultado_casa(posicoes)
+    if not como_mandante:
+        resultados = 1.0 - resultados
+    
+    # Vantagem de mando na expectativa: a favor do clube como mandante, do adversário como visitante
+    vantagem = configuracao.vantagem_casa if como_mandante else -configuracao.vantagem_casa
     
     # Processar partidas recentes em ordem cronológica
-    for partida in partidas_recentes:
-        if como_mandante:
-            adversario_id, placar_casa, placar_visitante, _ = partida
-        else:
-            adversario_id, placar_mandante, placar_visitante, _ = partida
-            placar_casa = placar_visitante
-            placar_visitante = placar_mandante
-        
-        # Obter rating do adversário no momento da partida
-        # Usar rating histórico completo como aproximação (mais simples e eficiente)
-        rating_adversario = ratings_historicos.get(adversario_id, RATING_INICIAL)
-        
-        # Determinar resultado
-        if placar_casa > placar_visitante:
-            resultado = 1.0
-        elif placar_casa < placar_visitante:
-            resultado = 0.0
-        else:
-            resultado = 0.5
-        
-        # Atualizar rating
-        rating_atual = atualizar_rating(rating_atual, rating_adversario, resultado)
+    # Rating do adversário: rating histórico completo como aproximação (mais simples e eficiente)
+    for adversario, resultado in zip(adversarios.tolist(), resultados.tolist()):
+        rating_atual = atualizar_rating(
+            rating_atual, ratings_adversarios[adversario] - vantagem, resultado,
+            configuracao.k_factor, configuracao.divisor
+        )
     
     return rating_atual
 
@@ -262,7 +246,7 @@ def calcular_diferenca_rating_peso(
     
     # Usar função sigmóide suave (tanh) para mapear diferença para o range desejado
     # tanh(x) vai de -1 a 1, então precisamos ajustar a escala de entrada
-    import math
+    # (np.tanh: aceita também arrays de ratings, usados pelo motor de cenários)
     
     # Ajustar para aumentar a escala: usar divisor menor para que diferenças menores
     # resultem em pesos maiores, mas ainda calculados baseados na diferença real
@@ -275,7 +259,7 @@ def calcular_diferenca_rating_peso(
     # tanh(2.0) ≈ 0.96, então 140 pontos ≈ 0.96 * 5 = 4.8
     # tanh(1.5) ≈ 0.9, então 105 pontos ≈ 0.9 * 5 = 4.5
     # tanh(1.0) ≈ 0.76, então 70 pontos ≈ 0.76 * 5 = 3.8
-    peso = math.tanh(diferenca_normalizada) * max_peso
+    peso = np.tanh(diferenca_normalizada) * max_peso
     
     return peso
 
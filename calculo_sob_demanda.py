@@ -0,0 +1,278 @@
+"""
+Perfis sob demanda: pesos de um perfil arbitrário calculados a partir dos insumos do ciclo
+
+Além dos perfis fixos de config.py, a API de leitura aceita uma especificação de perfil
+(método, janela, expoente ou agressividade) e devolve o vetor de pesos por clube da rodada:
+
+    GET /calcular?tipo=jogo&metodo=janela&janela=5&expoente=0.3
+    GET /calcular?tipo=sg&metodo=ewma&janela=4&agressividade=agressivo
+    GET /calcular?tipo=jogo&metodo=rating&janela=6
+    GET /calcular?tipo=sg&metodo=ajustado&janela=7
+    GET /calcular?tipo=sg&metodo=poisson&janela=8
+
+O cálculo usa os insumos em memória do último ciclo (tabela de partidas, matriz de setores,
+agregados, forma EWMA, agregados ajustados, grade ELO e modelos de Poisson) e as mesmas fórmulas dos calculadores, sem
+acessar o banco: janelas e meias-vidas que o ciclo não carregou são agregadas (ou ajustadas) na hora
+sobre a tabela de partidas.
+
+Os resultados ficam em um LRU limitado (SOB_DEMANDA_MAX_ENTRADAS) indexado por especificação e
+versão dos dados (impressões do ciclo + rodada), então perfis personalizados populares são
+servidos do cache; um ciclo com dados novos muda a versão e os resultados antigos saem pelo LRU.
+"""
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from config import SOB_DEMANDA_MAX_ENTRADAS, USAR_PROVAVEIS_CARTOLA
+from api_leitura import RespostaPreparada
+
+logger = logging.getLogger(__name__)
+
+TIPOS = ('jogo', 'sg')
+METODOS = {'jogo': ('janela', 'ewma', 'rating', 'ajustado'), 'sg': ('janela', 'ewma', 'ajustado', 'poisson')}
+AGRESSIVIDADES = ('brando', 'agressivo')
+# Uma temporada do Brasileirão: janelas maiores não mudam o resultado
+JANELA_MAXIMA = 38
+
+
+class EspecificacaoPerfil(NamedTuple):
+    """
+    Perfil sob demanda (normalizado: parâmetros que o método não usa ficam no padrão)
+
+    Attributes:
+        tipo: 'jogo' ou 'sg'
+        metodo: 'janela', 'ewma', 'ajustado', 'rating' (apenas jogo) ou 'poisson' (apenas sg)
+        janela: Últimas partidas (janela, ajustado e rating) ou meia-vida (ewma e poisson)
+        expoente: Expoente do peso do jogo (janela, ajustado e ewma)
+        agressividade: 'brando' ou 'agressivo' (sg, exceto poisson)
+    """
+    tipo: str
+    metodo: str
+    janela: int
+    expoente: float = 1/4
+    agressividade: str = 'brando'
+
+    @classmethod
+    def de_parametros(cls, parametros: Dict[str, List[str]]) -> 'EspecificacaoPerfil':
+        """
+        Especificação a partir dos parâmetros da query string (parse_qs)
+
+        Raises:
+            ValueError: parâmetro ausente ou inválido (mensagem para o cliente)
+        """
+        def parametro(nome, padrao=None):
+            valores = parametros.get(nome)
+            return valores[0] if valores else padrao
+
+        tipo = parametro('tipo')
+        if tipo not in TIPOS:
+            raise ValueError(f"tipo deve ser {' ou '.join(TIPOS)}")
+        metodo = parametro('metodo', 'janela')
+        if metodo not in METODOS[tipo]:
+            raise ValueError(f"metodo de {tipo} deve ser {', '.join(METODOS[tipo])}")
+        try:
+            janela = int(parametro('janela', ''))
+        except ValueError:
+            raise ValueError('janela obrigatória (inteiro)')
+        if not 1 <= janela <= JANELA_MAXIMA:
+            raise ValueError(f"janela deve estar entre 1 e {JANELA_MAXIMA}")
+
+        expoente = 1/4
+        agressividade = 'brando'
+        if tipo == 'jogo' and metodo != 'rating':
+            try:
+                expoente = float(parametro('expoente', 1/4))
+            except ValueError:
+                raise ValueError('expoente deve ser numérico')
+            if not 0 < expoente <= 1:
+                raise ValueError('expoente deve estar em (0, 1]')
+        if tipo == 'sg' and metodo != 'poisson':
+            agressividade = parametro('agressividade', 'brando')
+            if agressividade not in AGRESSIVIDADES:
+                raise ValueError(f"agressividade deve ser {' ou '.join(AGRESSIVIDADES)}")
+        return cls(tipo, metodo, janela, expoente, agressividade)
+
+
+class CalculadorSobDemanda:
+    """Calcula perfis sob demanda sobre os insumos do último ciclo, com LRU de respostas"""
+
+    def __init__(self, max_entradas: int):
+        self.max_entradas = max_entradas
+        self._lock = threading.Lock()
+        self._respostas: 'OrderedDict[Tuple[EspecificacaoPerfil, str], RespostaPreparada]' = OrderedDict()
+        self._dados: Optional[Tuple[object, object, str]] = None
+        self.acertos = 0
+        self.falhas = 0
+
+    def atualizar_insumos(self, contexto, insumos):
+        """Registra os insumos do ciclo (chamado após carregar os insumos da rodada)"""
+        versao = _versao_dados(contexto)
+        with self._lock:
+            self._dados = (contexto, insumos, versao)
+        logger.debug(f"Perfis sob demanda: insumos da rodada {contexto.rodada_atual} (versão {versao})")
+
+    @property
+    def versao(self) -> Optional[str]:
+        with self._lock:
+            return self._dados[2] if self._dados else None
+
+    @property
+    def dados(self) -> Optional[Tuple[object, object, str]]:
+        """(contexto, insumos, versão) do último ciclo, ou None (usado também pelos cenários da rodada)"""
+        with self._lock:
+            return self._dados
+
+    def obter(self, especificacao: EspecificacaoPerfil) -> Tuple[Optional[RespostaPreparada], bool]:
+        """
+        Resposta do perfil sob demanda
+
+        Returns:
+            (resposta pré-serializada ou None sem insumos, True se veio do LRU)
+        """
+        with self._lock:
+            if self._dados is None:
+                return None, False
+            contexto, insumos, versao = self._dados
+            chave = (especificacao, versao)
+            resposta = self._respostas.get(chave)
+            if resposta is not None:
+                self._respostas.move_to_end(chave)
+                self.acertos += 1
+                return resposta, True
+            self.falhas += 1
+
+        # Cálculo fora do lock: pedidos de outros perfis não esperam por este
+        pesos = calcular_perfil(especificacao, contexto, insumos)
+        resposta = RespostaPreparada(json.dumps({
+            'temporada': contexto.temporada,
+            'rodada': contexto.rodada_atual,
+            'versao': versao,
+            'especificacao': especificacao._asdict(),
+            'clubes': [
+                {'clube_id': clube_id, f'peso_{especificacao.tipo}': peso}
+                for clube_id, peso in sorted(pesos)
+            ],
+        }, separators=(',', ':')).encode('utf-8'))
+
+        with self._lock:
+            self._respostas[chave] = resposta
+            self._respostas.move_to_end(chave)
+            while len(self._respostas) > self.max_entradas:
+                self._respostas.popitem(last=False)
+        return resposta, False
+
+
+def _versao_dados(contexto) -> str:
+    """Versão dos dados do ciclo: impressões dos dados de entrada + temporada/rodada"""
+    conteudo = json.dumps([
+        contexto.temporada, contexto.rodada_atual, USAR_PROVAVEIS_CARTOLA,
+        sorted((contexto.impressoes or {}).items())
+    ])
+    return hashlib.sha1(conteudo.encode('utf-8')).hexdigest()[:16]
+
+
+def calcular_perfil(especificacao: EspecificacaoPerfil, contexto, insumos) -> List[Tuple[int, float]]:
+    """
+    Pesos da rodada do contexto para a especificação (sem acesso ao banco)
+
+    Returns:
+        [(clube_id, peso)]
+    """
+    from agregados_janela import JANELA_APROVEITAMENTO_SG
+
+    rodada_atual = contexto.rodada_atual
+    partidas = insumos.partidas
+    confrontos = partidas.confrontos(rodada_atual)
+    janela = especificacao.janela
+
+    if especificacao.metodo == 'rating':
+        from calculo_peso_jogo_rating import calcular_pesos_rating
+        from motor_elo import CONFIGURACAO_PADRAO, replay_grade
+        grade_elo = insumos.grade_elo
+        if grade_elo is None or CONFIGURACAO_PADRAO not in grade_elo:
+            grade_elo = replay_grade(partidas, rodada_atual, [CONFIGURACAO_PADRAO])
+        return calcular_pesos_rating(
+            confrontos, partidas, rodada_atual, janela, insumos.matriz_setores,
+            grade_elo, CONFIGURACAO_PADRAO, log_progresso=False
+        )
+
+    if especificacao.metodo == 'poisson':
+        from calculo_peso_sg_poisson import calcular_pesos_sg_poisson
+        return calcular_pesos_sg_poisson(
+            confrontos, partidas, _modelo_poisson(rodada_atual, insumos, janela), log_progresso=False
+        )
+
+    janelas = {janela, JANELA_APROVEITAMENTO_SG} if especificacao.tipo == 'sg' else {janela}
+    if especificacao.metodo == 'ajustado':
+        ajustados = _agregados_ajustados(rodada_atual, insumos, janelas)
+        if especificacao.tipo == 'jogo':
+            from calculo_peso_jogo_ajustado import calcular_pesos_jogo_ajustado
+            return calcular_pesos_jogo_ajustado(
+                confrontos, ajustados, insumos.matriz_setores, janela, especificacao.expoente, log_progresso=False
+            )
+        from calculo_peso_sg_ajustado import calcular_pesos_sg_ajustado
+        return calcular_pesos_sg_ajustado(
+            confrontos, ajustados, janela, especificacao.agressividade,
+            insumos.agregados_provaveis, USAR_PROVAVEIS_CARTOLA, log_progresso=False
+        )
+
+    if especificacao.metodo == 'ewma':
+        agregados = _forma_ewma(contexto, insumos, janelas)
+    else:
+        agregados = _agregados_janela(rodada_atual, insumos, janelas)
+
+    if especificacao.tipo == 'jogo':
+        from calculo_peso_jogo import calcular_pesos_jogo
+        return calcular_pesos_jogo(
+            confrontos, agregados, insumos.matriz_setores, janela, especificacao.expoente, log_progresso=False
+        )
+
+    from calculo_peso_sg import calcular_pesos_sg
+    return calcular_pesos_sg(
+        confrontos, agregados, janela, especificacao.agressividade,
+        insumos.agregados_provaveis, USAR_PROVAVEIS_CARTOLA, log_progresso=False
+    )
+
+
+def _agregados_janela(rodada_atual: int, insumos, janelas):
+    """Agregados do ciclo se tiverem as janelas; senão, agregados na hora sobre a tabela de partidas"""
+    from agregados_janela import AgregadosJanela, agregar_partidas
+    if insumos.agregados is not None and janelas <= set(insumos.agregados.janelas):
+        return insumos.agregados
+    janelas = tuple(sorted(janelas))
+    return AgregadosJanela(agregar_partidas(insumos.partidas, rodada_atual, janelas), janelas)
+
+
+def _agregados_ajustados(rodada_atual: int, insumos, janelas):
+    """Agregados ajustados do ciclo se tiverem as janelas; senão, agregados na hora (tabela até a rodada anterior)"""
+    from agregados_ajustados import agregar_ajustados
+    from calculo_tabela import montar_tabela_classificacao
+    if insumos.ajustados is not None and janelas <= set(insumos.ajustados.janelas):
+        return insumos.ajustados
+    tabela_classificacao = montar_tabela_classificacao(insumos.partidas, rodada_atual - 1)
+    return agregar_ajustados(insumos.partidas, rodada_atual, janelas, tabela_classificacao)
+
+
+def _forma_ewma(contexto, insumos, meias_vidas):
+    """Forma EWMA do ciclo se tiver as meias-vidas; senão, um estado avulso (não persistido)"""
+    from forma_ewma import EstadoForma
+    if insumos.forma is not None and meias_vidas <= set(insumos.forma.meias_vidas):
+        return insumos.forma
+    estado = EstadoForma(contexto.temporada, insumos.partidas.clubes.ids, tuple(sorted(meias_vidas)))
+    estado.atualizar(insumos.partidas, contexto.rodada_atual)
+    return estado
+
+
+def _modelo_poisson(rodada_atual: int, insumos, meia_vida: int):
+    """Modelo de Poisson do ciclo se tiver a meia-vida; senão, ajustado na hora (não guardado)"""
+    from modelo_poisson import ajustar_poisson
+    if insumos.poisson is not None and meia_vida in insumos.poisson.meias_vidas:
+        return insumos.poisson.obter(meia_vida)
+    return ajustar_poisson(insumos.partidas, rodada_atual, meia_vida)
+
+
+# Calculador único do processo, alimentado pelos ciclos do serviço
+calculador_sob_demanda = CalculadorSobDemanda(SOB_DEMANDA_MAX_ENTRADAS)
@@ -3,14 +3,29 @@ Módulo para calcular a tabela de classificação do campeonato
 e fornecer funções auxiliares para ajustar estatísticas baseadas na força dos adversários
 """
 import logging
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Optional
+
+import numpy as np
+
+from cache_persistente import cacheado
+from modelo_dados import TabelaPartidas, carregar_tabela_partidas
 
 logger = logging.getLogger(__name__)
 
-def calcular_tabela_classificacao(cursor, rodada_atual: int, ano: int) -> Dict[int, Dict]:
+def calcular_tabela_classificacao(cursor, rodada_atual: int, ano: int, impressao: Optional[str] = None,
+                                  partidas: Optional[TabelaPartidas] = None) -> Dict[int, Dict]:
     """
     Calcula a tabela de classificação até a rodada atual
     
+    Com a impressão (hash) dos dados de partidas, usa o cache persistente
+    
+    Args:
+        cursor: Cursor do banco
+        rodada_atual: Última rodada considerada (inclusive)
+        ano: Temporada
+        impressao: Hash dos dados de partidas
+        partidas: Tabela de partidas do ciclo (se None, será carregada)
+    
     Retorna um dicionário: {clube_id: {
         'pontos': int,
         'vitorias': int,
@@ -24,116 +39,82 @@ def calcular_tabela_classificacao(cursor, rodada_atual: int, ano: int) -> Dict[i
         'forca_normalizada': float  # 0.0-1.0 (1.0 = líder, 0.0 = lanterna)
     }}
     """
-    # Buscar todas as partidas válidas até a rodada atual
-    cursor.execute('''
-        SELECT 
-            clube_casa_id,
-            clube_visitante_id,
-            placar_oficial_mandante,
-            placar_oficial_visitante
-        FROM acf_partidas
-        WHERE valida = TRUE 
-        AND rodada_id <= %s
-        AND temporada = %s
-        AND placar_oficial_mandante IS NOT NULL 
-        AND placar_oficial_visitante IS NOT NULL
-        ORDER BY rodada_id
-    ''', (rodada_atual, ano))
-    
-    partidas = cursor.fetchall()
-    
-    # Inicializar estatísticas de todos os times
-    tabela = {}
-    
-    # Primeiro, identificar todos os times que já jogaram
-    for casa_id, visitante_id, placar_casa, placar_visitante in partidas:
-        if casa_id not in tabela:
-            tabela[casa_id] = {
-                'pontos': 0,
-                'vitorias': 0,
-                'empates': 0,
-                'derrotas': 0,
-                'gols_pro': 0,
-                'gols_contra': 0,
-                'saldo_gols': 0,
-                'jogos': 0
-            }
-        if visitante_id not in tabela:
-            tabela[visitante_id] = {
-                'pontos': 0,
-                'vitorias': 0,
-                'empates': 0,
-                'derrotas': 0,
-                'gols_pro': 0,
-                'gols_contra': 0,
-                'saldo_gols': 0,
-                'jogos': 0
-            }
-    
-    # Processar partidas
-    for casa_id, visitante_id, placar_casa, placar_visitante in partidas:
-        # Time da casa
-        tabela[casa_id]['jogos'] += 1
-        tabela[casa_id]['gols_pro'] += placar_casa
-        tabela[casa_id]['gols_contra'] += placar_visitante
-        
-        # Time visitante
-        tabela[visitante_id]['jogos'] += 1
-        tabela[visitante_id]['gols_pro'] += placar_visitante
-        tabela[visitante_id]['gols_contra'] += placar_casa
-        
-        # Resultado
-        if placar_casa > placar_visitante:
-            # Vitória da casa
-            tabela[casa_id]['pontos'] += 3
-            tabela[casa_id]['vitorias'] += 1
-            tabela[visitante_id]['derrotas'] += 1
-        elif placar_casa < placar_visitante:
-            # Vitória do visitante
-            tabela[visitante_id]['pontos'] += 3
-            tabela[visitante_id]['vitorias'] += 1
-            tabela[casa_id]['derrotas'] += 1
-        else:
-            # Empate
-            tabela[casa_id]['pontos'] += 1
-            tabela[casa_id]['empates'] += 1
-            tabela[visitante_id]['pontos'] += 1
-            tabela[visitante_id]['empates'] += 1
-    
-    # Calcular saldo de gols e aproveitamento
-    for clube_id in tabela:
-        stats = tabela[clube_id]
-        stats['saldo_gols'] = stats['gols_pro'] - stats['gols_contra']
-        pontos_possiveis = stats['jogos'] * 3
-        stats['aproveitamento'] = stats['pontos'] / pontos_possiveis if pontos_possiveis > 0 else 0.0
+    def calcular():
+        tabela_partidas = partidas if partidas is not None else carregar_tabela_partidas(cursor, ano, impressao)
+        return montar_tabela_classificacao(tabela_partidas, rodada_atual)
+    
+    return cacheado('tabela', impressao, (ano, rodada_atual), calcular)
+
+
+def montar_tabela_classificacao(partidas: TabelaPartidas, rodada_atual: int) -> Dict[int, Dict]:
+    """Monta a tabela a partir das partidas encerradas até a rodada (sem cache)"""
+    posicoes = partidas.encerradas(rodada_atual)
+    casa = partidas.casa[posicoes]
+    visitante = partidas.visitante[posicoes]
+    gols_casa = partidas.placar_casa[posicoes].astype(np.int64)
+    gols_visitante = partidas.placar_visitante[posicoes].astype(np.int64)
+    n = len(partidas.clubes)
+    
+    def somar(pesos_casa, pesos_visitante):
+        return (np.bincount(casa, weights=pesos_casa, minlength=n)
+                + np.bincount(visitante, weights=pesos_visitante, minlength=n)).astype(np.int64)
+    
+    vitoria_casa = gols_casa > gols_visitante
+    vitoria_visitante = gols_casa < gols_visitante
+    empate = gols_casa == gols_visitante
+    
+    jogos = np.bincount(casa, minlength=n) + np.bincount(visitante, minlength=n)
+    vitorias = somar(vitoria_casa, vitoria_visitante)
+    empates = somar(empate, empate)
+    derrotas = somar(vitoria_visitante, vitoria_casa)
+    gols_pro = somar(gols_casa, gols_visitante)
+    gols_contra = somar(gols_visitante, gols_casa)
+    pontos = 3 * vitorias + empates
+    saldo_gols = gols_pro - gols_contra
+    
+    # Apenas os times que já jogaram, na ordem em que apareceram (desempate final, como antes)
+    primeira_aparicao = np.full(n, np.iinfo(np.int64).max)
+    ordem_partidas = np.arange(len(posicoes), dtype=np.int64)
+    np.minimum.at(primeira_aparicao, casa, 2 * ordem_partidas)
+    np.minimum.at(primeira_aparicao, visitante, 2 * ordem_partidas + 1)
+    jogaram = np.flatnonzero(jogos > 0)
     
     # Ordenar por critérios de classificação (pontos, vitórias, saldo, gols pró)
-    times_ordenados = sorted(
-        tabela.items(),
-        key=lambda x: (
-            -x[1]['pontos'],  # Mais pontos primeiro
-            -x[1]['vitorias'],  # Mais vitórias
-            -x[1]['saldo_gols'],  # Melhor saldo
-            -x[1]['gols_pro']  # Mais gols pró
-        )
-    )
+    ordem = jogaram[np.lexsort((
+        primeira_aparicao[jogaram],
+        -gols_pro[jogaram],  # Mais gols pró
+        -saldo_gols[jogaram],  # Melhor saldo
+        -vitorias[jogaram],  # Mais vitórias
+        -pontos[jogaram],  # Mais pontos primeiro
+    ))]
     
     # Adicionar posição e força normalizada
-    total_times = len(times_ordenados)
-    for posicao, (clube_id, stats) in enumerate(times_ordenados, 1):
-        stats['posicao'] = posicao
+    total_times = len(ordem)
+    resultado = {}
+    for posicao, i in enumerate(ordem.tolist(), 1):
+        aproveitamento = float(pontos[i]) / (jogos[i] * 3)
         # Força normalizada: 1.0 para o líder, 0.0 para o lanterna
         # Usar uma escala que considera posição e aproveitamento
         if total_times > 1:
             # Normalização baseada em posição (invertida)
             forca_posicao = 1.0 - ((posicao - 1) / (total_times - 1))
             # Combinar com aproveitamento (peso 70% posição, 30% aproveitamento)
-            stats['forca_normalizada'] = (0.7 * forca_posicao) + (0.3 * stats['aproveitamento'])
+            forca_normalizada = (0.7 * forca_posicao) + (0.3 * aproveitamento)
         else:
-            stats['forca_normalizada'] = 0.5
-    
-    # Converter para dicionário indexado por clube_id
-    resultado = {clube_id: stats for clube_id, stats in times_ordenados}
+            forca_normalizada = 0.5
+        resultado[partidas.clubes.clube(i)] = {
+            'pontos': int(pontos[i]),
+            'vitorias': int(vitorias[i]),
+            'empates': int(empates[i]),
+            'derrotas': int(derrotas[i]),
+            'gols_pro': int(gols_pro[i]),
+            'gols_contra': int(gols_contra[i]),
+            'saldo_gols': int(saldo_gols[i]),
+            'jogos': int(jogos[i]),
+            'aproveitamento': aproveitamento,
+            'posicao': posicao,
+            'forca_normalizada': forca_normalizada,
+        }
     
     logger.debug(f"Tabela calculada: {len(resultado)} times até rodada {rodada_atual}")
     
@@ -147,7 +128,8 @@ def calcular_forca_media_adversarios(
     ano: int,
     ultimas_partidas: int,
     como_mandante: bool = True,
-    tabela_classificacao: Optional[Dict[int, Dict]] = None
+    tabela_classificacao: Optional[Dict[int, Dict]] = None,
+    partidas: Optional[TabelaPartidas] = None
 ) -> float:
     """
     Calcula a força média dos adversários enfrentados pelo time nas últimas N partidas
@@ -159,49 +141,31 @@ def calcular_forca_media_adversarios(
         ultimas_partidas: Número de últimas partidas a considerar
         como_mandante: Se True, considera partidas como mandante; se False, como visitante
         tabela_classificacao: Tabela de classificação (se None, será calculada)
+        partidas: Tabela de partidas do ciclo (se None, será carregada)
     
     Returns:
         Força média normalizada dos adversários (0.0-1.0)
     """
+    if partidas is None:
+        partidas = carregar_tabela_partidas(cursor, ano)
     if tabela_classificacao is None:
-        tabela_classificacao = calcular_tabela_classificacao(cursor, rodada_atual, ano)
-    
-    # Buscar últimas partidas
-    if como_mandante:
-        cursor.execute('''
-            SELECT clube_visitante_id
-            FROM acf_partidas
-            WHERE clube_casa_id = %s 
-            AND valida = TRUE 
-            AND rodada_id <= %s
-            AND temporada = %s
-            AND placar_oficial_mandante IS NOT NULL
-            ORDER BY rodada_id DESC
-            LIMIT %s
-        ''', (clube_id, rodada_atual - 1, ano, ultimas_partidas))
-    else:
-        cursor.execute('''
-            SELECT clube_casa_id
-            FROM acf_partidas
-            WHERE clube_visitante_id = %s 
-            AND valida = TRUE 
-            AND rodada_id <= %s
-            AND temporada = %s
-            AND placar_oficial_visitante IS NOT NULL
-            ORDER BY rodada_id DESC
-            LIMIT %s
-        ''', (clube_id, rodada_atual - 1, ano, ultimas_partidas))
-    
-    adversarios = cursor.fetchall()
-    
-    if not adversarios:
+        tabela_classificacao = calcular_tabela_classificacao(cursor, rodada_atual, ano, partidas=partidas)
+    
+    clube = partidas.clubes.get(clube_id)
+    if clube < 0:
         return 0.5  # Força média neutra se não houver partidas
     
+    # Últimas partidas (até a rodada anterior) e adversários
+    mando = 'casa' if como_mandante else 'fora'
+    posicoes = partidas.ultimas_do_clube(clube, mando, rodada_atual - 1, ultimas_partidas)
+    adversarios = (partidas.visitante if como_mandante else partidas.casa)[posicoes]
+    
     # Calcular força média dos adversários
     forcas = []
-    for (adversario_id,) in adversarios:
-        if adversario_id in tabela_classificacao:
-            forcas.append(tabela_classificacao[adversario_id]['forca_normalizada'])
+    for adversario in adversarios.tolist():
+        estatisticas = tabela_classificacao.get(partidas.clubes.clube(adversario))
+        if estatisticas is not None:
+            forcas.append(estatisticas['forca_normalizada'])
     
     if not forcas:
         return 0.5
@@ -0,0 +1,451 @@
+"""
+Cenários da próxima rodada: pesos dos perfis sob resultados hipotéticos da rodada atual
+
+Responde a perguntas como "como mudam os pesos se o favorito X perder?": cada partida da rodada
+atual recebe um resultado hipotético do mandante (vitória 1×0, empate 1×1 ou derrota 0×1) e os
+perfis de peso do jogo (janela, EWMA e rating) e de peso do SG (janela e EWMA) são avaliados para
+a rodada seguinte em todas as 3^N combinações (até MAX_PARTIDAS_COMPLETO partidas: 59.049
+cenários com 10) ou em uma lista de cenários.
+
+Em vez de refazer o ciclo por cenário, o motor parte dos insumos em memória do ciclo (tabela de
+partidas, matriz de setores, forma EWMA e grade ELO) e atualiza só o que a rodada hipotética muda:
+
+    agregados   a rodada acrescenta uma partida a cada clube, e os agregados (janela ou EWMA) de
+                um clube dependem só do resultado da própria partida: bastam 3 estados (um por
+                resultado, com todas as partidas iguais), e cada confronto da próxima rodada é
+                calculado nos 9 pares de resultados das partidas dos dois clubes
+    ELO         um passo vetorizado (motor_elo.aplicar_passo) por resultado a partir dos ratings
+                antes da rodada; o rating recente de cada clube é refeito com os ratings dos
+                adversários de cada cenário, vetorizado sobre os cenários
+
+Os pesos de todos os cenários saem por indexação dessas tabelas (cenários × clubes), e o peso do SG
+é normalizado em cada cenário, como no ciclo. A sensibilidade de cada clube resume a distribuição
+do peso (média, desvio, mínimo e máximo) e a média condicionada ao resultado de cada partida da
+rodada atual, com os cenários equiprováveis. Perfis ajustados e Poisson ficam de fora: a força dos
+adversários vem da tabela de classificação ou do ajuste do modelo, que dependem de todos os
+resultados da rodada.
+
+A matriz de setores (scouts dos atletas) e os prováveis não mudam entre cenários.
+"""
+import copy
+import json
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from modelo_dados import MANDOS, TabelaPartidas
+
+logger = logging.getLogger(__name__)
+
+# Resultado do mandante em cada partida hipotética e o placar usado nos agregados
+RESULTADOS = ('vitoria', 'empate', 'derrota')
+PLACARES_CENARIO = ((1, 0), (1, 1), (0, 1))
+# Partidas da rodada atual para enumerar todas as combinações (3^10 = 59.049 cenários)
+MAX_PARTIDAS_COMPLETO = 10
+METODOS_CENARIO = {'jogo': ('janela', 'ewma', 'rating'), 'sg': ('janela', 'ewma')}
+# Partidas cujo resultado não move a média condicionada do peso ficam fora de 'por_partida'
+LIMIAR_IMPACTO = 1e-9
+
+
+def todas_combinacoes(partidas: int) -> np.ndarray:
+    """Todas as combinações de resultados (cenários × partidas, 0 = vitória, 1 = empate, 2 = derrota do mandante)"""
+    potencias = 3 ** np.arange(partidas - 1, -1, -1)
+    return ((np.arange(3 ** partidas)[:, None] // potencias) % 3).astype(np.int8)
+
+
+class _AgregadosCombinados:
+    """Agregados de cada clube no estado do resultado da sua partida (mesma interface de obter)"""
+
+    def __init__(self, estados, estado_do_clube: Dict[int, int]):
+        self._estados = estados
+        self._estado_do_clube = estado_do_clube
+
+    def obter(self, clube_id: int, mando: str, janela: int):
+        return self._estados[self._estado_do_clube.get(clube_id, 0)].obter(clube_id, mando, janela)
+
+
+class MotorCenarios:
+    """
+    Pesos da rodada seguinte à rodada atual sob resultados hipotéticos, sobre os insumos do ciclo
+
+    Args:
+        partidas: Tabela de partidas da temporada do ciclo
+        rodada_atual: Rodada cujas partidas recebem os resultados hipotéticos
+        temporada: Temporada (estado da forma EWMA)
+        matriz_setores: Matriz clube × setor do ciclo
+        grade_elo: Grade ELO do ciclo (ratings antes da rodada atual; configurações ausentes são refeitas)
+        forma: EstadoForma do ciclo (antes da rodada atual; meias-vidas ausentes são refeitas)
+        agregados_provaveis: Médias dos prováveis para o fator de jogadores do SG
+        usar_provaveis_cartola: Se o fator de jogadores do SG usa os prováveis
+
+    Raises:
+        ValueError: rodada atual ou seguinte sem partidas, ou clube com duas partidas na rodada atual
+    """
+
+    def __init__(self, partidas: TabelaPartidas, rodada_atual: int, temporada: int, matriz_setores,
+                 grade_elo=None, forma=None, agregados_provaveis=None, usar_provaveis_cartola: bool = False):
+        self.partidas = partidas
+        self.rodada_atual = rodada_atual
+        self.proxima_rodada = rodada_atual + 1
+        self.temporada = temporada
+        self.matriz_setores = matriz_setores
+        self.grade_elo = grade_elo
+        self.forma = forma
+        self.agregados_provaveis = agregados_provaveis
+        self.usar_provaveis_cartola = usar_provaveis_cartola
+
+        self.posicoes = np.flatnonzero(partidas.valida & (partidas.rodada == rodada_atual))
+        if not len(self.posicoes):
+            raise ValueError(f"Rodada {rodada_atual} sem partidas válidas")
+        self.partida_ids = partidas.partida_id[self.posicoes].tolist()
+        # Partida da rodada atual de cada clube (índice denso -> coluna do cenário); sem partida, a
+        # coluna extra (sempre 0): os estados do clube são iguais em todos os resultados
+        self._partida_do_clube = np.full(len(partidas.clubes), len(self.posicoes), dtype=np.int64)
+        for f, (casa, visitante) in enumerate(zip(partidas.casa[self.posicoes].tolist(),
+                                                  partidas.visitante[self.posicoes].tolist())):
+            for clube in (casa, visitante):
+                if self._partida_do_clube[clube] < len(self.posicoes):
+                    raise ValueError(f"Clube {partidas.clubes.clube(clube)} com mais de uma partida na rodada {rodada_atual}")
+                self._partida_do_clube[clube] = f
+
+        self.confrontos = partidas.confrontos(self.proxima_rodada)
+        if not self.confrontos:
+            raise ValueError(f"Rodada {self.proxima_rodada} sem partidas válidas")
+        # Colunas dos pesos: casa e visitante de cada confronto (ordem dos calculadores)
+        self.clube_ids = [clube for _, casa_id, _, visitante_id, _ in self.confrontos for clube in (casa_id, visitante_id)]
+        self._partida_coluna = self._partida_do_clube[partidas.clubes.indices(self.clube_ids)]
+
+        # Tabelas hipotéticas: todas as partidas da rodada atual com o placar de cada resultado
+        self.tabelas = [self._tabela_hipotetica(placar) for placar in PLACARES_CENARIO]
+        self._estados: Dict[Tuple[str, Tuple[int, ...]], list] = {}
+
+    def _tabela_hipotetica(self, placar: Tuple[int, int]) -> TabelaPartidas:
+        placar_casa = self.partidas.placar_casa.copy()
+        placar_visitante = self.partidas.placar_visitante.copy()
+        placar_casa[self.posicoes], placar_visitante[self.posicoes] = placar
+        return TabelaPartidas(
+            self.partidas.clubes, self.partidas.partida_id, self.partidas.rodada, self.partidas.casa,
+            self.partidas.visitante, placar_casa, placar_visitante, self.partidas.valida
+        )
+
+    def resultados_completos(self) -> np.ndarray:
+        """Todas as combinações de resultados da rodada atual"""
+        if len(self.posicoes) > MAX_PARTIDAS_COMPLETO:
+            raise ValueError(f"{len(self.posicoes)} partidas na rodada {self.rodada_atual}: "
+                             f"combinações completas só até {MAX_PARTIDAS_COMPLETO} (informe os cenários)")
+        return todas_combinacoes(len(self.posicoes))
+
+    def _validar_resultados(self, resultados: Optional[np.ndarray]) -> np.ndarray:
+        if resultados is None:
+            return self.resultados_completos()
+        resultados = np.asarray(resultados, dtype=np.int8)
+        if resultados.ndim != 2 or resultados.shape[1] != len(self.posicoes):
+            raise ValueError(f"Cenários devem ter {len(self.posicoes)} resultados (partidas da rodada {self.rodada_atual})")
+        if resultados.size and (resultados.min() < 0 or resultados.max() > 2):
+            raise ValueError('Resultados devem ser 0 (vitória), 1 (empate) ou 2 (derrota) do mandante')
+        return resultados
+
+    def avaliar(self, tipo: str, perfil: Dict, resultados: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Pesos do perfil na próxima rodada em cada cenário
+
+        Args:
+            tipo: 'jogo' ou 'sg'
+            perfil: Perfil do registro (método janela, ewma ou rating)
+            resultados: Cenários × partidas da rodada atual (padrão: todas as combinações)
+
+        Returns:
+            Array cenários × clubes (colunas em self.clube_ids)
+        """
+        from registro_perfis import metodo_do_perfil
+
+        metodo = metodo_do_perfil(tipo, perfil).metodo
+        if metodo not in METODOS_CENARIO[tipo]:
+            raise ValueError(f"Método {metodo} ({tipo}) não é avaliado em cenários "
+                             f"(use {', '.join(METODOS_CENARIO[tipo])})")
+        resultados = self._validar_resultados(resultados)
+        # Coluna extra para os clubes sem partida na rodada atual
+        estados = np.hstack([resultados, np.zeros((len(resultados), 1), dtype=np.int8)])
+        if metodo == 'rating':
+            return self._pesos_rating(perfil, estados)
+
+        # Peso de cada coluna nos 9 pares (resultado da partida do mandante, do visitante)
+        pares = self._pares_agregados(tipo, metodo, perfil)
+        partida_casa, partida_visitante = self._partida_coluna[0::2], self._partida_coluna[1::2]
+        par = np.repeat(3 * estados[:, partida_casa] + estados[:, partida_visitante], 2, axis=1)
+        pesos = pares[np.arange(len(self.clube_ids)), par]
+        if tipo == 'sg':
+            from calculo_peso_sg import normalizar_pesos_sg
+            pesos = normalizar_pesos_sg(pesos)
+        return pesos
+
+    def _estados_agregados(self, metodo: str, janelas: Tuple[int, ...]) -> list:
+        """Agregados (janela) ou forma EWMA antes da próxima rodada em cada tabela hipotética"""
+        chave = (metodo, janelas)
+        if chave not in self._estados:
+            if metodo == 'ewma':
+                self._estados[chave] = [self._forma_hipotetica(tabela, janelas) for tabela in self.tabelas]
+            else:
+                from agregados_janela import AgregadosJanela, agregar_partidas
+                self._estados[chave] = [
+                    AgregadosJanela(agregar_partidas(tabela, self.proxima_rodada, janelas), janelas)
+                    for tabela in self.tabelas
+                ]
+        return self._estados[chave]
+
+    def _forma_hipotetica(self, tabela: TabelaPartidas, meias_vidas: Tuple[int, ...]):
+        """Forma do ciclo (cópia) com a rodada hipotética aplicada; sem as meias-vidas, refeita do zero"""
+        from forma_ewma import EstadoForma
+
+        posicoes = tabela.encerradas(self.rodada_atual)
+        if (self.forma is not None and set(meias_vidas) <= set(self.forma.meias_vidas)
+                and self.forma.compativel(tabela, posicoes)):
+            estado = copy.deepcopy(self.forma)
+        else:
+            estado = EstadoForma(self.temporada, tabela.clubes.ids, meias_vidas)
+        estado.atualizar(tabela, self.proxima_rodada)
+        return estado
+
+    def _pares_agregados(self, tipo: str, metodo: str, perfil: Dict) -> np.ndarray:
+        """Peso de cada clube da próxima rodada nos 9 pares de resultados (clubes × 9, sem normalizar o SG)"""
+        from agregados_janela import JANELA_APROVEITAMENTO_SG
+
+        janela = perfil['ultimas_partidas']
+        janelas = (janela,) if tipo == 'jogo' else tuple(sorted({janela, JANELA_APROVEITAMENTO_SG}))
+        estados = self._estados_agregados(metodo, janelas)
+
+        pares = np.empty((len(self.clube_ids), 9))
+        for resultado_casa in range(3):
+            for resultado_visitante in range(3):
+                estado_do_clube = {}
+                for _, casa_id, _, visitante_id, _ in self.confrontos:
+                    estado_do_clube[casa_id] = resultado_casa
+                    estado_do_clube[visitante_id] = resultado_visitante
+                agregados = _AgregadosCombinados(estados, estado_do_clube)
+                if tipo == 'jogo':
+                    from calculo_peso_jogo import calcular_pesos_jogo
+                    pesos = calcular_pesos_jogo(
+                        self.confrontos, agregados, self.matriz_setores, janela,
+                        perfil.get('expoente', 1/4), log_progresso=False
+                    )
+                else:
+                    from calculo_peso_sg import calcular_pesos_sg
+                    pesos = calcular_pesos_sg(
+                        self.confrontos, agregados, janela, perfil.get('agressividade', 'brando'),
+                        self.agregados_provaveis, self.usar_provaveis_cartola, log_progresso=False,
+                        normalizar=False
+                    )
+                pares[:, 3 * resultado_casa + resultado_visitante] = [peso for _, peso in pesos]
+        return pares
+
+    def _ratings_apos_rodada(self, configuracao) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+        """
+        Ratings antes da rodada atual e depois dela para cada resultado
+
+        Returns:
+            ({modo: array (rodada_atual + 1) × clubes}, {modo: array 3 × clubes}) com modo 'geral', 'casa' ou 'fora'
+        """
+        from motor_elo import aplicar_passo, parametros_grade, replay_grade
+
+        grade = self.grade_elo
+        if grade is None or configuracao not in grade or len(grade.historicos) <= self.rodada_atual:
+            grade = replay_grade(self.partidas, self.rodada_atual, [configuracao])
+        historicos = {'geral': grade.historico(configuracao)[:self.rodada_atual + 1]}
+        for mando in MANDOS:
+            historicos[mando] = grade.historico_mando(configuracao, mando)[:self.rodada_atual + 1]
+
+        k, divisor, vantagem = parametros_grade([configuracao])
+        casa, visitante = self.partidas.casa[self.posicoes], self.partidas.visitante[self.posicoes]
+        apos = {modo: [] for modo in historicos}
+        for resultado in (1.0, 0.5, 0.0):
+            ratings = historicos['geral'][-1][None, :].copy()
+            ratings_mando = {mando: historicos[mando][-1][None, :].copy() for mando in MANDOS}
+            aplicar_passo(ratings, ratings_mando, casa, visitante, np.full(len(self.posicoes), resultado),
+                          k, divisor, vantagem)
+            apos['geral'].append(ratings[0])
+            for mando in MANDOS:
+                apos[mando].append(ratings_mando[mando][0])
+        return historicos, {modo: np.stack(valores) for modo, valores in apos.items()}
+
+    def _pesos_rating(self, perfil: Dict, estados: np.ndarray) -> np.ndarray:
+        """Peso do jogo por rating em cada cenário (mesmo cálculo de calcular_pesos_rating na próxima rodada)"""
+        from calculo_rating import atualizar_rating, configuracao_elo, modo_rating_perfil
+        from calculo_peso_jogo_rating import peso_rating_confronto
+
+        configuracao = configuracao_elo(perfil)
+        modo = modo_rating_perfil(perfil)
+        historicos, apos = self._ratings_apos_rodada(configuracao)
+        tabela = self.tabelas[0]
+        resultado_por_estado = np.array([1.0, 0.5, 0.0])
+
+        def rating_no_cenario(componente, clube):
+            """Rating do clube depois da rodada atual em cada cenário"""
+            return apos[componente][estados[:, self._partida_do_clube[clube]], clube]
+
+        def rating_recente(clube_id, como_mandante):
+            mando = 'casa' if como_mandante else 'fora'
+            if modo == 'mando':
+                proprio, adversario = mando, 'fora' if como_mandante else 'casa'
+            else:
+                proprio = adversario = 'geral'
+            clube = tabela.clubes.indice(clube_id)
+            posicoes = tabela.ultimas_do_clube(clube, mando, self.rodada_atual, perfil['ultimas_partidas'])[::-1]
+            if len(posicoes) == 0:
+                return rating_no_cenario(proprio, clube)
+
+            rating = historicos[proprio][int(tabela.rodada[posicoes[0]]), clube]
+            adversarios = (tabela.visitante if como_mandante else tabela.casa)[posicoes]
+            vantagem = configuracao.vantagem_casa if como_mandante else -configuracao.vantagem_casa
+            for posicao, adversario_ in zip(posicoes.tolist(), adversarios.tolist()):
+                if tabela.rodada[posicao] == self.rodada_atual:
+                    # Partida hipotética: resultado do cenário
+                    resultado = resultado_por_estado[estados[:, self._partida_do_clube[clube]]]
+                else:
+                    resultado = float(tabela.resultado_casa(np.array([posicao]))[0])
+                if not como_mandante:
+                    resultado = 1.0 - resultado
+                rating = atualizar_rating(
+                    rating, rating_no_cenario(adversario, adversario_) - vantagem, resultado,
+                    configuracao.k_factor, configuracao.divisor
+                )
+            return np.broadcast_to(rating, (len(estados),))
+
+        pesos = np.empty((len(estados), len(self.clube_ids)))
+        for p, (_, casa_id, _, visitante_id, _) in enumerate(self.confrontos):
+            peso = peso_rating_confronto(
+                rating_recente(casa_id, True), rating_recente(visitante_id, False),
+                self.matriz_setores.razoes(casa_id, visitante_id)
+            )
+            pesos[:, 2 * p] = peso
+            pesos[:, 2 * p + 1] = -peso
+        return pesos
+
+    def sensibilidade(self, tipo: str, perfil: Dict, resultados: Optional[np.ndarray] = None) -> Dict:
+        """
+        Distribuição do peso de cada clube sobre os cenários (equiprováveis)
+
+        Returns:
+            {'tipo', 'perfil_id', 'cenarios', 'clubes': [{'clube_id', 'media', 'desvio', 'minimo',
+            'maximo', 'amplitude', 'por_partida': [{'partida_id', 'vitoria', 'empate', 'derrota'}]}]}
+            com 'por_partida' = média do peso dado o resultado do mandante de cada partida da rodada
+            atual (só partidas que movem o peso, da mais para a menos influente)
+        """
+        resultados = self._validar_resultados(resultados)
+        pesos = self.avaliar(tipo, perfil, resultados)
+
+        # Médias condicionadas: indicadoras (cenários × partidas·resultados) transpostas × pesos
+        indicadoras = (resultados[:, :, None] == np.arange(3)).reshape(len(resultados), -1).astype(np.float64)
+        contagens = indicadoras.sum(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            condicionais = (indicadoras.T @ pesos) / contagens[:, None]
+        condicionais = condicionais.reshape(len(self.posicoes), 3, len(self.clube_ids))
+        impacto = np.nanmax(condicionais, axis=1) - np.nanmin(condicionais, axis=1)
+
+        clubes = []
+        for k, clube_id in enumerate(self.clube_ids):
+            coluna = pesos[:, k]
+            por_partida = [
+                {
+                    'partida_id': self.partida_ids[f],
+                    **{resultado: _valor(condicionais[f, r, k]) for r, resultado in enumerate(RESULTADOS)},
+                }
+                for f in np.argsort(-impacto[:, k], kind='stable').tolist()
+                if impacto[f, k] > LIMIAR_IMPACTO
+            ]
+            clubes.append({
+                'clube_id': clube_id,
+                'media': float(coluna.mean()),
+                'desvio': float(coluna.std()),
+                'minimo': float(coluna.min()),
+                'maximo': float(coluna.max()),
+                'amplitude': float(coluna.max() - coluna.min()),
+                'por_partida': por_partida,
+            })
+        return {
+            'tipo': tipo,
+            'perfil_id': perfil['id'],
+            'rodada_atual': self.rodada_atual,
+            'proxima_rodada': self.proxima_rodada,
+            'cenarios': len(resultados),
+            'clubes': clubes,
+        }
+
+
+def _valor(valor: float) -> Optional[float]:
+    """Média condicionada (None se nenhum cenário tem o resultado)"""
+    return None if np.isnan(valor) else float(valor)
+
+
+def criar_motor(contexto, insumos) -> MotorCenarios:
+    """Motor de cenários sobre os insumos do ciclo (rodada atual do contexto)"""
+    from config import USAR_PROVAVEIS_CARTOLA
+    return MotorCenarios(
+        insumos.partidas, contexto.rodada_atual, contexto.temporada, insumos.matriz_setores,
+        insumos.grade_elo, insumos.forma, insumos.agregados_provaveis, USAR_PROVAVEIS_CARTOLA
+    )
+
+
+def perfis_avaliaveis(registro) -> List[Tuple[str, Dict]]:
+    """(tipo, perfil) dos perfis do registro com método avaliado em cenários"""
+    from registro_perfis import TIPOS, metodo_do_perfil
+    return [
+        (tipo, perfil)
+        for tipo in TIPOS
+        for perfil in registro.perfis(tipo)
+        if metodo_do_perfil(tipo, perfil).metodo in METODOS_CENARIO[tipo]
+    ]
+
+
+class CalculadorCenarios:
+    """Sensibilidades dos perfis registrados sobre os insumos do último ciclo (API de leitura)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versao: Optional[str] = None
+        self._motor: Optional[MotorCenarios] = None
+        self._respostas: Dict[Tuple[str, tuple], object] = {}
+
+    def obter(self, tipo: str, perfil_id: int):
+        """
+        Resposta pré-serializada com a sensibilidade do perfil
+
+        Returns:
+            RespostaPreparada, ou None sem insumos do ciclo
+
+        Raises:
+            KeyError: perfil não registrado
+            ValueError: método do perfil fora dos cenários ou rodadas sem partidas
+        """
+        from api_leitura import RespostaPreparada
+        from calculo_sob_demanda import calculador_sob_demanda
+        from registro_perfis import registro_padrao
+
+        perfil = next((p for p in registro_padrao().perfis(tipo) if p['id'] == perfil_id), None)
+        if perfil is None:
+            raise KeyError(f"Perfil {perfil_id} ({tipo}) não registrado")
+        dados = calculador_sob_demanda.dados
+        if dados is None:
+            return None
+        contexto, insumos, versao = dados
+
+        # Um cálculo por vez: os cenários completos ocupam dezenas de MB por perfil
+        with self._lock:
+            if versao != self._versao:
+                self._motor = criar_motor(contexto, insumos)
+                self._versao = versao
+                self._respostas = {}
+            # Perfil inteiro na chave: um perfil alterado na recarga não reaproveita a resposta antiga
+            chave = (tipo, tuple(sorted(perfil.items())))
+            if chave not in self._respostas:
+                sensibilidade = self._motor.sensibilidade(tipo, perfil)
+                sensibilidade.update({'temporada': contexto.temporada, 'versao': versao})
+                self._respostas[chave] = RespostaPreparada(
+                    json.dumps(sensibilidade, separators=(',', ':')).encode('utf-8')
+                )
+            return self._respostas[chave]
+
+
+# Calculador único do processo (insumos do calculador sob demanda)
+calculador_cenarios = CalculadorCenarios()
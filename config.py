@@ -3,6 +3,17 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+def _ler_mapa(valor):
+    """Lê 'chave=numero,chave=numero' em {chave: float} (entradas inválidas são ignoradas)"""
+    mapa = {}
+    for item in (valor or '').split(','):
+        chave, _, numero = item.partition('=')
+        try:
+            mapa[chave.strip()] = float(numero)
+        except ValueError:
+            continue
+    return mapa
+
 # Configurações do PostgreSQL
 POSTGRES_CONFIG = {
     'host': os.getenv('POSTGRES_HOST', 'localhost'),
@@ -12,13 +23,83 @@ POSTGRES_CONFIG = {
     'database': os.getenv('POSTGRES_DB', 'cartola_manager')
 }
 
+# Criar/verificar os índices das tabelas de origem (acf_partidas, acf_atletas) na inicialização
+PROVISIONAR_INDICES = os.getenv('PROVISIONAR_INDICES', 'true').lower() in ('1', 'true', 'sim')
+
 # Configurações de API
-API_URL_STATUS = "https://api.cartola.globo.com/mercado/status"
+API_URL_STATUS = os.getenv('API_URL_STATUS', "https://api.cartola.globo.com/mercado/status")
 
 # Configurações de agendamento
 CALCULATION_INTERVAL_MINUTES = int(os.getenv('CALCULATION_INTERVAL_MINUTES', '15'))
+# Cadência curta logo após a abertura do mercado e nas horas antes do fechamento
+INTERVALO_CURTO_MINUTOS = int(os.getenv('INTERVALO_CURTO_MINUTOS', '5'))
+JANELA_POS_ABERTURA_HORAS = float(os.getenv('JANELA_POS_ABERTURA_HORAS', '2'))
+JANELA_PRE_FECHAMENTO_HORAS = float(os.getenv('JANELA_PRE_FECHAMENTO_HORAS', '3'))
+# Backoff com o mercado fechado: começa no mínimo e dobra até o máximo
+INTERVALO_FECHADO_MIN_MINUTOS = int(os.getenv('INTERVALO_FECHADO_MIN_MINUTOS', '5'))
+INTERVALO_FECHADO_MAX_MINUTOS = int(os.getenv('INTERVALO_FECHADO_MAX_MINUTOS', '60'))
+
+# Jobs por família (nomes em registro_perfis.METODOS): intervalo mínimo entre execuções em minutos (ausente =
+# segue a política) e prazo esperado em segundos (execuções mais longas geram aviso)
+FAMILIAS_CADENCIA = _ler_mapa(os.getenv('FAMILIAS_CADENCIA', 'rating=30'))
+FAMILIAS_PRAZO = _ler_mapa(os.getenv(
+    'FAMILIAS_PRAZO', 'jogo=120,rating=300,sg=120,forma_jogo=120,forma_sg=120,ajustado_jogo=120,ajustado_sg=120,poisson_sg=120'
+))
+# Validade do snapshot de status e insumos compartilhado entre famílias que rodam juntas
+SNAPSHOT_CICLO_TTL_SEGUNDOS = float(os.getenv('SNAPSHOT_CICLO_TTL_SEGUNDOS', '300'))
+
+# Orçamentos de tempo (s) de um ciclo/job e de cada perfil; 0 = sem limite. Um perfil que estoura
+# o orçamento (ou falha) mantém os pesos da publicação anterior, marcados como obsoletos
+ORCAMENTO_CICLO_SEGUNDOS = float(os.getenv('ORCAMENTO_CICLO_SEGUNDOS', '600'))
+ORCAMENTO_PERFIL_SEGUNDOS = float(os.getenv('ORCAMENTO_PERFIL_SEGUNDOS', '60'))
+
+# Usar os prováveis do Cartola (tabela provaveis_cartola) em vez do status dos atletas
+USAR_PROVAVEIS_CARTOLA = os.getenv('USAR_PROVAVEIS_CARTOLA', 'false').lower() in ('1', 'true', 'sim')
+
+# Agregação das últimas partidas: 'python' (traz as partidas e agrega no processo) ou
+# 'sql' (agrega no servidor com funções de janela; indicado para banco remoto)
+MODO_AGREGACAO = os.getenv('MODO_AGREGACAO', 'python').lower()
+
+# API de leitura embutida (serve os pesos publicados a partir de cache em memória)
+API_LEITURA_HABILITADA = os.getenv('API_LEITURA_HABILITADA', 'false').lower() in ('1', 'true', 'sim')
+API_LEITURA_HOST = os.getenv('API_LEITURA_HOST', '0.0.0.0')
+API_LEITURA_PORTA = int(os.getenv('API_LEITURA_PORTA', '8080'))
+# Perfis sob demanda (GET /calcular): resultados memorizados em LRU por especificação e versão dos dados
+SOB_DEMANDA_MAX_ENTRADAS = int(os.getenv('SOB_DEMANDA_MAX_ENTRADAS', '256'))
+# Simulação bootstrap (GET /simulacao e subcomando simulate): reamostragens por clube e semente fixa
+SIMULACAO_AMOSTRAS = int(os.getenv('SIMULACAO_AMOSTRAS', '10000'))
+SIMULACAO_SEMENTE = int(os.getenv('SIMULACAO_SEMENTE', '42'))
+
+# Perfis em arquivo JSON ({"jogo": [...], "sg": [...]}) no lugar de PERFIS_PESO_JOGO/PERFIS_PESO_SG
+# abaixo; no serve o arquivo é verificado a cada PERFIS_VERIFICACAO_SEGUNDOS e recarregado sem restart
+PERFIS_ARQUIVO = os.getenv('PERFIS_ARQUIVO', '')
+PERFIS_VERIFICACAO_SEGUNDOS = float(os.getenv('PERFIS_VERIFICACAO_SEGUNDOS', '30'))
+
+# Diretório (volume compartilhado) do snapshot binário publicado a cada ciclo; vazio desabilita
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', '')
+
+# Cache persistente entre ciclos (setores, tabela e ratings por rodada); vazio desabilita
+CACHE_DIR = os.getenv('CACHE_DIR', 'cache')
+CACHE_MAX_MB = int(os.getenv('CACHE_MAX_MB', '64'))
+
+# Cliente da API de status: timeouts (s), tentativas com backoff, prazo total por consulta (s)
+# e circuit breaker (falhas seguidas até abrir, pausa em s)
+STATUS_TIMEOUT_CONEXAO = float(os.getenv('STATUS_TIMEOUT_CONEXAO', '3'))
+STATUS_TIMEOUT_LEITURA = float(os.getenv('STATUS_TIMEOUT_LEITURA', '5'))
+STATUS_MAX_TENTATIVAS = int(os.getenv('STATUS_MAX_TENTATIVAS', '3'))
+STATUS_PRAZO_TOTAL = float(os.getenv('STATUS_PRAZO_TOTAL', '10'))
+STATUS_CIRCUITO_FALHAS = int(os.getenv('STATUS_CIRCUITO_FALHAS', '5'))
+STATUS_CIRCUITO_PAUSA = float(os.getenv('STATUS_CIRCUITO_PAUSA', '120'))
+# Último status válido em disco (fallback quando a API falha); vazio desabilita
+STATUS_ARQUIVO_ULTIMO = os.getenv(
+    'STATUS_ARQUIVO_ULTIMO', os.path.join(CACHE_DIR, 'status_mercado.json') if CACHE_DIR else ''
+)
+# Idade máxima (s) do último status válido usado como fallback; mais antigo é descartado (0 = sem limite)
+STATUS_IDADE_MAXIMA_SEGUNDOS = float(os.getenv('STATUS_IDADE_MAXIMA_SEGUNDOS', '900'))
 
 # Configurações de perfis
+# Cada perfil declara o método ('metodo': 'janela' se ausente, 'rating', 'ajustado', 'ewma' ou 'poisson') e seus
+# parâmetros; registro_perfis.py valida os perfis e planeja os intermediários do ciclo
 # 10 perfis de peso do jogo: 5 brandos (raiz quarta 1/4) e 5 agressivos (raiz cúbica 1/3)
 # Cada grupo usa os mesmos valores de últimas partidas: 2, 4, 7, 10, 12
 PERFIS_PESO_JOGO = [
@@ -37,11 +118,26 @@ PERFIS_PESO_JOGO = [
     {'id': 10, 'ultimas_partidas': 12, 'expoente': 1/3, 'descricao': 'Últimos 12 jogos (Agressivo)'},
     
     # Perfis baseados em rating (ELO) - 5 perfis com os mesmos números de jogos
+    # Chaves opcionais: k_factor, divisor_elo, vantagem_casa e modo_rating ('geral' ou 'mando')
     {'id': 11, 'ultimas_partidas': 2, 'expoente': 1/4, 'metodo': 'rating', 'descricao': 'Rating - Últimos 2 jogos'},
     {'id': 12, 'ultimas_partidas': 4, 'expoente': 1/4, 'metodo': 'rating', 'descricao': 'Rating - Últimos 4 jogos'},
     {'id': 13, 'ultimas_partidas': 7, 'expoente': 1/4, 'metodo': 'rating', 'descricao': 'Rating - Últimos 7 jogos'},
     {'id': 14, 'ultimas_partidas': 10, 'expoente': 1/4, 'metodo': 'rating', 'descricao': 'Rating - Últimos 10 jogos'},
     {'id': 15, 'ultimas_partidas': 12, 'expoente': 1/4, 'metodo': 'rating', 'descricao': 'Rating - Últimos 12 jogos'},
+    
+    # Perfis ajustados pela força dos adversários (tabela de classificação) - mesmos números de jogos
+    {'id': 16, 'ultimas_partidas': 2, 'expoente': 1/4, 'metodo': 'ajustado', 'descricao': 'Ajustado - Últimos 2 jogos'},
+    {'id': 17, 'ultimas_partidas': 4, 'expoente': 1/4, 'metodo': 'ajustado', 'descricao': 'Ajustado - Últimos 4 jogos'},
+    {'id': 18, 'ultimas_partidas': 7, 'expoente': 1/4, 'metodo': 'ajustado', 'descricao': 'Ajustado - Últimos 7 jogos'},
+    {'id': 19, 'ultimas_partidas': 10, 'expoente': 1/4, 'metodo': 'ajustado', 'descricao': 'Ajustado - Últimos 10 jogos'},
+    {'id': 20, 'ultimas_partidas': 12, 'expoente': 1/4, 'metodo': 'ajustado', 'descricao': 'Ajustado - Últimos 12 jogos'},
+    
+    # Perfis de forma EWMA (forma_ewma.py): ultimas_partidas é a meia-vida, em partidas com o mando
+    {'id': 21, 'ultimas_partidas': 1, 'expoente': 1/4, 'metodo': 'ewma', 'descricao': 'Forma EWMA - meia-vida 1 jogo'},
+    {'id': 22, 'ultimas_partidas': 2, 'expoente': 1/4, 'metodo': 'ewma', 'descricao': 'Forma EWMA - meia-vida 2 jogos'},
+    {'id': 23, 'ultimas_partidas': 3, 'expoente': 1/4, 'metodo': 'ewma', 'descricao': 'Forma EWMA - meia-vida 3 jogos'},
+    {'id': 24, 'ultimas_partidas': 5, 'expoente': 1/4, 'metodo': 'ewma', 'descricao': 'Forma EWMA - meia-vida 5 jogos'},
+    {'id': 25, 'ultimas_partidas': 8, 'expoente': 1/4, 'metodo': 'ewma', 'descricao': 'Forma EWMA - meia-vida 8 jogos'},
 ]
 
 # 10 perfis de peso do SG: 5 brandos e 5 agressivos
@@ -62,5 +158,32 @@ PERFIS_PESO_SG = [
     {'id': 8, 'ultimas_partidas': 7, 'agressividade': 'agressivo', 'descricao': 'Últimos 7 jogos (Agressivo)'},
     {'id': 9, 'ultimas_partidas': 10, 'agressividade': 'agressivo', 'descricao': 'Últimos 10 jogos (Agressivo)'},
     {'id': 10, 'ultimas_partidas': 12, 'agressividade': 'agressivo', 'descricao': 'Últimos 12 jogos (Agressivo)'},
+    
+    # Perfis ajustados pela força dos adversários (tabela de classificação): 5 brandos e 5 agressivos
+    {'id': 11, 'ultimas_partidas': 2, 'agressividade': 'brando', 'metodo': 'ajustado', 'descricao': 'Ajustado - Últimos 2 jogos (Brando)'},
+    {'id': 12, 'ultimas_partidas': 4, 'agressividade': 'brando', 'metodo': 'ajustado', 'descricao': 'Ajustado - Últimos 4 jogos (Brando)'},
+    {'id': 13, 'ultimas_partidas': 7, 'agressividade': 'brando', 'metodo': 'ajustado', 'descricao': 'Ajustado - Últimos 7 jogos (Brando)'},
+    {'id': 14, 'ultimas_partidas': 10, 'agressividade': 'brando', 'metodo': 'ajustado', 'descricao': 'Ajustado - Últimos 10 jogos (Brando)'},
+    {'id': 15, 'ultimas_partidas': 12, 'agressividade': 'brando', 'metodo': 'ajustado', 'descricao': 'Ajustado - Últimos 12 jogos (Brando)'},
+    {'id': 16, 'ultimas_partidas': 2, 'agressividade': 'agressivo', 'metodo': 'ajustado', 'descricao': 'Ajustado - Últimos 2 jogos (Agressivo)'},
+    {'id': 17, 'ultimas_partidas': 4, 'agressividade': 'agressivo', 'metodo': 'ajustado', 'descricao': 'Ajustado - Últimos 4 jogos (Agressivo)'},
+    {'id': 18, 'ultimas_partidas': 7, 'agressividade': 'agressivo', 'metodo': 'ajustado', 'descricao': 'Ajustado - Últimos 7 jogos (Agressivo)'},
+    {'id': 19, 'ultimas_partidas': 10, 'agressividade': 'agressivo', 'metodo': 'ajustado', 'descricao': 'Ajustado - Últimos 10 jogos (Agressivo)'},
+    {'id': 20, 'ultimas_partidas': 12, 'agressividade': 'agressivo', 'metodo': 'ajustado', 'descricao': 'Ajustado - Últimos 12 jogos (Agressivo)'},
+    
+    # Perfis de forma EWMA: ultimas_partidas é a meia-vida (aproveitamento recente com meia-vida 3)
+    {'id': 21, 'ultimas_partidas': 1, 'agressividade': 'brando', 'metodo': 'ewma', 'descricao': 'Forma EWMA - meia-vida 1 jogo'},
+    {'id': 22, 'ultimas_partidas': 2, 'agressividade': 'brando', 'metodo': 'ewma', 'descricao': 'Forma EWMA - meia-vida 2 jogos'},
+    {'id': 23, 'ultimas_partidas': 3, 'agressividade': 'brando', 'metodo': 'ewma', 'descricao': 'Forma EWMA - meia-vida 3 jogos'},
+    {'id': 24, 'ultimas_partidas': 5, 'agressividade': 'brando', 'metodo': 'ewma', 'descricao': 'Forma EWMA - meia-vida 5 jogos'},
+    {'id': 25, 'ultimas_partidas': 8, 'agressividade': 'brando', 'metodo': 'ewma', 'descricao': 'Forma EWMA - meia-vida 8 jogos'},
+
+    # Perfis Poisson (Dixon-Coles): ultimas_partidas é a meia-vida (rodadas) da ponderação das partidas
+    # da temporada; o peso do SG é a probabilidade de clean sheet do modelo
+    {'id': 26, 'ultimas_partidas': 3, 'metodo': 'poisson', 'descricao': 'Poisson - meia-vida 3 rodadas'},
+    {'id': 27, 'ultimas_partidas': 5, 'metodo': 'poisson', 'descricao': 'Poisson - meia-vida 5 rodadas'},
+    {'id': 28, 'ultimas_partidas': 8, 'metodo': 'poisson', 'descricao': 'Poisson - meia-vida 8 rodadas'},
+    {'id': 29, 'ultimas_partidas': 12, 'metodo': 'poisson', 'descricao': 'Poisson - meia-vida 12 rodadas'},
+    {'id': 30, 'ultimas_partidas': 19, 'metodo': 'poisson', 'descricao': 'Poisson - meia-vida 19 rodadas'},
 ]
 
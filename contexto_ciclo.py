@@ -0,0 +1,118 @@
+"""
+Contexto imutável de um ciclo de cálculos
+
+Criado uma vez no início do ciclo, a partir de uma única consulta ao status do mercado, e
+passado a todos os calculadores, aos rankings e à publicação. Assim nenhum cálculo volta a
+consultar a API do Cartola no meio do ciclo (ex.: quando o cache de 1 hora da temporada expira).
+
+O contexto também carrega o prazo do ciclo (ou do perfil): os calculadores chamam
+verificar_prazo() entre as partidas e abandonam o perfil com PrazoEsgotado quando o
+orçamento de tempo acaba (cancelamento cooperativo).
+"""
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PrazoEsgotado(Exception):
+    """Orçamento de tempo do ciclo ou do perfil esgotado"""
+
+
+@dataclass(frozen=True)
+class ContextoCiclo:
+    """
+    Dados fixos de um ciclo
+
+    Attributes:
+        rodada_atual: Rodada calculada
+        temporada: Temporada do ciclo
+        status_mercado: Status do mercado no início do ciclo (1 = aberto; None se não consultado)
+        impressoes: Hashes do conteúdo dos dados de entrada (chaves do cache persistente)
+        tempos: Duração de cada etapa em segundos (único campo acumulado durante o ciclo)
+        iniciado_em: Início do ciclo
+        prazo: Instante limite (time.monotonic) do ciclo ou do perfil; None = sem limite
+    """
+    rodada_atual: int
+    temporada: int
+    status_mercado: Optional[int] = None
+    impressoes: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+    tempos: Dict[str, float] = field(default_factory=dict, compare=False)
+    iniciado_em: datetime = field(default_factory=datetime.now, compare=False)
+    prazo: Optional[float] = field(default=None, compare=False)
+
+    def com_impressoes(self, impressoes: Mapping[str, str]) -> 'ContextoCiclo':
+        """Novo contexto com as impressões dos dados (os tempos continuam compartilhados)"""
+        return replace(self, impressoes=MappingProxyType(dict(impressoes)), tempos=self.tempos)
+
+    def com_prazo(self, segundos: Optional[float]) -> 'ContextoCiclo':
+        """Novo contexto com prazo daqui a `segundos` (nunca além do prazo atual; 0/None mantém o atual)"""
+        if not segundos:
+            return self
+        prazo = time.monotonic() + segundos
+        if self.prazo is not None:
+            prazo = min(prazo, self.prazo)
+        return replace(self, prazo=prazo, tempos=self.tempos)
+
+    def restante(self) -> Optional[float]:
+        """Segundos até o prazo (None se sem limite)"""
+        if self.prazo is None:
+            return None
+        return max(0.0, self.prazo - time.monotonic())
+
+    @property
+    def prazo_esgotado(self) -> bool:
+        return self.prazo is not None and time.monotonic() >= self.prazo
+
+    def verificar_prazo(self):
+        """Levanta PrazoEsgotado se o prazo passou (ponto de cancelamento cooperativo)"""
+        if self.prazo_esgotado:
+            raise PrazoEsgotado(f"prazo esgotado na rodada {self.rodada_atual}")
+
+    @contextmanager
+    def medir(self, etapa: str):
+        """Acumula em tempos[etapa] a duração do bloco"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.tempos[etapa] = self.tempos.get(etapa, 0.0) + time.perf_counter() - inicio
+
+    @property
+    def duracao(self) -> float:
+        """Segundos desde o início do ciclo"""
+        return (datetime.now() - self.iniciado_em).total_seconds()
+
+
+def criar_contexto(status_data: Optional[Dict] = None, rodada_atual: Optional[int] = None) -> Optional[ContextoCiclo]:
+    """
+    Cria o contexto do ciclo com no máximo uma consulta à API de status
+
+    Args:
+        status_data: Status do mercado já obtido (se None, consulta a API uma vez)
+        rodada_atual: Rodada a calcular (padrão: rodada atual do status)
+
+    Returns:
+        ContextoCiclo, ou None se não há rodada (status indisponível e nenhuma rodada informada)
+    """
+    from api_cartola import fetch_status_data, temporada_do_status
+
+    if status_data is None:
+        status_data = fetch_status_data()
+    if not status_data and rodada_atual is None:
+        return None
+
+    rodada = rodada_atual or (status_data or {}).get('rodada_atual')
+    if not rodada:
+        return None
+
+    return ContextoCiclo(
+        rodada_atual=rodada,
+        temporada=temporada_do_status(status_data),
+        status_mercado=(status_data or {}).get('status_mercado'),
+    )
@@ -1,10 +1,71 @@
 import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
 from psycopg2.extras import RealDictCursor
+import json
 import logging
-from config import POSTGRES_CONFIG
+from contextlib import contextmanager
+from contexto_ciclo import PrazoEsgotado
+from config import POSTGRES_CONFIG, PROVISIONAR_INDICES
 
 logger = logging.getLogger(__name__)
 
+# Índices das tabelas de origem usados pelas consultas quentes dos cálculos (CONSULTAS_QUENTES).
+# De cobertura (INCLUDE com as colunas lidas) e, quando a consulta filtra, parciais, para que as
+# leituras do ciclo virem index-only scans.
+INDICES_ORIGEM = [
+    # Temporada inteira em ordem de rodada: tabela de partidas do ciclo e impressão das partidas
+    ('idx_acf_partidas_temporada_ordem', 'acf_partidas', '''
+        ON acf_partidas (temporada, rodada_id, partida_id)
+        INCLUDE (clube_casa_id, clube_visitante_id, placar_oficial_mandante, placar_oficial_visitante, valida)
+    '''),
+    # Partidas válidas até a rodada: agregados por janela no modo 'sql' e partidas da rodada
+    ('idx_acf_partidas_validas_rodada', 'acf_partidas', '''
+        ON acf_partidas (temporada, rodada_id)
+        INCLUDE (partida_id, clube_casa_id, clube_visitante_id, placar_oficial_mandante, placar_oficial_visitante)
+        WHERE valida = TRUE
+    '''),
+    # Atletas status 7 por posição: matriz de setores e impressão dos atletas
+    ('idx_acf_atletas_posicao_status7', 'acf_atletas', '''
+        ON acf_atletas (posicao_id)
+        INCLUDE (atleta_id, clube_id, media_num, jogos_num)
+        WHERE status_id = 7
+    '''),
+    # Junção com os prováveis do Cartola: matriz de setores e agregados de prováveis
+    ('idx_acf_atletas_atleta_cobertura', 'acf_atletas', '''
+        ON acf_atletas (atleta_id)
+        INCLUDE (clube_id, posicao_id, media_num, jogos_num)
+    '''),
+    ('idx_provaveis_cartola_provavel', 'provaveis_cartola', '''
+        ON provaveis_cartola (atleta_id)
+        WHERE status = 'provavel'
+    '''),
+]
+
+# Índices de versões anteriores, para consultas que não existem mais (removidos no provisionamento)
+INDICES_OBSOLETOS = (
+    'idx_acf_partidas_casa_recentes',
+    'idx_acf_partidas_visitante_recentes',
+    'idx_acf_partidas_temporada_rodada',
+    'idx_acf_atletas_clube_posicao_provaveis',
+)
+
+# Consultas quentes verificadas com EXPLAIN após o provisionamento: {nome: (módulo, constante com o SQL)}.
+# O SQL é lido dos módulos que o executam, para que a verificação acompanhe as consultas reais.
+CONSULTAS_QUENTES = {
+    'partidas_temporada': ('modelo_dados', 'CONSULTA_PARTIDAS_TEMPORADA'),
+    'agregados_janela': ('agregados_janela', 'CONSULTA_AGREGADOS_JANELA'),
+    'setores': ('motor_setores', 'CONSULTA_SETORES'),
+    'setores_provaveis': ('motor_setores', 'CONSULTA_SETORES_PROVAVEIS'),
+    'agregados_provaveis': ('motor_setores', 'CONSULTA_AGREGADOS_PROVAVEIS'),
+}
+
+_indices_provisionados = False
+
+# Erros que indicam estouro do orçamento de tempo: cancelamento cooperativo (PrazoEsgotado)
+# ou consulta cancelada pelo statement_timeout
+ERROS_PRAZO = (PrazoEsgotado, psycopg2.errors.QueryCanceled)
+
 def get_db_connection():
     """Conecta ao banco de dados PostgreSQL"""
     try:
@@ -23,6 +84,34 @@ def close_db_connection(conn):
         except psycopg2.Error as e:
             logger.error(f"Erro ao fechar conexão: {e}")
 
+@contextmanager
+def tempo_limite_consultas(conn, segundos):
+    """
+    Limita a duração de cada consulta da conexão (statement_timeout) durante o bloco
+
+    Uma consulta que passa do limite é cancelada pelo servidor (psycopg2.errors.QueryCanceled).
+    O limite vale para a sessão (sobrevive aos commits dos calculadores) e é restaurado ao sair.
+
+    Args:
+        conn: Conexão com banco
+        segundos: Limite em segundos (None = sem limite)
+    """
+    if segundos is None:
+        yield
+        return
+    
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SET statement_timeout = %s", (max(1, int(segundos * 1000)),))
+        conn.commit()
+        yield
+    finally:
+        if conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+            conn.rollback()
+        cursor.execute("SET statement_timeout = DEFAULT")
+        conn.commit()
+        cursor.close()
+
 def init_tables(conn):
     """Cria as tabelas necessárias para armazenar os perfis"""
     cursor = conn.cursor()
@@ -58,6 +147,41 @@ def init_tables(conn):
             );
         ''')
         
+        # Matriz materializada de combinações (perfil jogo × perfil SG) por rodada
+        # Layout do blob documentado em matriz_combinacoes.py
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS acp_matriz_combinacoes (
+                temporada INTEGER NOT NULL,
+                rodada_atual INTEGER NOT NULL,
+                formato_versao SMALLINT NOT NULL,
+                dados BYTEA NOT NULL,
+                created_at TIMESTAMP DEFAULT NOW(),
+                PRIMARY KEY (temporada, rodada_atual)
+            );
+        ''')
+        
+        # Registro das publicações: a geração identifica a versão dos resultados publicados
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS acp_publicacoes (
+                geracao BIGSERIAL PRIMARY KEY,
+                temporada INTEGER NOT NULL,
+                rodada_atual INTEGER NOT NULL,
+                hashes_perfis JSONB,
+                created_at TIMESTAMP DEFAULT NOW()
+            );
+        ''')
+        
+        # Pesos mantidos da publicação anterior quando o perfil estoura o orçamento ou falha
+        for tabela in ('acp_peso_jogo_perfis', 'acp_peso_sg_perfis'):
+            cursor.execute(f'''
+                ALTER TABLE {tabela} ADD COLUMN IF NOT EXISTS obsoleto BOOLEAN NOT NULL DEFAULT FALSE;
+            ''')
+        
+        # Probabilidade de clean sheet dos perfis Poisson (peso_sg guarda o valor normalizado)
+        cursor.execute('''
+            ALTER TABLE acp_peso_sg_perfis ADD COLUMN IF NOT EXISTS prob_clean_sheet REAL;
+        ''')
+        
         # Índices para performance
         cursor.execute('''
             CREATE INDEX IF NOT EXISTS idx_acp_peso_jogo_perfis 
@@ -71,11 +195,155 @@ def init_tables(conn):
         
         conn.commit()
         logger.info("Tabelas inicializadas com sucesso")
-        return True
     except psycopg2.Error as e:
         conn.rollback()
         logger.error(f"Erro ao criar tabelas: {e}")
         return False
     finally:
         cursor.close()
+    
+    # Índices das tabelas de origem: uma vez por processo (não bloqueia o ciclo se falhar)
+    global _indices_provisionados
+    if PROVISIONAR_INDICES and not _indices_provisionados:
+        try:
+            provisionar_indices(conn)
+            verificar_planos(conn)
+            _indices_provisionados = True
+        except psycopg2.Error as e:
+            logger.warning(f"Erro ao provisionar índices das tabelas de origem: {e}")
+    return True
+
+
+
+def provisionar_indices(conn):
+    """
+    Cria (de forma concorrente e idempotente) os índices das tabelas de origem
+
+    CREATE INDEX CONCURRENTLY não roda dentro de transação, então a conexão fica em autocommit
+    durante o provisionamento. Um índice deixado inválido por uma criação concorrente
+    interrompida é removido e recriado.
+    """
+    conn.commit()
+    autocommit_anterior = conn.autocommit
+    conn.autocommit = True
+    cursor = conn.cursor()
+    try:
+        for nome in INDICES_OBSOLETOS:
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (nome,))
+            if cursor.fetchone()[0]:
+                logger.info(f"Removendo índice obsoleto {nome}")
+                cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {nome}")
+        
+        for nome, tabela, definicao in INDICES_ORIGEM:
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (tabela,))
+            if not cursor.fetchone()[0]:
+                logger.debug(f"Tabela {tabela} não existe, índice {nome} não criado")
+                continue
+            
+            cursor.execute('''
+                SELECT i.indisvalid
+                FROM pg_index i
+                JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE c.relname = %s
+            ''', (nome,))
+            existente = cursor.fetchone()
+            if existente and existente[0]:
+                continue
+            if existente:
+                logger.warning(f"Índice {nome} inválido (criação interrompida), recriando")
+                cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {nome}")
+            
+            logger.info(f"Criando índice {nome} em {tabela}")
+            cursor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {nome} {definicao}")
+            cursor.execute(f"ANALYZE {tabela}")
+    finally:
+        cursor.close()
+        conn.autocommit = autocommit_anterior
+
+
+def _nos_seq_scan(plano):
+    """Percorre o plano do EXPLAIN (FORMAT JSON) e retorna os nós Seq Scan"""
+    nos = []
+    if plano.get('Node Type') == 'Seq Scan':
+        nos.append(plano)
+    for filho in plano.get('Plans', []):
+        nos.extend(_nos_seq_scan(filho))
+    return nos
+
+
+def verificar_planos(conn):
+    """
+    Executa EXPLAIN nas consultas quentes e avisa quando alguma cai em sequential scan
 
+    Verifica só as consultas que o ciclo executa com a configuração atual (a das janelas com
+    MODO_AGREGACAO=sql, as dos prováveis com USAR_PROVAVEIS_CARTOLA).
+
+    Returns:
+        {nome_consulta: [tabelas com Seq Scan]}
+    """
+    import importlib
+    from config import MODO_AGREGACAO, USAR_PROVAVEIS_CARTOLA
+    from motor_setores import POSICOES_SETORES, PARAMETROS_AGREGADOS_PROVAVEIS
+    
+    cursor = conn.cursor()
+    resultado = {}
+    try:
+        cursor.execute('''
+            SELECT to_regclass('acf_partidas') IS NOT NULL, to_regclass('acf_atletas') IS NOT NULL,
+                   to_regclass('provaveis_cartola') IS NOT NULL
+        ''')
+        tem_partidas, tem_atletas, tem_provaveis = cursor.fetchone()
+        if not (tem_partidas and tem_atletas):
+            return resultado
+        
+        # Parâmetros de exemplo reais: temporada e rodada mais recentes
+        cursor.execute('''
+            SELECT temporada, rodada_id
+            FROM acf_partidas WHERE valida = TRUE
+            ORDER BY temporada DESC, rodada_id DESC
+            LIMIT 1
+        ''')
+        exemplo = cursor.fetchone()
+        if not exemplo:
+            return resultado
+        temporada, rodada = exemplo
+        
+        parametros = {
+            'partidas_temporada': (temporada,),
+            'agregados_janela': {'rodada': rodada, 'temporada': temporada, 'janelas': [2, 5, 10]},
+            'setores': (list(POSICOES_SETORES),),
+            'setores_provaveis': (list(POSICOES_SETORES),),
+            'agregados_provaveis': PARAMETROS_AGREGADOS_PROVAVEIS,
+        }
+        ativas = ['partidas_temporada']
+        if MODO_AGREGACAO == 'sql':
+            ativas.append('agregados_janela')
+        if USAR_PROVAVEIS_CARTOLA and tem_provaveis:
+            ativas += ['setores_provaveis', 'agregados_provaveis']
+        else:
+            ativas.append('setores')
+        
+        for nome in ativas:
+            modulo, constante = CONSULTAS_QUENTES[nome]
+            consulta = getattr(importlib.import_module(modulo), constante)
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {consulta}", parametros[nome])
+            plano = cursor.fetchone()[0]
+            if isinstance(plano, str):
+                plano = json.loads(plano)
+            seq_scans = _nos_seq_scan(plano[0]['Plan'])
+            if seq_scans:
+                tabelas = [no.get('Relation Name') for no in seq_scans]
+                resultado[nome] = tabelas
+                logger.warning(
+                    f"Consulta quente '{nome}' usa sequential scan em {', '.join(tabelas)} "
+                    f"(linhas estimadas: {', '.join(str(no.get('Plan Rows')) for no in seq_scans)})"
+                )
+            else:
+                logger.debug(f"Consulta quente '{nome}' usa índice")
+        conn.commit()
+    except psycopg2.Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return resultado
@@ -0,0 +1,510 @@
+"""
+Famílias de cálculo e insumos compartilhados entre elas
+
+Cada família (peso do jogo normal, por rating e ajustado pela tabela, peso do SG normal, ajustado e
+Poisson, forma EWMA do jogo e do SG) calcula os perfis de um método (registro_perfis.METODOS) a partir dos
+mesmos insumos do ciclo. O plano de execução (registro_perfis.PlanoExecucao) diz quais
+intermediários os perfis registrados usam - matriz de setores, agregados das últimas partidas,
+forma EWMA, replay ELO, agregados ajustados, modelos de Poisson e agregados de prováveis - e carregar_insumos calcula
+cada um uma única vez, com a união dos parâmetros de todos os perfis. No serviço, cada família roda como um job
+independente, com cadência e prazo próprios (FAMILIAS_CADENCIA / FAMILIAS_PRAZO); famílias
+que rodam juntas reaproveitam o mesmo snapshot de status e de insumos (SnapshotCompartilhado),
+válido por SNAPSHOT_CICLO_TTL_SEGUNDOS.
+
+Cada perfil roda com orçamento de tempo (ORCAMENTO_PERFIL_SEGUNDOS, limitado ao que resta do
+orçamento do ciclo): statement_timeout nas consultas e cancelamento cooperativo entre as partidas.
+Um perfil que estoura o orçamento ou falha - e os perfis que não chegam a rodar porque o ciclo
+esgotou o orçamento - mantêm os pesos da publicação anterior, marcados como obsoletos.
+"""
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import USAR_PROVAVEIS_CARTOLA, FAMILIAS_CADENCIA, FAMILIAS_PRAZO, ORCAMENTO_PERFIL_SEGUNDOS
+from contexto_ciclo import PrazoEsgotado
+from metricas import metricas
+
+logger = logging.getLogger(__name__)
+
+
+class InsumosCiclo:
+    """Intermediários compartilhados por todas as famílias de um ciclo"""
+
+    __slots__ = ('partidas', 'grade_elo', 'matriz_setores', 'agregados', 'agregados_provaveis', 'forma', 'ajustados',
+                 'poisson')
+
+    def __init__(self, partidas, matriz_setores, agregados, agregados_provaveis=None, grade_elo=None, forma=None,
+                 ajustados=None, poisson=None):
+        self.partidas = partidas
+        self.grade_elo = grade_elo
+        self.matriz_setores = matriz_setores
+        self.agregados = agregados
+        self.agregados_provaveis = agregados_provaveis
+        self.forma = forma
+        self.ajustados = ajustados
+        self.poisson = poisson
+
+
+def carregar_insumos(conn, contexto, plano=None):
+    """
+    Calcula as impressões e os intermediários do plano de execução (cada um uma única vez)
+
+    Args:
+        conn: Conexão com o banco
+        contexto: ContextoCiclo da rodada
+        plano: PlanoExecucao (padrão: perfis de config.py)
+
+    Returns:
+        (contexto com impressões, InsumosCiclo); intermediários fora do plano ficam None
+
+    Raises:
+        database.ERROS_PRAZO: o orçamento do contexto esgotou durante o carregamento (os perfis
+        mantêm os pesos anteriores: FamiliaCalculo.manter_anteriores)
+    """
+    from cache_persistente import calcular_impressoes
+    from motor_setores import carregar_matriz_setores, carregar_agregados_provaveis
+    from agregados_janela import carregar_agregados_janela
+    from agregados_ajustados import carregar_agregados_ajustados
+    from modelo_dados import carregar_tabela_partidas
+    from motor_elo import replay_grade
+    from forma_ewma import carregar_forma_ewma
+    from modelo_poisson import carregar_modelos_poisson
+    from registro_perfis import plano_padrao
+    from database import tempo_limite_consultas
+
+    if plano is None:
+        plano = plano_padrao()
+    logger.info(f"Plano de execução: {plano.descrever()}")
+
+    def etapa(nome):
+        # Ponto de cancelamento entre as etapas (as consultas já têm o statement_timeout)
+        contexto.verificar_prazo()
+        return contexto.medir(nome)
+
+    matriz_setores = agregados_provaveis = agregados = forma = grade_elo = ajustados = poisson = None
+    cursor = conn.cursor()
+    try:
+        # Orçamento do ciclo também nas consultas dos insumos (as mais pesadas do ciclo)
+        with tempo_limite_consultas(conn, contexto.restante()):
+            # Impressões (hashes) dos dados de entrada: chaves do cache persistente entre ciclos
+            with etapa('impressoes'):
+                contexto = contexto.com_impressoes(calcular_impressoes(cursor, contexto.temporada))
+            impressao_partidas = contexto.impressoes.get('partidas')
+            # Partidas da temporada em arrays (índices densos de clubes) para tabela, ratings e agregados
+            with etapa('partidas'):
+                partidas = carregar_tabela_partidas(cursor, contexto.temporada, impressao_partidas)
+            # Replay ELO em lote para as configurações de todos os perfis de rating (uma passada)
+            if plano.precisa('elo'):
+                with etapa('elo'):
+                    grade_elo = replay_grade(partidas, contexto.rodada_atual, plano.configuracoes_elo)
+            # Matriz clube × setor compartilhada (os dados dos atletas não mudam entre perfis)
+            if plano.precisa('setores'):
+                with etapa('setores'):
+                    impressao_atletas = contexto.impressoes.get('atletas_provaveis' if USAR_PROVAVEIS_CARTOLA else 'atletas')
+                    matriz_setores = carregar_matriz_setores(
+                        cursor, usar_provaveis_cartola=USAR_PROVAVEIS_CARTOLA, impressao=impressao_atletas
+                    )
+            # Médias de defesa/ataque dos prováveis para o peso do SG (uma consulta agrupada)
+            if plano.precisa('provaveis'):
+                with etapa('provaveis'):
+                    agregados_provaveis = carregar_agregados_provaveis(cursor, contexto.impressoes.get('atletas_provaveis'))
+            # Agregados das últimas N partidas de todos os clubes, para todas as janelas dos perfis
+            if plano.precisa('agregados'):
+                with etapa('agregados'):
+                    agregados = carregar_agregados_janela(
+                        cursor, contexto.rodada_atual, contexto.temporada, plano.janelas, partidas=partidas
+                    )
+            # Forma EWMA: estado persistido entre ciclos, atualizado só com as partidas novas
+            if plano.precisa('forma'):
+                with etapa('forma'):
+                    forma = carregar_forma_ewma(partidas, contexto.temporada, contexto.rodada_atual, plano.meias_vidas)
+            # Tabela de classificação e agregados ponderados pela força dos adversários (perfis ajustados)
+            if plano.precisa('ajustados'):
+                with etapa('ajustados'):
+                    ajustados = carregar_agregados_ajustados(
+                        cursor, contexto.rodada_atual, contexto.temporada, plano.janelas_ajustadas,
+                        partidas=partidas, impressao=impressao_partidas
+                    )
+            # Modelos de Poisson da temporada, ajustados a partir dos parâmetros do ciclo anterior
+            if plano.precisa('poisson'):
+                with etapa('poisson'):
+                    poisson = carregar_modelos_poisson(
+                        partidas, contexto.temporada, contexto.rodada_atual, plano.meias_vidas_poisson
+                    )
+    finally:
+        cursor.close()
+
+    return contexto, InsumosCiclo(
+        partidas, matriz_setores, agregados, agregados_provaveis, grade_elo, forma, ajustados, poisson
+    )
+
+
+def _calcular_jogo(conn, contexto, perfil, insumos):
+    from calculo_peso_jogo import calculate_peso_jogo_for_profile
+    calculate_peso_jogo_for_profile(
+        conn,
+        contexto.rodada_atual,
+        perfil,
+        usar_provaveis_cartola=USAR_PROVAVEIS_CARTOLA,
+        matriz_setores=insumos.matriz_setores,
+        agregados=insumos.agregados,
+        contexto=contexto
+    )
+
+
+def _calcular_rating(conn, contexto, perfil, insumos):
+    from calculo_peso_jogo_rating import calculate_peso_jogo_for_profile_rating
+    calculate_peso_jogo_for_profile_rating(
+        conn,
+        contexto.rodada_atual,
+        perfil,
+        usar_provaveis_cartola=USAR_PROVAVEIS_CARTOLA,
+        matriz_setores=insumos.matriz_setores,
+        partidas=insumos.partidas,
+        grade_elo=insumos.grade_elo,
+        contexto=contexto
+    )
+
+
+def _calcular_sg(conn, contexto, perfil, insumos):
+    from calculo_peso_sg import calculate_peso_sg_for_profile
+    calculate_peso_sg_for_profile(
+        conn,
+        contexto.rodada_atual,
+        perfil,
+        usar_provaveis_cartola=USAR_PROVAVEIS_CARTOLA,
+        agregados_provaveis=insumos.agregados_provaveis,
+        agregados=insumos.agregados,
+        contexto=contexto
+    )
+
+
+def _calcular_forma_jogo(conn, contexto, perfil, insumos):
+    from calculo_peso_jogo import calculate_peso_jogo_for_profile
+    # Mesmo cálculo dos perfis por janela, com a forma EWMA no lugar dos agregados
+    calculate_peso_jogo_for_profile(
+        conn,
+        contexto.rodada_atual,
+        perfil,
+        usar_provaveis_cartola=USAR_PROVAVEIS_CARTOLA,
+        matriz_setores=insumos.matriz_setores,
+        agregados=insumos.forma,
+        contexto=contexto
+    )
+
+
+def _calcular_forma_sg(conn, contexto, perfil, insumos):
+    from calculo_peso_sg import calculate_peso_sg_for_profile
+    calculate_peso_sg_for_profile(
+        conn,
+        contexto.rodada_atual,
+        perfil,
+        usar_provaveis_cartola=USAR_PROVAVEIS_CARTOLA,
+        agregados_provaveis=insumos.agregados_provaveis,
+        agregados=insumos.forma,
+        contexto=contexto
+    )
+
+
+def _calcular_ajustado_jogo(conn, contexto, perfil, insumos):
+    from calculo_peso_jogo_ajustado import calculate_peso_jogo_for_profile_ajustado
+    calculate_peso_jogo_for_profile_ajustado(
+        conn,
+        contexto.rodada_atual,
+        perfil,
+        usar_provaveis_cartola=USAR_PROVAVEIS_CARTOLA,
+        matriz_setores=insumos.matriz_setores,
+        ajustados=insumos.ajustados,
+        contexto=contexto
+    )
+
+
+def _calcular_ajustado_sg(conn, contexto, perfil, insumos):
+    from calculo_peso_sg_ajustado import calculate_peso_sg_for_profile_ajustado
+    calculate_peso_sg_for_profile_ajustado(
+        conn,
+        contexto.rodada_atual,
+        perfil,
+        usar_provaveis_cartola=USAR_PROVAVEIS_CARTOLA,
+        agregados_provaveis=insumos.agregados_provaveis,
+        ajustados=insumos.ajustados,
+        contexto=contexto
+    )
+
+
+def _calcular_poisson_sg(conn, contexto, perfil, insumos):
+    from calculo_peso_sg_poisson import calculate_peso_sg_for_profile_poisson
+    calculate_peso_sg_for_profile_poisson(
+        conn,
+        contexto.rodada_atual,
+        perfil,
+        partidas=insumos.partidas,
+        modelos=insumos.poisson,
+        contexto=contexto
+    )
+
+
+def _ranking_jogo(conn, contexto, perfil_id):
+    from mostrar_rankings import mostrar_ranking_peso_jogo
+    mostrar_ranking_peso_jogo(conn, contexto.rodada_atual, perfil_id, contexto.temporada)
+
+
+def _ranking_sg(conn, contexto, perfil_id):
+    from mostrar_rankings import mostrar_ranking_peso_sg
+    mostrar_ranking_peso_sg(conn, contexto.rodada_atual, perfil_id, contexto.temporada)
+
+
+class FamiliaCalculo:
+    """
+    Grupo de perfis calculados pela mesma função
+
+    Args:
+        nome: Identificador (usado em FAMILIAS_CADENCIA / FAMILIAS_PRAZO e no id do job)
+        titulo: Texto exibido no log
+        tipo: Tipo dos pesos gravados ('jogo' ou 'sg'; ver publicacao.TABELAS_PESOS)
+        perfis: Perfis da família
+        calcular: f(conn, contexto, perfil, insumos)
+        ranking: f(conn, contexto, perfil_id) para exibir o ranking de um perfil
+        perfis_ranking: Perfis cujo ranking é exibido no log
+        cadencia_minutos: Intervalo mínimo entre execuções da família (0 = segue a política)
+        prazo_segundos: Duração esperada; execuções mais longas são registradas como estouro
+    """
+
+    def __init__(self, nome: str, titulo: str, tipo: str, perfis: List[Dict], calcular: Callable,
+                 ranking: Optional[Callable] = None, perfis_ranking=(),
+                 cadencia_minutos: float = 0, prazo_segundos: float = 0):
+        self.nome = nome
+        self.titulo = titulo
+        self.tipo = tipo
+        self.perfis = perfis
+        self.calcular = calcular
+        self.ranking = ranking
+        self.perfis_ranking = tuple(perfis_ranking)
+        self.cadencia_minutos = cadencia_minutos
+        self.prazo_segundos = prazo_segundos
+        # Proteção contra sobreposição (um job da família por vez)
+        self.lock = threading.Lock()
+        # Cadeia de execuções parada por falta de perfis (a recarga que devolve perfis agenda a família)
+        self.suspensa = False
+
+    def executar(self, conn, contexto, insumos, mostrar_rankings: bool = True) -> int:
+        """
+        Calcula todos os perfis da família dentro do prazo do contexto
+
+        Returns:
+            Número de perfis com erro ou fora do orçamento (mantidos com os pesos anteriores)
+        """
+        from database import ERROS_PRAZO, tempo_limite_consultas
+
+        logger.info(f"\n{'='*80}")
+        logger.info(f"CALCULANDO {self.titulo} ({len(self.perfis)} PERFIS)")
+        logger.info(f"{'='*80}\n")
+
+        erros = 0
+        for perfil in self.perfis:
+            if contexto.prazo_esgotado:
+                # Orçamento do ciclo esgotado: os perfis restantes nem começam
+                erros += 1
+                metricas.registrar_estouro('ciclo', self.nome, perfil['id'])
+                logger.warning(f"[PRAZO] Orçamento do ciclo esgotado; perfil {perfil['id']} ({self.nome}) não calculado")
+                self._manter_anteriores(conn, contexto, perfil['id'])
+                continue
+
+            contexto_perfil = contexto.com_prazo(ORCAMENTO_PERFIL_SEGUNDOS)
+            try:
+                logger.info(f"Processando perfil {perfil['id']}: {perfil['descricao']}")
+                with contexto.medir(self.nome), tempo_limite_consultas(conn, contexto_perfil.restante()):
+                    self.calcular(conn, contexto_perfil, perfil, insumos)
+                logger.info(f"[OK] Perfil {perfil['id']} ({self.nome}) concluido")
+                # Mostrar ranking apenas para alguns perfis (para não poluir o log)
+                if mostrar_rankings and self.ranking and perfil['id'] in self.perfis_ranking:
+                    self.ranking(conn, contexto, perfil['id'])
+            except ERROS_PRAZO as e:
+                erros += 1
+                escopo = 'ciclo' if contexto.prazo_esgotado else 'perfil'
+                metricas.registrar_estouro(escopo, self.nome, perfil['id'])
+                logger.warning(f"[PRAZO] Perfil {perfil['id']} ({self.nome}) interrompido: orçamento do {escopo} esgotado ({e})")
+                self._manter_anteriores(conn, contexto, perfil['id'])
+            except Exception as e:
+                erros += 1
+                logger.error(f"[ERRO] Erro ao processar perfil {perfil['id']} ({self.nome}): {e}")
+                self._manter_anteriores(conn, contexto, perfil['id'])
+        return erros
+
+    def manter_anteriores(self, conn, contexto):
+        """Mantém os pesos anteriores de todos os perfis (os insumos do ciclo não couberam no orçamento)"""
+        for perfil in self.perfis:
+            metricas.registrar_estouro('ciclo', self.nome, perfil['id'])
+            self._manter_anteriores(conn, contexto, perfil['id'])
+
+    def parcial(self, perfil_ids) -> 'FamiliaCalculo':
+        """Cópia da família restrita a alguns perfis (mesmo cálculo e ranking; usada na recarga de perfis)"""
+        return FamiliaCalculo(
+            self.nome, self.titulo, self.tipo, [p for p in self.perfis if p['id'] in perfil_ids],
+            self.calcular, self.ranking, self.perfis_ranking,
+            cadencia_minutos=self.cadencia_minutos, prazo_segundos=self.prazo_segundos
+        )
+
+    def registrar_duracao(self, duracao: float) -> bool:
+        """
+        Registra em metricas um estouro do prazo esperado da família (prazo_segundos)
+
+        Returns:
+            True se a execução excedeu o prazo
+        """
+        if not self.prazo_segundos or duracao <= self.prazo_segundos:
+            return False
+        metricas.registrar_estouro('familia', self.nome)
+        logger.warning(f"Família {self.nome} excedeu o prazo: {duracao:.1f}s (prazo {self.prazo_segundos:.0f}s)")
+        return True
+
+    def _manter_anteriores(self, conn, contexto, perfil_id: int):
+        """Mantém os pesos anteriores do perfil (obsoletos) para a rodada não ficar sem pesos"""
+        from publicacao import manter_pesos_anteriores
+        try:
+            mantidos = manter_pesos_anteriores(conn, self.tipo, perfil_id, contexto.rodada_atual, contexto.temporada)
+        except Exception as e:
+            logger.error(f"Erro ao manter os pesos anteriores do perfil {perfil_id} ({self.nome}): {e}")
+            return
+        if mantidos:
+            metricas.registrar_obsoleto()
+            logger.warning(f"Perfil {perfil_id} ({self.nome}) mantém os pesos anteriores (obsoletos): {mantidos} clubes")
+        else:
+            logger.warning(f"Perfil {perfil_id} ({self.nome}) sem pesos anteriores para manter")
+
+
+# Função de cálculo de cada família (registro_perfis.METODOS declara perfis, título e intermediários)
+CALCULOS_FAMILIAS: Dict[str, Callable] = {
+    'jogo': _calcular_jogo,
+    'rating': _calcular_rating,
+    'sg': _calcular_sg,
+    'forma_jogo': _calcular_forma_jogo,
+    'forma_sg': _calcular_forma_sg,
+    'ajustado_jogo': _calcular_ajustado_jogo,
+    'ajustado_sg': _calcular_ajustado_sg,
+    'poisson_sg': _calcular_poisson_sg,
+}
+RANKINGS_TIPO: Dict[str, Callable] = {'jogo': _ranking_jogo, 'sg': _ranking_sg}
+
+
+def criar_familias(registro=None) -> List[FamiliaCalculo]:
+    """Famílias com perfis registrados, na ordem de execução do ciclo completo (registro_perfis.METODOS)"""
+    from registro_perfis import registro_padrao
+
+    if registro is None:
+        registro = registro_padrao()
+    familias = []
+    for metodo, perfis in registro.grupos():
+        familias.append(FamiliaCalculo(
+            metodo.familia, metodo.titulo, metodo.tipo, perfis,
+            CALCULOS_FAMILIAS[metodo.familia], RANKINGS_TIPO[metodo.tipo], metodo.perfis_ranking,
+            cadencia_minutos=FAMILIAS_CADENCIA.get(metodo.familia, 0),
+            prazo_segundos=FAMILIAS_PRAZO.get(metodo.familia, 0),
+        ))
+    return familias
+
+
+class SnapshotCompartilhado:
+    """
+    Status do mercado e insumos do ciclo compartilhados entre os jobs das famílias
+
+    Jobs que rodam dentro de ttl segundos usam o mesmo status (uma única consulta à API) e os
+    mesmos insumos da rodada (calculados uma vez). Status e insumos têm locks separados, e o de
+    insumos não fica preso durante o carregamento: uma família carregando insumos não bloqueia o
+    status das demais nem a invalidação; quem pede a mesma rodada enquanto ela carrega espera esse
+    carregamento (em andamento por chave) em vez de repeti-lo.
+    """
+
+    # Validade (s) de uma consulta de status que falhou: quem esperava por ela usa a falha em vez de repetir
+    TTL_FALHA_STATUS = 10.0
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._status: Optional[Tuple[float, Optional[Dict], Optional[str]]] = None
+        # Consulta de status em andamento (uma por vez; o lock não fica preso durante o HTTP)
+        self._consultando_status: Optional[threading.Event] = None
+        self._lock_insumos = threading.Lock()
+        self._insumos: Optional[Tuple[float, Tuple[int, int], object, InsumosCiclo]] = None
+        # Carregamentos em andamento por (temporada, rodada) e geração dos insumos (muda a cada invalidação)
+        self._carregando: Dict[Tuple[int, int], threading.Event] = {}
+        self._geracao = 0
+
+    def obter_status(self) -> Tuple[Optional[Dict], Optional[str]]:
+        """
+        (status, origem) do mercado, como api_cartola.obter_status_mercado (reaproveitado dentro do TTL)
+
+        Uma consulta por vez: quem chega durante a consulta espera por ela e usa o mesmo resultado.
+        Uma falha (status None) vale por TTL_FALHA_STATUS, para não repetir a consulta logo em seguida.
+        """
+        from api_cartola import obter_status_mercado
+        while True:
+            with self._lock:
+                if self._status is not None:
+                    consultado_em, status_data, origem = self._status
+                    validade = self.ttl if status_data else min(self.ttl, self.TTL_FALHA_STATUS)
+                    if time.monotonic() - consultado_em < validade:
+                        return status_data, origem
+                em_andamento = self._consultando_status
+                if em_andamento is None:
+                    consultado = self._consultando_status = threading.Event()
+                    break
+            em_andamento.wait()
+
+        status_data, origem = None, None
+        try:
+            status_data, origem = obter_status_mercado()
+            return status_data, origem
+        finally:
+            with self._lock:
+                self._status = (time.monotonic(), status_data, origem)
+                self._consultando_status = None
+            consultado.set()
+
+    def invalidar_insumos(self):
+        """Descarta os insumos (o plano de execução mudou: outros intermediários ou parâmetros)"""
+        with self._lock_insumos:
+            self._insumos = None
+            self._geracao += 1
+
+    def obter_insumos(self, conn, contexto):
+        """
+        Insumos da rodada do contexto (reaproveitados dentro do TTL)
+
+        Returns:
+            (contexto com impressões, InsumosCiclo)
+        """
+        chave = (contexto.temporada, contexto.rodada_atual)
+        while True:
+            with self._lock_insumos:
+                agora = time.monotonic()
+                if self._insumos is not None:
+                    criado_em, chave_anterior, impressoes, insumos = self._insumos
+                    if chave_anterior == chave and agora - criado_em < self.ttl:
+                        logger.info("Reaproveitando insumos do ciclo (snapshot compartilhado entre famílias)")
+                        return contexto.com_impressoes(impressoes), insumos
+                em_andamento = self._carregando.get(chave)
+                if em_andamento is None:
+                    carregado = self._carregando[chave] = threading.Event()
+                    geracao = self._geracao
+                    break
+            # Outra família já carrega esta rodada: esperar e reaproveitar (ou carregar, se ela falhou),
+            # no máximo até o prazo do ciclo
+            logger.info("Aguardando os insumos do ciclo carregados por outra família")
+            if not em_andamento.wait(contexto.restante()):
+                raise PrazoEsgotado(
+                    f"prazo esgotado aguardando os insumos da rodada {contexto.rodada_atual} carregados por outra família"
+                )
+
+        try:
+            contexto, insumos = carregar_insumos(conn, contexto)
+            with self._lock_insumos:
+                # Invalidados durante o carregamento: o plano mudou, não reaproveitar
+                if geracao == self._geracao:
+                    self._insumos = (agora, chave, contexto.impressoes, insumos)
+            return contexto, insumos
+        finally:
+            with self._lock_insumos:
+                del self._carregando[chave]
+            carregado.set()
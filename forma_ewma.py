@@ -0,0 +1,179 @@
+"""
+Forma ponderada exponencialmente (EWMA) por clube e mando, mantida de forma incremental
+
+Alternativa às janelas fixas (últimas N partidas): cada clube guarda, por mando e por meia-vida,
+somas decaídas dos resultados - jogos, vitórias, empates, derrotas, gols pró/contra e clean
+sheets. Uma nova partida do clube com o mando atualiza o estado em O(1):
+
+    soma = fator * soma + resultado        fator = 0.5 ** (1 / meia_vida)
+
+A meia-vida é medida em partidas do clube com o mando (a mesma unidade das janelas), então um jogo
+antigo perde peso aos poucos em vez de sair da janela de uma vez. Cada meia-vida a mais custa uma
+multiplicação por clube na atualização, sem reler o histórico.
+
+O estado fica no cache persistente entre ciclos (por temporada e meias-vidas) junto com a
+assinatura das partidas já aplicadas; cada ciclo aplica só as partidas encerradas desde o último.
+Se alguma partida já aplicada mudar (placar corrigido, jogo adiado encerrado fora de ordem), o
+estado é refeito do zero.
+
+O resultado tem a mesma interface dos agregados por janela (obter(clube_id, mando, meia_vida)),
+então os calculadores de peso do jogo e do SG usam a forma EWMA sem alteração.
+"""
+import hashlib
+import logging
+from typing import Iterable, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from cache_persistente import gerar_chave, obter_cache
+from modelo_dados import MANDOS, TabelaPartidas
+
+logger = logging.getLogger(__name__)
+
+# Componentes das somas decaídas (última dimensão do estado)
+COMPONENTES = ('jogos', 'vitorias', 'empates', 'derrotas', 'gols_pro', 'gols_contra', 'clean_sheets')
+
+
+class FormaEwma(NamedTuple):
+    """Somas decaídas de um clube com um mando (mesmas propriedades de AgregadoJanela)"""
+    jogos: float = 0.0
+    vitorias: float = 0.0
+    empates: float = 0.0
+    derrotas: float = 0.0
+    gols_pro: float = 0.0
+    gols_contra: float = 0.0
+    clean_sheets: float = 0.0
+
+    @property
+    def aproveitamento(self) -> float:
+        """Pontos conquistados / pontos possíveis, ponderados (0 sem jogos)"""
+        return (self.vitorias * 3 + self.empates) / (self.jogos * 3) if self.jogos > 0 else 0
+
+    @property
+    def media_gols_pro(self) -> float:
+        return self.gols_pro / self.jogos if self.jogos > 0 else 0
+
+    @property
+    def media_gols_contra(self) -> float:
+        return self.gols_contra / self.jogos if self.jogos > 0 else 0
+
+    @property
+    def saldo_gols(self) -> float:
+        return self.gols_pro - self.gols_contra
+
+
+def _assinatura(partidas: TabelaPartidas, posicoes: np.ndarray) -> str:
+    """Hash das partidas aplicadas (id e placar, em ordem)"""
+    h = hashlib.md5()
+    for coluna in (partidas.partida_id, partidas.placar_casa, partidas.placar_visitante):
+        h.update(np.ascontiguousarray(coluna[posicoes]).tobytes())
+    return h.hexdigest()
+
+
+class EstadoForma:
+    """
+    Somas decaídas de todos os clubes: array meias-vidas × mandos × clubes × componentes
+
+    Args:
+        temporada: Temporada do estado
+        clube_ids: Ids dos clubes (ordem do índice denso da tabela de partidas)
+        meias_vidas: Meias-vidas em partidas (ordem crescente)
+    """
+
+    def __init__(self, temporada: int, clube_ids: np.ndarray, meias_vidas: Tuple[int, ...]):
+        self.temporada = temporada
+        self.clube_ids = np.asarray(clube_ids, dtype=np.int64)
+        self.meias_vidas = tuple(meias_vidas)
+        self.fatores = 0.5 ** (1.0 / np.asarray(self.meias_vidas, dtype=np.float64))
+        self.somas = np.zeros((len(self.meias_vidas), len(MANDOS), len(self.clube_ids), len(COMPONENTES)))
+        # Partidas encerradas já aplicadas (prefixo cronológico) e sua assinatura
+        self.aplicadas = 0
+        self.assinatura = hashlib.md5().hexdigest()
+        self.ate_rodada = 0
+
+    def compativel(self, partidas: TabelaPartidas, posicoes: np.ndarray) -> bool:
+        """Se as partidas aplicadas continuam sendo o início das encerradas, sem mudanças"""
+        return (
+            np.array_equal(self.clube_ids, partidas.clubes.ids)
+            and self.aplicadas <= len(posicoes)
+            and _assinatura(partidas, posicoes[:self.aplicadas]) == self.assinatura
+        )
+
+    def aplicar(self, partidas: TabelaPartidas, posicao: int):
+        """Aplica uma partida encerrada: O(meias-vidas) para cada um dos dois clubes"""
+        placar_casa = int(partidas.placar_casa[posicao])
+        placar_visitante = int(partidas.placar_visitante[posicao])
+        for m, (clube, pro, contra) in enumerate((
+            (int(partidas.casa[posicao]), placar_casa, placar_visitante),
+            (int(partidas.visitante[posicao]), placar_visitante, placar_casa),
+        )):
+            resultado = np.array(
+                [1.0, pro > contra, pro == contra, pro < contra, pro, contra, contra == 0], dtype=np.float64
+            )
+            somas = self.somas[:, m, clube, :]
+            somas *= self.fatores[:, None]
+            somas += resultado
+
+    def atualizar(self, partidas: TabelaPartidas, rodada_atual: int) -> int:
+        """
+        Aplica as partidas encerradas antes da rodada atual que ainda não foram aplicadas
+
+        Returns:
+            Número de partidas aplicadas
+        """
+        posicoes = partidas.encerradas(rodada_atual - 1)
+        novas = posicoes[self.aplicadas:]
+        for posicao in novas.tolist():
+            self.aplicar(partidas, posicao)
+        self.aplicadas = len(posicoes)
+        self.assinatura = _assinatura(partidas, posicoes)
+        self.ate_rodada = rodada_atual - 1
+        return len(novas)
+
+    def obter(self, clube_id: int, mando: str, meia_vida: int) -> FormaEwma:
+        """Forma do clube com o mando (zerada se o clube não tem partidas)"""
+        if meia_vida not in self.meias_vidas:
+            raise KeyError(f"Meia-vida {meia_vida} não foi carregada (disponíveis: {self.meias_vidas})")
+        i = int(np.searchsorted(self.clube_ids, clube_id))
+        if i >= len(self.clube_ids) or self.clube_ids[i] != clube_id:
+            return FormaEwma()
+        return FormaEwma(*self.somas[self.meias_vidas.index(meia_vida), MANDOS.index(mando), i].tolist())
+
+
+def carregar_forma_ewma(partidas: TabelaPartidas, temporada: int, rodada_atual: int,
+                        meias_vidas: Iterable[int]) -> Optional[EstadoForma]:
+    """
+    Estado da forma EWMA antes da rodada atual, atualizado a partir do estado persistido
+
+    Args:
+        partidas: Tabela de partidas da temporada do ciclo
+        temporada: Temporada
+        rodada_atual: Rodada atual (aplicadas as partidas até rodada_atual - 1)
+        meias_vidas: Meias-vidas dos perfis EWMA
+
+    Returns:
+        EstadoForma, ou None sem meias-vidas
+    """
+    meias_vidas = tuple(sorted({int(h) for h in meias_vidas if int(h) > 0}))
+    if not meias_vidas:
+        return None
+
+    cache = obter_cache()
+    chave = gerar_chave('forma_ewma', temporada, *meias_vidas)
+    estado = cache.obter(chave) if cache is not None else None
+
+    posicoes = partidas.encerradas(rodada_atual - 1)
+    if estado is None or not estado.compativel(partidas, posicoes):
+        if estado is not None:
+            logger.info("Forma EWMA: partidas aplicadas mudaram, estado refeito do zero")
+        estado = EstadoForma(temporada, partidas.clubes.ids, meias_vidas)
+
+    aplicadas = estado.atualizar(partidas, rodada_atual)
+    logger.info(f"Forma EWMA (meias-vidas {meias_vidas}): {aplicadas} partidas novas aplicadas, "
+                f"{estado.aplicadas} no total")
+    if aplicadas and cache is not None:
+        try:
+            cache.gravar(chave, estado)
+        except Exception as e:
+            logger.warning(f"Erro ao gravar o estado da forma EWMA: {e}")
+    return estado
@@ -1,14 +1,30 @@
+"""
+Calculador de Pesos do Jogo e SG - ponto de entrada (CLI)
+
+Subcomandos:
+    serve           Agendador + API de leitura (padrão quando nenhum subcomando é informado)
+    run-once        Executa um único ciclo e sai (ex.: disparado por cron)
+    backfill        Recalcula um intervalo de rodadas da temporada atual
+    bench           Mede o tempo de cada etapa do ciclo
+    evaluate        Avalia os perfis contra os resultados reais das rodadas disputadas
+    show-rankings   Exibe os rankings de perfis já calculados
+    export-profiles Exporta os perfis atuais em JSON (formato de PERFIS_ARQUIVO)
+    scenarios       Sensibilidade dos pesos da próxima rodada aos resultados da rodada atual
+    simulate        Faixas de incerteza (bootstrap) dos pesos da rodada
+
+Os módulos pesados (cálculos, numpy, agendador, API HTTP) são importados apenas pelos
+subcomandos que os usam, para que a inicialização e jobs curtos fiquem rápidos.
+"""
+import argparse
 import logging
 import sys
-from apscheduler.schedulers.blocking import BlockingScheduler
+import time
 from datetime import datetime
-from database import get_db_connection, close_db_connection, init_tables
-from api_cartola import fetch_status_data
-from calculo_peso_jogo import calculate_peso_jogo_for_profile
-from calculo_peso_jogo_rating import calculate_peso_jogo_for_profile_rating
-from calculo_peso_sg import calculate_peso_sg_for_profile
-from mostrar_rankings import mostrar_ranking_peso_jogo, mostrar_ranking_peso_sg
-from config import PERFIS_PESO_JOGO, PERFIS_PESO_SG, CALCULATION_INTERVAL_MINUTES
+from config import (
+    CALCULATION_INTERVAL_MINUTES,
+    API_LEITURA_HABILITADA, API_LEITURA_HOST, API_LEITURA_PORTA, SNAPSHOT_DIR, SNAPSHOT_CICLO_TTL_SEGUNDOS,
+    ORCAMENTO_CICLO_SEGUNDOS, PERFIS_ARQUIVO, PERFIS_VERIFICACAO_SEGUNDOS
+)
 
 # Configurar logging
 logging.basicConfig(
@@ -20,182 +36,379 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def execute_calculations(scheduler=None):
-    """Executa todos os cálculos de peso do jogo e peso do SG para todos os perfis
+def _criar_contexto_mercado_aberto(status_data=None):
+    """Cria o contexto do ciclo se o mercado estiver aberto (sem status, consulta a API uma vez)"""
+    from api_cartola import fetch_status_data
+    from contexto_ciclo import criar_contexto
     
-    Após a conclusão, agenda a próxima execução para 15 minutos após o término.
-    
-    Args:
-        scheduler: Instância do scheduler (opcional, para agendar próxima execução)
-    """
-    logger.info("=" * 80)
-    logger.info("Iniciando rotina de cálculos")
-    logger.info("=" * 80)
-    
-    start_time = datetime.now()
-    
-    # Obter rodada atual
-    status_data = fetch_status_data()
+    if status_data is None:
+        status_data = fetch_status_data()
     if not status_data:
         logger.error("Erro ao obter dados de status do Cartola. Abortando cálculos.")
-        _agendar_proxima_execucao(scheduler, start_time)
-        return
+        return None
     
-    rodada_atual = status_data.get('rodada_atual')
-    if not rodada_atual:
+    contexto = criar_contexto(status_data)
+    if not contexto:
         logger.error("Rodada atual não encontrada nos dados de status. Abortando cálculos.")
-        _agendar_proxima_execucao(scheduler, start_time)
-        return
+        return None
     
     # Verificar se o mercado está aberto
     # status_mercado: 1 = aberto, 2 = fechado, etc.
-    status_mercado = status_data.get('status_mercado')
-    if status_mercado != 1:
-        logger.info(f"Mercado está fechado (status: {status_mercado}). Pulando atualização das tabelas.")
+    if contexto.status_mercado != 1:
+        logger.info(f"Mercado está fechado (status: {contexto.status_mercado}). Pulando atualização das tabelas.")
         logger.info("Os cálculos serão retomados quando o mercado abrir novamente.")
-        _agendar_proxima_execucao(scheduler, start_time)
-        return
+        return None
+    
+    logger.info(f"Rodada atual: {contexto.rodada_atual} (temporada {contexto.temporada})")
+    logger.info(f"Mercado está aberto (status: {contexto.status_mercado}). Iniciando cálculos...")
+    return contexto
+
+def executar_ciclo(contexto, publicar=True, mostrar_rankings=True):
+    """Calcula todas as famílias de perfis (peso do jogo, rating e SG) de uma rodada
+    
+    Args:
+        contexto: ContextoCiclo com rodada e temporada do ciclo
+        publicar: Se deve publicar os resultados (matriz, snapshot, API de leitura)
+        mostrar_rankings: Se deve exibir os rankings de alguns perfis no log
+    
+    Returns:
+        {etapa: segundos} com o tempo de cada etapa, ou None se o ciclo não pôde rodar
+    """
+    from database import get_db_connection, close_db_connection, init_tables, ERROS_PRAZO
+    from familias_calculo import criar_familias, carregar_insumos
+    from publicacao import publicar_resultados
+    from metricas import metricas
+    from calculo_sob_demanda import calculador_sob_demanda
     
-    logger.info(f"Rodada atual: {rodada_atual}")
-    logger.info(f"Mercado está aberto (status: {status_mercado}). Iniciando cálculos...")
+    # Orçamento de tempo do ciclo (perfis que não cabem nele mantêm os pesos anteriores)
+    contexto = contexto.com_prazo(ORCAMENTO_CICLO_SEGUNDOS)
     
     # Conectar ao banco
     conn = get_db_connection()
     if not conn:
         logger.error("Erro ao conectar ao banco de dados. Abortando cálculos.")
-        _agendar_proxima_execucao(scheduler, start_time)
-        return
+        return None
     
     try:
         # Inicializar tabelas se necessário
-        init_tables(conn)
+        with contexto.medir('init_tables'):
+            init_tables(conn)
         
-        # Cache compartilhado de análises de setores (os dados dos atletas não mudam entre perfis)
-        cache_setores_jogo = {}
+        try:
+            contexto, insumos = carregar_insumos(conn, contexto)
+        except ERROS_PRAZO as e:
+            _manter_pesos_anteriores(conn, contexto, criar_familias(), e)
+        else:
+            if publicar:
+                # Perfis sob demanda da API de leitura passam a usar os insumos desta rodada
+                calculador_sob_demanda.atualizar_insumos(contexto, insumos)
+            for familia in criar_familias():
+                familia.executar(conn, contexto, insumos, mostrar_rankings)
         
-        # Separar perfis normais e perfis de rating
-        perfis_normais = [p for p in PERFIS_PESO_JOGO if p.get('metodo') != 'rating']
-        perfis_rating = [p for p in PERFIS_PESO_JOGO if p.get('metodo') == 'rating']
+        # Publicar resultados da rodada para os consumidores (API de leitura)
+        if publicar:
+            with contexto.medir('publicacao'):
+                publicar_resultados(conn, contexto.rodada_atual, contexto.temporada, contexto=contexto)
         
-        # Calcular peso do jogo para perfis normais (IDs 1-10)
-        logger.info(f"\n{'='*80}")
-        logger.info("CALCULANDO PESO DO JOGO - PERFIS NORMAIS (10 PERFIS)")
-        logger.info(f"{'='*80}\n")
-        
-        for perfil in perfis_normais:
-            try:
-                logger.info(f"Processando perfil {perfil['id']}: {perfil['descricao']}")
-                calculate_peso_jogo_for_profile(
-                    conn, 
-                    rodada_atual, 
-                    perfil, 
-                    usar_provaveis_cartola=False,
-                    cache_setores=cache_setores_jogo
-                )
-                logger.info(f"[OK] Perfil {perfil['id']} de peso do jogo concluido")
-                # Mostrar ranking apenas para alguns perfis (para não poluir o log)
-                if perfil['id'] in [1, 5, 6, 10]:
-                    mostrar_ranking_peso_jogo(conn, rodada_atual, perfil['id'])
-            except Exception as e:
-                logger.error(f"[ERRO] Erro ao processar perfil {perfil['id']} de peso do jogo: {e}", exc_info=True)
-        
-        # Calcular peso do jogo para perfis de rating (IDs 11-15)
-        logger.info(f"\n{'='*80}")
-        logger.info("CALCULANDO PESO DO JOGO - PERFIS RATING (5 PERFIS)")
-        logger.info(f"{'='*80}\n")
-        
-        for perfil in perfis_rating:
-            try:
-                logger.info(f"Processando perfil {perfil['id']}: {perfil['descricao']}")
-                calculate_peso_jogo_for_profile_rating(
-                    conn, 
-                    rodada_atual, 
-                    perfil, 
-                    usar_provaveis_cartola=False,
-                    cache_setores=cache_setores_jogo
-                )
-                logger.info(f"[OK] Perfil {perfil['id']} de peso do jogo (RATING) concluido")
-                # Mostrar ranking apenas para alguns perfis
-                if perfil['id'] in [11, 15]:
-                    mostrar_ranking_peso_jogo(conn, rodada_atual, perfil['id'])
-            except Exception as e:
-                logger.error(f"[ERRO] Erro ao processar perfil {perfil['id']} de peso do jogo (RATING): {e}", exc_info=True)
-        
-        # Calcular peso do SG para todos os perfis
-        logger.info(f"\n{'='*80}")
-        logger.info("CALCULANDO PESO DO SG - 10 PERFIS")
-        logger.info(f"{'='*80}\n")
-        
-        for perfil in PERFIS_PESO_SG:
-            try:
-                logger.info(f"Processando perfil {perfil['id']}: {perfil['descricao']}")
-                calculate_peso_sg_for_profile(
-                    conn, 
-                    rodada_atual, 
-                    perfil, 
-                    usar_provaveis_cartola=False
-                )
-                logger.info(f"[OK] Perfil {perfil['id']} de peso do SG concluido")
-                # Mostrar ranking apenas para alguns perfis (para não poluir o log)
-                if perfil['id'] in [1, 5, 6, 10]:
-                    mostrar_ranking_peso_sg(conn, rodada_atual, perfil['id'])
-            except Exception as e:
-                logger.error(f"[ERRO] Erro ao processar perfil {perfil['id']} de peso do SG: {e}", exc_info=True)
-        
-        elapsed_time = datetime.now() - start_time
+        metricas.registrar_ciclo(contexto.duracao)
         logger.info("=" * 80)
-        logger.info(f"Rotina de cálculos concluída em {elapsed_time.total_seconds():.2f} segundos")
+        logger.info(f"Rotina de cálculos concluída em {contexto.duracao:.2f} segundos")
         logger.info("=" * 80)
-        
+        return contexto.tempos
+    
     except Exception as e:
         logger.error(f"Erro geral na rotina de cálculos: {e}", exc_info=True)
+        return None
     finally:
         close_db_connection(conn)
-        # Agendar próxima execução após o término (não importa se deu erro ou sucesso)
-        _agendar_proxima_execucao(scheduler, datetime.now())
 
-def _agendar_proxima_execucao(scheduler, fim_execucao_atual):
-    """Agenda a próxima execução para 15 minutos após o término da atual"""
-    if scheduler is None:
+def _manter_pesos_anteriores(conn, contexto, familias, erro):
+    """Insumos do ciclo fora do orçamento: todos os perfis das famílias mantêm os pesos anteriores"""
+    logger.warning(f"[PRAZO] Insumos da rodada {contexto.rodada_atual} não carregados dentro do orçamento ({erro}); "
+                   f"os perfis mantêm os pesos anteriores")
+    for familia in familias:
+        familia.manter_anteriores(conn, contexto)
+
+def _executar_familia(contexto, familia, snapshot):
+    """Calcula uma família com os insumos compartilhados e publica assim que termina"""
+    from database import get_db_connection, close_db_connection, init_tables, ERROS_PRAZO
+    from publicacao import publicar_resultados
+    from metricas import metricas
+    from calculo_sob_demanda import calculador_sob_demanda
+    
+    contexto = contexto.com_prazo(ORCAMENTO_CICLO_SEGUNDOS)
+    conn = get_db_connection()
+    if not conn:
+        logger.error("Erro ao conectar ao banco de dados. Abortando cálculos.")
         return
     
-    from datetime import timedelta
+    try:
+        init_tables(conn)
+        try:
+            contexto, insumos = snapshot.obter_insumos(conn, contexto)
+        except ERROS_PRAZO as e:
+            _manter_pesos_anteriores(conn, contexto, [familia], e)
+        else:
+            calculador_sob_demanda.atualizar_insumos(contexto, insumos)
+            familia.executar(conn, contexto, insumos)
+        publicar_resultados(conn, contexto.rodada_atual, contexto.temporada, contexto=contexto)
+        
+        duracao = contexto.duracao
+        metricas.registrar_ciclo(duracao)
+        if not familia.registrar_duracao(duracao):
+            logger.info(f"Família {familia.nome} concluída e publicada em {duracao:.2f} segundos")
+    finally:
+        close_db_connection(conn)
+
+def execute_calculations(scheduler, familia, politica, snapshot):
+    """Job de uma família: verifica o mercado, calcula os perfis da família e publica
     
-    proxima_execucao = fim_execucao_atual + timedelta(minutes=CALCULATION_INTERVAL_MINUTES)
+    Após a conclusão, agenda a próxima execução da família conforme a política de agendamento
+    (status do mercado e horário de fechamento) e a cadência mínima da família.
     
-    # Remover job existente se houver
+    Args:
+        scheduler: Instância do scheduler (para agendar a próxima execução)
+        familia: FamiliaCalculo do job
+        politica: PoliticaAgendamento da família
+        snapshot: SnapshotCompartilhado (status e insumos compartilhados entre famílias)
+    """
+    # Família sem perfis (removidos na recarga): a cadeia de execuções para até voltar a ter perfis.
+    # A marca vem antes da verificação: uma recarga simultânea que devolve perfis vê a família
+    # suspensa (e a agenda) ou esta execução vê os novos perfis (e segue)
+    familia.suspensa = True
+    if not familia.perfis:
+        logger.info(f"Família {familia.nome} sem perfis; execuções suspensas")
+        return
+    familia.suspensa = False
+    
+    # Proteção contra sobreposição: uma execução da família por vez (o lock também é usado pelo
+    # recálculo dos perfis recarregados). O job disparado já saiu do agendador: sem uma nova
+    # tentativa, a cadeia de execuções da família pararia aqui.
+    if not familia.lock.acquire(blocking=False):
+        from politica_agendamento import INTERVALO_MINIMO
+        proxima_execucao = datetime.now() + INTERVALO_MINIMO
+        logger.warning(f"Família {familia.nome} ainda em execução; nova tentativa às {proxima_execucao.strftime('%H:%M:%S')}")
+        _adicionar_job(scheduler, familia, politica, snapshot, proxima_execucao)
+        return
+    
+    logger.info("=" * 80)
+    logger.info(f"Iniciando rotina de cálculos - família {familia.nome}")
+    logger.info("=" * 80)
+    
+    status_data = None
     try:
-        scheduler.remove_job('calculo_pesos')
-    except:
-        pass
+        status_data, origem = snapshot.obter_status()
+        politica.registrar_status(status_data, origem=origem)
+        contexto = _criar_contexto_mercado_aberto(status_data)
+        if contexto:
+            _executar_familia(contexto, familia, snapshot)
+    except Exception as e:
+        logger.error(f"Erro geral na rotina de cálculos da família {familia.nome}: {e}", exc_info=True)
+    finally:
+        familia.lock.release()
+        # Agendar próxima execução após o término (não importa se deu erro ou sucesso)
+        _agendar_proxima_execucao(scheduler, familia, politica, snapshot, datetime.now(), status_data)
+
+def _agendar_proxima_execucao(scheduler, familia, politica, snapshot, fim_execucao_atual, status_data=None):
+    """Agenda a próxima execução da família após o término da atual"""
+    from datetime import timedelta
     
-    # Agendar próxima execução
+    intervalo, motivo = politica.proximo_intervalo(status_data, fim_execucao_atual)
+    cadencia = timedelta(minutes=familia.cadencia_minutos)
+    if cadencia > intervalo:
+        intervalo, motivo = cadencia, f'cadência da família {familia.nome}'
+    proxima_execucao = fim_execucao_atual + intervalo
+    _adicionar_job(scheduler, familia, politica, snapshot, proxima_execucao)
+    logger.info(f"Próxima execução da família {familia.nome}: {proxima_execucao.strftime('%Y-%m-%d %H:%M:%S')} ({motivo})")
+
+def _agendar_familia_agora(scheduler, familia, snapshot):
+    """Dispara o primeiro job da família (os seguintes são agendados ao fim de cada execução)"""
+    from politica_agendamento import criar_politica
+    _adicionar_job(scheduler, familia, criar_politica(), snapshot, datetime.now())
+
+def _adicionar_job(scheduler, familia, politica, snapshot, run_date):
+    """(Re)agenda o job único da família para run_date"""
     scheduler.add_job(
         execute_calculations,
         trigger='date',
-        run_date=proxima_execucao,
-        args=[scheduler],  # Passar o scheduler para poder agendar a próxima
-        id='calculo_pesos',
-        name='Cálculo de Pesos do Jogo e SG',
-        replace_existing=True
+        run_date=run_date,
+        args=[scheduler, familia, politica, snapshot],
+        id=f'calculo_{familia.nome}',
+        name=f'Cálculo de pesos - {familia.titulo}',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+        # Sem limite de atraso: a execução atrasada reagenda a seguinte (a cadeia não pode parar)
+        misfire_grace_time=None
     )
+
+def verificar_perfis(scheduler, monitor, familias, snapshot):
+    """Job periódico: recarrega o arquivo de perfis e calcula já os perfis novos ou alterados
+    
+    Os perfis inalterados não são recalculados; as famílias seguem com a própria cadência usando o
+    novo registro. Famílias suspensas que voltam a ter perfis (ou de métodos novos) são disparadas na
+    hora; as demais - inclusive as que estão executando agora - recalculam só os perfis alterados.
+    """
+    from recarga_perfis import atualizar_familias
+    
+    recarga = monitor.verificar()
+    if recarga is None:
+        return
+    registro, diferenca = recarga
+    
+    # O plano pode pedir outros intermediários (janelas, meias-vidas, configurações do ELO)
+    snapshot.invalidar_insumos()
+    novas = atualizar_familias(familias, registro)
+    
+    a_calcular = diferenca.a_calcular()
+    parciais = []
+    for familia in familias.values():
+        if familia.perfis and (familia in novas or familia.suspensa):
+            # Família nova ou suspensa: o job completo calcula todos os seus perfis agora
+            familia.suspensa = False
+            logger.info(f"Família {familia.nome} agendada com {len(familia.perfis)} perfis")
+            _agendar_familia_agora(scheduler, familia, snapshot)
+            continue
+        ids = {p['id'] for p in familia.perfis} & a_calcular[familia.tipo]
+        if ids:
+            parciais.append((familia, ids))
+    _recalcular_perfis(parciais, diferenca.removidos, snapshot)
+
+def _recalcular_perfis(parciais, removidos, snapshot):
+    """Calcula só os perfis informados de cada família, remove os pesos dos perfis removidos e publica"""
+    from database import get_db_connection, close_db_connection, init_tables, ERROS_PRAZO
+    from publicacao import publicar_resultados, remover_pesos_perfil
+    from calculo_sob_demanda import calculador_sob_demanda
+    
+    if not parciais and not removidos:
+        return
+    status_data, _ = snapshot.obter_status()
+    contexto = _criar_contexto_mercado_aberto(status_data)
+    if not contexto:
+        logger.info("Perfis recarregados serão calculados no próximo ciclo de cada família")
+        return
+    
+    contexto = contexto.com_prazo(ORCAMENTO_CICLO_SEGUNDOS)
+    conn = get_db_connection()
+    if not conn:
+        logger.error("Erro ao conectar ao banco de dados. Perfis recarregados não calculados.")
+        return
+    
+    try:
+        init_tables(conn)
+        if parciais:
+            try:
+                contexto, insumos = snapshot.obter_insumos(conn, contexto)
+            except ERROS_PRAZO as e:
+                _manter_pesos_anteriores(conn, contexto, [familia.parcial(ids) for familia, ids in parciais], e)
+            else:
+                calculador_sob_demanda.atualizar_insumos(contexto, insumos)
+                for familia, ids in parciais:
+                    # Espera uma execução em andamento da família (que ainda usava os perfis antigos);
+                    # um job da família disparado enquanto isso tenta de novo logo depois
+                    with familia.lock:
+                        parcial = familia.parcial(ids)
+                        inicio = time.monotonic()
+                        parcial.executar(conn, contexto, insumos)
+                        parcial.registrar_duracao(time.monotonic() - inicio)
+        for tipo, perfil_id in removidos:
+            removidos_clubes = remover_pesos_perfil(conn, tipo, perfil_id, contexto.rodada_atual, contexto.temporada)
+            logger.info(f"Perfil {perfil_id} ({tipo}) removido: {removidos_clubes} pesos da rodada descartados")
+        publicar_resultados(conn, contexto.rodada_atual, contexto.temporada, contexto=contexto)
+        logger.info(f"Perfis recarregados calculados e publicados em {contexto.duracao:.2f} segundos")
+    except Exception as e:
+        logger.error(f"Erro ao calcular os perfis recarregados: {e}", exc_info=True)
+    finally:
+        close_db_connection(conn)
+
+def _aquecer_cache_leitura():
+    """Carrega a última rodada publicada no cache da API (útil quando o mercado está fechado)
+    
+    Usa o snapshot binário do volume compartilhado quando existir (sem consultar o banco).
+    """
+    if SNAPSHOT_DIR:
+        from snapshot_binario import SnapshotPesos, caminho_snapshot
+        from api_leitura import cache_leitura
+        try:
+            snapshot = SnapshotPesos(caminho_snapshot(SNAPSHOT_DIR))
+            if snapshot.obsoletos is None:
+                # Formato antigo, sem a marca de obsoleto: o banco tem a marca de cada perfil
+                raise ValueError(f"snapshot sem marca de obsoletos (geração {snapshot.geracao})")
+            pesos_jogo, pesos_sg = snapshot.como_dicionarios()
+            cache_leitura.atualizar(snapshot.temporada, snapshot.rodada, pesos_jogo, pesos_sg,
+                                    snapshot.obsoletos)
+            logger.info(f"Cache da API aquecido a partir do snapshot (geração {snapshot.geracao})")
+            return
+        except (OSError, ValueError) as e:
+            logger.info(f"Snapshot binário indisponível ({e}); aquecendo cache pelo banco")
+    
+    from database import get_db_connection, close_db_connection
+    from api_cartola import get_temporada_atual
+    from publicacao import publicar_resultados, obter_ultima_rodada_publicada
     
-    logger.info(f"Próxima execução agendada para: {proxima_execucao.strftime('%Y-%m-%d %H:%M:%S')}")
+    conn = get_db_connection()
+    if not conn:
+        logger.warning("Não foi possível aquecer o cache da API de leitura: banco indisponível")
+        return
+    
+    try:
+        temporada = get_temporada_atual()
+        cursor = conn.cursor()
+        try:
+            rodada = obter_ultima_rodada_publicada(cursor, temporada)
+        finally:
+            cursor.close()
+        if rodada:
+            publicar_resultados(conn, rodada, temporada, materializar=False)
+    except Exception as e:
+        logger.error(f"Erro ao aquecer cache da API de leitura: {e}", exc_info=True)
+    finally:
+        close_db_connection(conn)
+
+def _contexto_da_linha_de_comando(rodada):
+    """Contexto com a rodada informada ou, sem ela, a rodada atual do status do mercado"""
+    from contexto_ciclo import criar_contexto
+    return criar_contexto(rodada_atual=rodada)
 
-def main():
-    """Função principal que configura o agendador"""
+def comando_serve(args):
+    """Serviço contínuo: agendador (ciclo a cada N minutos após o término) e API de leitura"""
+    from apscheduler.schedulers.blocking import BlockingScheduler
+    
     logger.info("Iniciando Calculador de Pesos do Jogo e SG")
     logger.info(f"Intervalo entre ciclos: {CALCULATION_INTERVAL_MINUTES} minutos (após término de cada ciclo)")
     
-    # Configurar agendador
+    if API_LEITURA_HABILITADA:
+        from api_leitura import iniciar_api_leitura
+        iniciar_api_leitura(API_LEITURA_HOST, API_LEITURA_PORTA)
+        _aquecer_cache_leitura()
+    
+    from familias_calculo import criar_familias, SnapshotCompartilhado
+    
+    # Configurar agendador: um job independente por família, todos disparados agora
+    # Cada execução agenda a próxima da própria família após terminar
     scheduler = BlockingScheduler(timezone='America/Sao_Paulo')
+    snapshot = SnapshotCompartilhado(SNAPSHOT_CICLO_TTL_SEGUNDOS)
+    familias = {familia.nome: familia for familia in criar_familias()}
+    for familia in familias.values():
+        _agendar_familia_agora(scheduler, familia, snapshot)
     
-    # Executar imediatamente na primeira vez
-    # A função execute_calculations vai agendar a próxima execução após terminar
-    logger.info("Executando cálculos iniciais...")
-    execute_calculations(scheduler)
+    logger.info(f"Agendador configurado com {len(familias)} famílias: {', '.join(familias)}")
     
-    logger.info("Agendador configurado. O serviço executará um novo ciclo {} minutos após o término de cada ciclo anterior.".format(CALCULATION_INTERVAL_MINUTES))
+    # Recarga dos perfis do arquivo sem restart
+    if PERFIS_ARQUIVO:
+        from recarga_perfis import MonitorPerfis
+        scheduler.add_job(
+            verificar_perfis,
+            trigger='interval',
+            seconds=PERFIS_VERIFICACAO_SEGUNDOS,
+            args=[scheduler, MonitorPerfis(PERFIS_ARQUIVO), familias, snapshot],
+            id='verificar_perfis',
+            name='Recarga do arquivo de perfis',
+            max_instances=1,
+            coalesce=True
+        )
+        logger.info(f"Perfis de {PERFIS_ARQUIVO}, verificados a cada {PERFIS_VERIFICACAO_SEGUNDOS:.0f} segundos")
+    logger.info("O intervalo entre ciclos acompanha o status do mercado (padrão: {} minutos após o término de cada ciclo).".format(CALCULATION_INTERVAL_MINUTES))
     logger.info("Pressione Ctrl+C para parar o serviço.")
     
     try:
@@ -203,7 +416,324 @@ def main():
     except (KeyboardInterrupt, SystemExit):
         logger.info("Serviço interrompido pelo usuário.")
         scheduler.shutdown()
+    return 0
 
-if __name__ == "__main__":
-    main()
+def comando_run_once(args):
+    """Executa um único ciclo (com --rodada, ignora o status do mercado)"""
+    contexto = _contexto_da_linha_de_comando(args.rodada) if args.rodada else _criar_contexto_mercado_aberto()
+    if not contexto:
+        return 1
+    tempos = executar_ciclo(contexto, publicar=not args.sem_publicar, mostrar_rankings=not args.sem_rankings)
+    return 0 if tempos is not None else 1
+
+def comando_backfill(args):
+    """Recalcula as rodadas de --de até --ate (inclusive) da temporada atual"""
+    if args.de > args.ate:
+        logger.error(f"Intervalo inválido: {args.de} > {args.ate}")
+        return 2
+    from api_cartola import fetch_status_data
+    from contexto_ciclo import criar_contexto
+    
+    # Um único status para todo o backfill (apenas a temporada é usada)
+    status_data = fetch_status_data() or {}
+    falhas = []
+    for rodada in range(args.de, args.ate + 1):
+        logger.info(f"Backfill: rodada {rodada} ({rodada - args.de + 1}/{args.ate - args.de + 1})")
+        contexto = criar_contexto(status_data, rodada_atual=rodada)
+        if executar_ciclo(contexto, publicar=args.publicar, mostrar_rankings=False) is None:
+            falhas.append(rodada)
+    if falhas:
+        logger.error(f"Backfill concluído com falhas nas rodadas: {falhas}")
+        return 1
+    logger.info(f"Backfill concluído: rodadas {args.de} a {args.ate}")
+    return 0
+
+def comando_bench(args):
+    """Executa o ciclo N vezes e exibe o tempo de cada etapa (mínimo e mediana)"""
+    from contexto_ciclo import criar_contexto
+    
+    base = _contexto_da_linha_de_comando(args.rodada)
+    if not base:
+        logger.error("Informe --rodada (status do mercado indisponível)")
+        return 1
+    rodada_atual = base.rodada_atual
+    
+    execucoes = []
+    for i in range(args.repeticoes):
+        logger.info(f"Bench: execução {i + 1}/{args.repeticoes} (rodada {rodada_atual})")
+        contexto = criar_contexto({'temporada': base.temporada}, rodada_atual=rodada_atual)
+        tempos = executar_ciclo(contexto, publicar=args.publicar, mostrar_rankings=False)
+        if tempos is None:
+            return 1
+        execucoes.append(tempos)
+    
+    logger.info(f"\n{'='*60}")
+    logger.info(f"BENCH - rodada {rodada_atual} - {args.repeticoes} execuções")
+    logger.info(f"{'='*60}")
+    logger.info(f"{'Etapa':<20} {'Mínimo (s)':<14} {'Mediana (s)':<14}")
+    logger.info(f"{'-'*60}")
+    etapas = list(dict.fromkeys(etapa for tempos in execucoes for etapa in tempos))
+    for etapa in etapas + ['total']:
+        valores = sorted(
+            sum(tempos.values()) if etapa == 'total' else tempos.get(etapa, 0.0)
+            for tempos in execucoes
+        )
+        mediana = valores[len(valores) // 2] if len(valores) % 2 else sum(valores[len(valores) // 2 - 1:len(valores) // 2 + 1]) / 2
+        logger.info(f"{etapa:<20} {valores[0]:<14.3f} {mediana:<14.3f}")
+    return 0
+
+def comando_evaluate(args):
+    """Avalia os perfis já calculados contra os resultados reais"""
+    from database import get_db_connection, close_db_connection
+    from api_cartola import get_temporada_atual
+    from avaliacao import avaliar_peso_jogo, avaliar_peso_sg, exibir_avaliacao
+    
+    temporada = args.temporada or get_temporada_atual()
+    conn = get_db_connection()
+    if not conn:
+        logger.error("Erro ao conectar ao banco de dados.")
+        return 1
+    try:
+        cursor = conn.cursor()
+        try:
+            avaliacao_jogo = avaliar_peso_jogo(cursor, temporada, args.de, args.ate)
+            avaliacao_sg = avaliar_peso_sg(cursor, temporada, args.de, args.ate)
+        finally:
+            cursor.close()
+        logger.info(f"Avaliação: rodadas {args.de} a {args.ate} da temporada {temporada}")
+        exibir_avaliacao(avaliacao_jogo, avaliacao_sg)
+        if args.grade_elo:
+            _avaliar_grade_elo(conn, temporada, args)
+        return 0
+    finally:
+        close_db_connection(conn)
+
+def _avaliar_grade_elo(conn, temporada, args):
+    """Replay em lote da grade K × divisor × mando até a rodada final da avaliação"""
+    from modelo_dados import carregar_tabela_partidas
+    from motor_elo import ajustar_grade
+    from avaliacao import exibir_grade_elo
+    
+    cursor = conn.cursor()
+    try:
+        partidas = carregar_tabela_partidas(cursor, temporada)
+    finally:
+        cursor.close()
+    exibir_grade_elo(ajustar_grade(partidas, args.ate + 1, args.k, args.divisor, args.vantagem))
+
+def comando_show_rankings(args):
+    """Exibe os rankings dos perfis informados (padrão: todos)"""
+    from database import get_db_connection, close_db_connection
+    from mostrar_rankings import mostrar_ranking_peso_jogo, mostrar_ranking_peso_sg
+    from registro_perfis import registro_padrao
+    
+    contexto = _contexto_da_linha_de_comando(args.rodada)
+    if not contexto:
+        logger.error("Informe --rodada (status do mercado indisponível)")
+        return 1
+    
+    conn = get_db_connection()
+    if not conn:
+        logger.error("Erro ao conectar ao banco de dados.")
+        return 1
+    try:
+        registro = registro_padrao()
+        for perfil_id in args.perfil_jogo or [p['id'] for p in registro.perfis('jogo')]:
+            mostrar_ranking_peso_jogo(conn, contexto.rodada_atual, perfil_id, contexto.temporada)
+        for perfil_id in args.perfil_sg or [p['id'] for p in registro.perfis('sg')]:
+            mostrar_ranking_peso_sg(conn, contexto.rodada_atual, perfil_id, contexto.temporada)
+        return 0
+    finally:
+        close_db_connection(conn)
+
+def comando_export_profiles(args):
+    """Exporta os perfis atuais (arquivo ou config.py) no formato de PERFIS_ARQUIVO"""
+    from registro_perfis import exportar_perfis, registro_padrao
+    
+    conteudo = exportar_perfis(registro_padrao())
+    if not args.caminho:
+        print(conteudo)
+        return 0
+    with open(args.caminho, 'w', encoding='utf-8') as arquivo:
+        arquivo.write(conteudo + '\n')
+    logger.info(f"Perfis exportados para {args.caminho}")
+    return 0
 
+def comando_scenarios(args):
+    """Avalia os perfis na próxima rodada sob todas as combinações de resultados da rodada atual"""
+    import json
+    from database import get_db_connection, close_db_connection
+    from familias_calculo import carregar_insumos
+    from registro_perfis import registro_padrao
+    from cenarios_rodada import criar_motor, perfis_avaliaveis
+    
+    contexto = _contexto_da_linha_de_comando(args.rodada)
+    if not contexto:
+        logger.error("Informe --rodada (status do mercado indisponível)")
+        return 1
+    
+    conn = get_db_connection()
+    if not conn:
+        logger.error("Erro ao conectar ao banco de dados.")
+        return 1
+    try:
+        contexto, insumos = carregar_insumos(conn, contexto)
+    finally:
+        close_db_connection(conn)
+    
+    try:
+        motor = criar_motor(contexto, insumos)
+    except ValueError as e:
+        logger.error(f"Cenários indisponíveis: {e}")
+        return 1
+    
+    selecionados = {'jogo': args.perfil_jogo, 'sg': args.perfil_sg}
+    sensibilidades = []
+    for tipo, perfil in perfis_avaliaveis(registro_padrao()):
+        if selecionados[tipo] and perfil['id'] not in selecionados[tipo]:
+            continue
+        sensibilidade = motor.sensibilidade(tipo, perfil)
+        sensibilidades.append(sensibilidade)
+        logger.info(f"\nPerfil {perfil['id']} ({tipo}) - rodada {motor.proxima_rodada}, "
+                    f"{sensibilidade['cenarios']} cenários da rodada {motor.rodada_atual}")
+        logger.info(f"{'Clube':<8} {'Média':>9} {'Desvio':>9} {'Mínimo':>9} {'Máximo':>9}  Partida mais influente")
+        for clube in sorted(sensibilidade['clubes'], key=lambda c: -c['desvio'])[:args.top]:
+            partida = clube['por_partida'][0]['partida_id'] if clube['por_partida'] else '-'
+            logger.info(f"{clube['clube_id']:<8} {clube['media']:>9.3f} {clube['desvio']:>9.3f} "
+                        f"{clube['minimo']:>9.3f} {clube['maximo']:>9.3f}  {partida}")
+    
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(sensibilidades, arquivo, ensure_ascii=False)
+        logger.info(f"Sensibilidades de {len(sensibilidades)} perfis gravadas em {args.saida}")
+    return 0
+
+def comando_simulate(args):
+    """Média e percentis dos pesos da rodada sobre reamostragens bootstrap das últimas partidas"""
+    import json
+    from database import get_db_connection, close_db_connection
+    from familias_calculo import carregar_insumos
+    from registro_perfis import registro_padrao
+    from simulacao_bootstrap import SimuladorBootstrap, perfis_simulaveis
+    from config import SIMULACAO_AMOSTRAS, SIMULACAO_SEMENTE, USAR_PROVAVEIS_CARTOLA
+    
+    contexto = _contexto_da_linha_de_comando(args.rodada)
+    if not contexto:
+        logger.error("Informe --rodada (status do mercado indisponível)")
+        return 1
+    
+    conn = get_db_connection()
+    if not conn:
+        logger.error("Erro ao conectar ao banco de dados.")
+        return 1
+    try:
+        contexto, insumos = carregar_insumos(conn, contexto)
+    finally:
+        close_db_connection(conn)
+    
+    try:
+        simulador = SimuladorBootstrap(
+            insumos.partidas, contexto.rodada_atual, insumos.matriz_setores, insumos.agregados_provaveis,
+            USAR_PROVAVEIS_CARTOLA, args.amostras or SIMULACAO_AMOSTRAS,
+            SIMULACAO_SEMENTE if args.semente is None else args.semente
+        )
+    except ValueError as e:
+        logger.error(f"Simulação indisponível: {e}")
+        return 1
+    
+    selecionados = {'jogo': args.perfil_jogo, 'sg': args.perfil_sg}
+    resultados = []
+    inicio = time.perf_counter()
+    for tipo, perfil in perfis_simulaveis(registro_padrao()):
+        if selecionados[tipo] and perfil['id'] not in selecionados[tipo]:
+            continue
+        bandas = simulador.bandas(tipo, perfil)
+        resultados.append(bandas)
+        logger.info(f"\nPerfil {perfil['id']} ({tipo}) - rodada {simulador.rodada_atual}, {simulador.amostras} amostras")
+        logger.info(f"{'Clube':<8} {'Jogos':>5} {'Peso':>9} {'Média':>9} {'P5':>9} {'P95':>9}")
+        for clube in sorted(bandas['clubes'], key=lambda c: -c['desvio'])[:args.top]:
+            logger.info(f"{clube['clube_id']:<8} {clube['jogos']:>5} {clube['peso']:>9.3f} {clube['media']:>9.3f} "
+                        f"{clube['percentis']['p5']:>9.3f} {clube['percentis']['p95']:>9.3f}")
+    logger.info(f"\n{len(resultados)} perfis simulados em {time.perf_counter() - inicio:.2f}s")
+    
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultados, arquivo, ensure_ascii=False)
+        logger.info(f"Bandas de {len(resultados)} perfis gravadas em {args.saida}")
+    return 0
+
+def _criar_parser():
+    parser = argparse.ArgumentParser(description='Calculador de Pesos do Jogo e SG')
+    subparsers = parser.add_subparsers(dest='comando')
+    
+    sub = subparsers.add_parser('serve', help='Agendador contínuo + API de leitura (padrão)')
+    sub.set_defaults(func=comando_serve)
+    
+    sub = subparsers.add_parser('run-once', help='Executa um único ciclo e sai')
+    sub.add_argument('--rodada', type=int, help='Rodada a calcular (ignora o status do mercado)')
+    sub.add_argument('--sem-publicar', action='store_true', help='Não publica os resultados')
+    sub.add_argument('--sem-rankings', action='store_true', help='Não exibe rankings no log')
+    sub.set_defaults(func=comando_run_once)
+    
+    sub = subparsers.add_parser('backfill', help='Recalcula um intervalo de rodadas da temporada atual')
+    sub.add_argument('--de', type=int, required=True, help='Rodada inicial')
+    sub.add_argument('--ate', type=int, required=True, help='Rodada final (inclusive)')
+    sub.add_argument('--publicar', action='store_true', help='Publica cada rodada recalculada')
+    sub.set_defaults(func=comando_backfill)
+    
+    sub = subparsers.add_parser('bench', help='Mede o tempo de cada etapa do ciclo')
+    sub.add_argument('--rodada', type=int, help='Rodada (padrão: rodada atual do status)')
+    sub.add_argument('--repeticoes', type=int, default=3, help='Número de execuções (padrão: 3)')
+    sub.add_argument('--publicar', action='store_true', help='Inclui a etapa de publicação')
+    sub.set_defaults(func=comando_bench)
+    
+    sub = subparsers.add_parser('evaluate', help='Avalia os perfis contra os resultados reais')
+    sub.add_argument('--de', type=int, required=True, help='Rodada inicial')
+    sub.add_argument('--ate', type=int, required=True, help='Rodada final (inclusive)')
+    sub.add_argument('--temporada', type=int, help='Temporada (padrão: atual)')
+    sub.add_argument('--grade-elo', action='store_true', help='Avalia também a grade de parâmetros do ELO')
+    sub.add_argument('--k', type=float, nargs='+', default=[10, 15, 20, 25, 30, 40], help='K-factors da grade')
+    sub.add_argument('--divisor', type=float, nargs='+', default=[300, 400, 500], help='Divisores da grade')
+    sub.add_argument('--vantagem', type=float, nargs='+', default=[0, 25, 50, 75, 100],
+                     help='Vantagens de mando da grade (pontos de rating)')
+    sub.set_defaults(func=comando_evaluate)
+    
+    sub = subparsers.add_parser('show-rankings', help='Exibe os rankings dos perfis calculados')
+    sub.add_argument('--rodada', type=int, help='Rodada (padrão: rodada atual do status)')
+    sub.add_argument('--perfil-jogo', type=int, nargs='*', help='IDs de perfis de peso do jogo')
+    sub.add_argument('--perfil-sg', type=int, nargs='*', help='IDs de perfis de peso do SG')
+    sub.set_defaults(func=comando_show_rankings)
+    
+    sub = subparsers.add_parser('export-profiles', help='Exporta os perfis atuais em JSON')
+    sub.add_argument('caminho', nargs='?', help='Arquivo de saída (padrão: stdout)')
+    sub.set_defaults(func=comando_export_profiles)
+    
+    sub = subparsers.add_parser('scenarios', help='Sensibilidade dos pesos da próxima rodada aos resultados da atual')
+    sub.add_argument('--rodada', type=int, help='Rodada com resultados hipotéticos (padrão: rodada atual do status)')
+    sub.add_argument('--perfil-jogo', type=int, nargs='*', help='IDs de perfis de peso do jogo (padrão: todos)')
+    sub.add_argument('--perfil-sg', type=int, nargs='*', help='IDs de perfis de peso do SG (padrão: todos)')
+    sub.add_argument('--top', type=int, default=5, help='Clubes mais sensíveis exibidos por perfil (padrão: 5)')
+    sub.add_argument('--saida', help='Arquivo JSON com as sensibilidades completas')
+    sub.set_defaults(func=comando_scenarios)
+    
+    sub = subparsers.add_parser('simulate', help='Faixas de incerteza (bootstrap) dos pesos da rodada')
+    sub.add_argument('--rodada', type=int, help='Rodada (padrão: rodada atual do status)')
+    sub.add_argument('--perfil-jogo', type=int, nargs='*', help='IDs de perfis de peso do jogo (padrão: todos)')
+    sub.add_argument('--perfil-sg', type=int, nargs='*', help='IDs de perfis de peso do SG (padrão: todos)')
+    sub.add_argument('--amostras', type=int, help='Reamostragens por clube (padrão: SIMULACAO_AMOSTRAS)')
+    sub.add_argument('--semente', type=int, help='Semente (padrão: SIMULACAO_SEMENTE)')
+    sub.add_argument('--top', type=int, default=5, help='Clubes mais incertos exibidos por perfil (padrão: 5)')
+    sub.add_argument('--saida', help='Arquivo JSON com as bandas completas')
+    sub.set_defaults(func=comando_simulate)
+    
+    return parser
+
+def main(argv=None):
+    """Função principal: despacha o subcomando (sem subcomando, inicia o serviço)"""
+    args = _criar_parser().parse_args(argv)
+    if not args.comando:
+        return comando_serve(args)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
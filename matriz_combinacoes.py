@@ -0,0 +1,158 @@
+"""
+Matriz materializada de combinações (perfil de jogo × perfil de SG) por rodada
+
+A etapa de publicação gera, para cada (temporada, rodada), um blob binário denso com
+peso_jogo e peso_sg de todos os clubes em todas as combinações de perfis. Um consumidor
+obtém qualquer combinação com uma única leitura por chave, sem JOIN entre as tabelas acp_*.
+
+Layout do blob (little-endian), versão de formato 1:
+
+    Cabeçalho (24 bytes)
+        magic           4s      b'ACPM'
+        versao_formato  uint16  1
+        reservado       uint16  0
+        temporada       int32
+        rodada          int32
+        n_clubes        uint16  (C)
+        n_perfis_jogo   uint16  (J)
+        n_perfis_sg     uint16  (S)
+        reservado       uint16  0
+    Tabela de clubes        int32[C]   clube_id em ordem crescente
+    Tabela de perfis jogo   int32[J]   perfil_id em ordem crescente
+    Tabela de perfis SG     int32[S]   perfil_id em ordem crescente
+    Dados                   float32[J][S][C][2]   (peso_jogo, peso_sg); NaN = sem valor
+
+O bloco de uma combinação (j, s) é contíguo: começa em
+    offset_dados + ((j * S + s) * C) * 8
+e tem C * 8 bytes. Pode ser lido direto no banco com
+    SELECT substring(dados FROM offset + 1 FOR C * 8) FROM acp_matriz_combinacoes WHERE ...
+"""
+import logging
+import math
+import struct
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'ACPM'
+VERSAO_FORMATO = 1
+_CABECALHO = struct.Struct('<4sHHiiHHHH')
+
+
+def montar_matriz(temporada: int, rodada: int, pesos_jogo: Dict[int, Dict[int, float]],
+                  pesos_sg: Dict[int, Dict[int, float]]) -> bytes:
+    """
+    Serializa a matriz de combinações no layout documentado no módulo
+
+    Args:
+        temporada: Temporada
+        rodada: Rodada
+        pesos_jogo: {perfil_id: {clube_id: peso_jogo}}
+        pesos_sg: {perfil_id: {clube_id: peso_sg}}
+
+    Returns:
+        Blob binário
+    """
+    clubes = sorted(set().union(*pesos_jogo.values(), *pesos_sg.values()))
+    perfis_jogo = sorted(pesos_jogo)
+    perfis_sg = sorted(pesos_sg)
+    n_clubes = len(clubes)
+
+    # Colunas de cada perfil na ordem dos clubes (calculadas uma vez, reaproveitadas em cada par)
+    nan = float('nan')
+    colunas_jogo = [[pesos_jogo[p].get(c, nan) for c in clubes] for p in perfis_jogo]
+    colunas_sg = [[pesos_sg[p].get(c, nan) for c in clubes] for p in perfis_sg]
+
+    valores = []
+    for coluna_jogo in colunas_jogo:
+        for coluna_sg in colunas_sg:
+            for i in range(n_clubes):
+                valores.append(coluna_jogo[i])
+                valores.append(coluna_sg[i])
+
+    cabecalho = _CABECALHO.pack(
+        MAGIC, VERSAO_FORMATO, 0, temporada, rodada,
+        n_clubes, len(perfis_jogo), len(perfis_sg), 0
+    )
+    return b''.join([
+        cabecalho,
+        struct.pack(f'<{n_clubes}i', *clubes),
+        struct.pack(f'<{len(perfis_jogo)}i', *perfis_jogo),
+        struct.pack(f'<{len(perfis_sg)}i', *perfis_sg),
+        struct.pack(f'<{len(valores)}f', *valores),
+    ])
+
+
+def ler_cabecalho(blob: bytes) -> Dict:
+    """Decodifica cabeçalho e tabelas de índice do blob"""
+    magic, versao, _, temporada, rodada, n_clubes, n_jogo, n_sg, _ = _CABECALHO.unpack_from(blob, 0)
+    if magic != MAGIC:
+        raise ValueError("Blob não é uma matriz de combinações (magic inválido)")
+    if versao != VERSAO_FORMATO:
+        raise ValueError(f"Versão de formato não suportada: {versao}")
+
+    offset = _CABECALHO.size
+    clubes = struct.unpack_from(f'<{n_clubes}i', blob, offset)
+    offset += 4 * n_clubes
+    perfis_jogo = struct.unpack_from(f'<{n_jogo}i', blob, offset)
+    offset += 4 * n_jogo
+    perfis_sg = struct.unpack_from(f'<{n_sg}i', blob, offset)
+    offset += 4 * n_sg
+
+    return {
+        'temporada': temporada,
+        'rodada': rodada,
+        'clubes': clubes,
+        'perfis_jogo': perfis_jogo,
+        'perfis_sg': perfis_sg,
+        'offset_dados': offset,
+    }
+
+
+def offset_combinacao(cabecalho: Dict, perfil_jogo: int, perfil_sg: int) -> Tuple[int, int]:
+    """Retorna (offset, tamanho) em bytes do bloco da combinação dentro do blob"""
+    j = cabecalho['perfis_jogo'].index(perfil_jogo)
+    s = cabecalho['perfis_sg'].index(perfil_sg)
+    n_clubes = len(cabecalho['clubes'])
+    offset = cabecalho['offset_dados'] + ((j * len(cabecalho['perfis_sg']) + s) * n_clubes) * 8
+    return offset, n_clubes * 8
+
+
+def ler_combinacao(blob: bytes, perfil_jogo: int, perfil_sg: int) -> Dict[int, Tuple[Optional[float], Optional[float]]]:
+    """
+    Extrai uma combinação do blob
+
+    Returns:
+        {clube_id: (peso_jogo, peso_sg)} - None onde não há valor
+    """
+    cabecalho = ler_cabecalho(blob)
+    offset, _ = offset_combinacao(cabecalho, perfil_jogo, perfil_sg)
+    clubes = cabecalho['clubes']
+    valores = struct.unpack_from(f'<{2 * len(clubes)}f', blob, offset)
+
+    resultado = {}
+    for i, clube_id in enumerate(clubes):
+        peso_jogo, peso_sg = valores[2 * i], valores[2 * i + 1]
+        resultado[clube_id] = (
+            None if math.isnan(peso_jogo) else peso_jogo,
+            None if math.isnan(peso_sg) else peso_sg,
+        )
+    return resultado
+
+
+def gravar_matriz(cursor, temporada: int, rodada: int, pesos_jogo: Dict[int, Dict[int, float]],
+                  pesos_sg: Dict[int, Dict[int, float]]) -> int:
+    """
+    Materializa a matriz da rodada na tabela acp_matriz_combinacoes (sem commit)
+
+    Returns:
+        Tamanho do blob em bytes
+    """
+    blob = montar_matriz(temporada, rodada, pesos_jogo, pesos_sg)
+    cursor.execute('''
+        INSERT INTO acp_matriz_combinacoes (temporada, rodada_atual, formato_versao, dados)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (temporada, rodada_atual)
+        DO UPDATE SET formato_versao = EXCLUDED.formato_versao, dados = EXCLUDED.dados, created_at = NOW()
+    ''', (temporada, rodada, VERSAO_FORMATO, blob))
+    return len(blob)
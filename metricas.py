@@ -0,0 +1,72 @@
+"""
+Métricas em memória do processo do calculador
+
+Contadores de orçamento de tempo e degradação, expostos pela API de leitura em GET /metricas:
+
+    ciclos                   ciclos/jobs concluídos e duração do último
+    estouros                 {'ciclo': n, 'perfil': n, 'familia': n} - orçamentos estourados
+    estouros_por_familia     {familia: n}
+    perfis_obsoletos         perfis publicados com os pesos da publicação anterior
+    ultimo_estouro           {escopo, nome, em} do estouro mais recente
+"""
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+
+class Metricas:
+    """Contadores thread-safe (os jobs das famílias rodam em threads do agendador)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.iniciado_em = datetime.now()
+        self.ciclos = 0
+        self.ultima_duracao: Optional[float] = None
+        self.estouros: Dict[str, int] = {'ciclo': 0, 'perfil': 0, 'familia': 0}
+        self.estouros_por_familia: Dict[str, int] = {}
+        self.perfis_obsoletos = 0
+        self.ultimo_estouro: Optional[Dict] = None
+
+    def registrar_ciclo(self, duracao: float):
+        with self._lock:
+            self.ciclos += 1
+            self.ultima_duracao = duracao
+
+    def registrar_estouro(self, escopo: str, familia: str, perfil_id: Optional[int] = None):
+        """
+        Registra um orçamento estourado
+
+        Args:
+            escopo: 'ciclo' (orçamento do ciclo/job), 'perfil' ou 'familia' (prazo esperado da família)
+            familia: Nome da família
+            perfil_id: Perfil interrompido (escopos 'ciclo' e 'perfil')
+        """
+        with self._lock:
+            self.estouros[escopo] = self.estouros.get(escopo, 0) + 1
+            self.estouros_por_familia[familia] = self.estouros_por_familia.get(familia, 0) + 1
+            self.ultimo_estouro = {
+                'escopo': escopo,
+                'familia': familia,
+                'perfil_id': perfil_id,
+                'em': datetime.now().isoformat(timespec='seconds'),
+            }
+
+    def registrar_obsoleto(self):
+        with self._lock:
+            self.perfis_obsoletos += 1
+
+    def resumo(self) -> Dict:
+        with self._lock:
+            return {
+                'iniciado_em': self.iniciado_em.isoformat(timespec='seconds'),
+                'ciclos': self.ciclos,
+                'ultima_duracao': self.ultima_duracao,
+                'estouros': dict(self.estouros),
+                'estouros_por_familia': dict(self.estouros_por_familia),
+                'perfis_obsoletos': self.perfis_obsoletos,
+                'ultimo_estouro': self.ultimo_estouro,
+            }
+
+
+# Métricas únicas do processo
+metricas = Metricas()
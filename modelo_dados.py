@@ -0,0 +1,199 @@
+"""
+Modelo de dados compartilhado pelos calculadores
+
+    IndiceClubes     clube_id <-> índice denso 0..N-1 (posição nos arrays por clube)
+    TabelaPartidas   partidas da temporada em arrays paralelos tipados (numpy), em ordem
+                     cronológica (rodada, partida_id): partida_id, rodada, casa, visitante,
+                     placar_casa, placar_visitante, valida
+
+Casa e visitante são guardados como índices densos, então tabela de classificação, ratings e
+agregados trabalham com indexação inteira e operações vetorizadas (bincount), sem montar um
+dict por clube ou uma tupla por partida. A tabela é carregada uma vez por ciclo (uma consulta)
+e fica no cache persistente pela impressão das partidas.
+"""
+import logging
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from cache_persistente import cacheado
+
+logger = logging.getLogger(__name__)
+
+# Placar ainda não informado (NULL no banco)
+SEM_PLACAR = -1
+MANDOS = ('casa', 'fora')
+
+
+class IndiceClubes:
+    """Mapeamento clube_id -> índice denso (ids em ordem crescente)"""
+
+    __slots__ = ('ids', '_indice')
+
+    def __init__(self, clube_ids: Iterable[int]):
+        self.ids = np.unique(np.asarray(list(clube_ids), dtype=np.int64))
+        self._indice = {int(clube_id): i for i, clube_id in enumerate(self.ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, clube_id) -> bool:
+        return clube_id in self._indice
+
+    def indice(self, clube_id: int) -> int:
+        """Índice denso do clube (KeyError se desconhecido)"""
+        return self._indice[clube_id]
+
+    def get(self, clube_id: int, padrao: int = -1) -> int:
+        return self._indice.get(clube_id, padrao)
+
+    def indices(self, clube_ids) -> np.ndarray:
+        """Índices densos de vários clubes (todos devem ser conhecidos)"""
+        return np.searchsorted(self.ids, np.asarray(clube_ids, dtype=np.int64))
+
+    def clube(self, i: int) -> int:
+        return int(self.ids[i])
+
+
+class TabelaPartidas:
+    """
+    Partidas de uma temporada em arrays paralelos, em ordem cronológica
+
+    Args:
+        clubes: IndiceClubes (casa e visitante são índices nele)
+        partida_id, rodada, casa, visitante, placar_casa, placar_visitante, valida: Arrays paralelos
+            (placares sem resultado valem SEM_PLACAR)
+    """
+
+    def __init__(self, clubes: IndiceClubes, partida_id, rodada, casa, visitante,
+                 placar_casa, placar_visitante, valida):
+        self.clubes = clubes
+        self.partida_id = np.asarray(partida_id, dtype=np.int64)
+        self.rodada = np.asarray(rodada, dtype=np.int16)
+        self.casa = np.asarray(casa, dtype=np.int16)
+        self.visitante = np.asarray(visitante, dtype=np.int16)
+        self.placar_casa = np.asarray(placar_casa, dtype=np.int16)
+        self.placar_visitante = np.asarray(placar_visitante, dtype=np.int16)
+        self.valida = np.asarray(valida, dtype=bool)
+        # Partidas válidas com placar oficial (as únicas que entram nos cálculos)
+        self.encerrada = self.valida & (self.placar_casa != SEM_PLACAR) & (self.placar_visitante != SEM_PLACAR)
+        self._historicos = None
+
+    def __len__(self):
+        return len(self.partida_id)
+
+    @classmethod
+    def de_linhas(cls, linhas, clube_ids: Iterable[int] = ()) -> 'TabelaPartidas':
+        """
+        Monta a tabela a partir de linhas do banco
+
+        Args:
+            linhas: [(partida_id, rodada_id, casa_id, visitante_id, placar_mandante, placar_visitante, valida)]
+                em ordem cronológica
+            clube_ids: Clubes adicionais (ex.: todos de acf_clubes, mesmo sem partidas)
+        """
+        colunas = list(zip(*linhas)) if linhas else [()] * 7
+        partida_id, rodada, casa_ids, visitante_ids, placar_casa, placar_visitante, valida = colunas
+        clubes = IndiceClubes(list(clube_ids) + list(casa_ids) + list(visitante_ids))
+        return cls(
+            clubes,
+            partida_id,
+            rodada,
+            clubes.indices(casa_ids),
+            clubes.indices(visitante_ids),
+            [SEM_PLACAR if p is None else p for p in placar_casa],
+            [SEM_PLACAR if p is None else p for p in placar_visitante],
+            [bool(v) for v in valida],
+        )
+
+    def encerradas(self, ate_rodada: int) -> np.ndarray:
+        """Posições (ordem cronológica) das partidas encerradas até a rodada, inclusive"""
+        return np.flatnonzero(self.encerrada & (self.rodada <= ate_rodada))
+
+    def confrontos(self, rodada: int) -> List[tuple]:
+        """
+        Partidas válidas da rodada no formato dos calculadores de peso
+
+        Returns:
+            [(partida_id, casa_id, casa_nome, visitante_id, visitante_nome)] (nomes None)
+        """
+        posicoes = np.flatnonzero(self.valida & (self.rodada == rodada))
+        ids = self.clubes.ids
+        return [
+            (partida_id, casa_id, None, visitante_id, None)
+            for partida_id, casa_id, visitante_id in zip(
+                self.partida_id[posicoes].tolist(),
+                ids[self.casa[posicoes]].tolist(),
+                ids[self.visitante[posicoes]].tolist(),
+            )
+        ]
+
+    def resultado_casa(self, posicoes: np.ndarray) -> np.ndarray:
+        """Resultado do mandante (1.0 vitória, 0.5 empate, 0.0 derrota) nas partidas"""
+        return np.sign(self.placar_casa[posicoes] - self.placar_visitante[posicoes]) * 0.5 + 0.5
+
+    def _historicos_por_mando(self) -> dict:
+        """{mando: [posições das partidas encerradas do clube i, em ordem cronológica]}"""
+        if self._historicos is None:
+            posicoes = np.flatnonzero(self.encerrada)
+            historicos = {}
+            for mando, clubes in (('casa', self.casa), ('fora', self.visitante)):
+                ordem = posicoes[np.argsort(clubes[posicoes], kind='stable')]
+                limites = np.cumsum(np.bincount(clubes[posicoes], minlength=len(self.clubes)))[:-1]
+                historicos[mando] = np.split(ordem, limites)
+            self._historicos = historicos
+        return self._historicos
+
+    def ultimas_do_clube(self, clube: int, mando: str, ate_rodada: int, n: int) -> np.ndarray:
+        """
+        Posições das últimas n partidas encerradas do clube com o mando, até a rodada
+
+        Args:
+            clube: Índice denso do clube
+            mando: 'casa' ou 'fora'
+            ate_rodada: Última rodada considerada (inclusive)
+            n: Tamanho da janela
+
+        Returns:
+            Posições da mais recente para a mais antiga
+        """
+        historico = self._historicos_por_mando()[mando][clube]
+        historico = historico[self.rodada[historico] <= ate_rodada]
+        return historico[::-1][:n]
+
+    def gols_do_ponto_de_vista(self, posicoes: np.ndarray, mando: str):
+        """(gols_pro, gols_contra) do clube que jogou com o mando nas partidas"""
+        if mando == 'casa':
+            return self.placar_casa[posicoes], self.placar_visitante[posicoes]
+        return self.placar_visitante[posicoes], self.placar_casa[posicoes]
+
+
+def carregar_tabela_partidas(cursor, temporada: int, impressao: Optional[str] = None) -> TabelaPartidas:
+    """
+    Carrega todas as partidas da temporada (uma consulta) e os clubes de acf_clubes
+
+    Com a impressão (hash) das partidas, usa o cache persistente.
+    """
+    return cacheado(
+        'partidas', impressao, (temporada,),
+        lambda: _carregar_tabela_partidas(cursor, temporada)
+    )
+
+
+# Partidas da temporada inteira (também verificada com EXPLAIN em database.verificar_planos)
+CONSULTA_PARTIDAS_TEMPORADA = '''
+    SELECT partida_id, rodada_id, clube_casa_id, clube_visitante_id,
+           placar_oficial_mandante, placar_oficial_visitante, valida
+    FROM acf_partidas
+    WHERE temporada = %s
+    ORDER BY rodada_id, partida_id
+'''
+
+
+def _carregar_tabela_partidas(cursor, temporada: int) -> TabelaPartidas:
+    cursor.execute('SELECT id FROM acf_clubes')
+    clube_ids: List[int] = [clube_id for (clube_id,) in cursor.fetchall()]
+    cursor.execute(CONSULTA_PARTIDAS_TEMPORADA, (temporada,))
+    tabela = TabelaPartidas.de_linhas(cursor.fetchall(), clube_ids)
+    logger.debug(f"Tabela de partidas da temporada {temporada}: {len(tabela)} partidas, {len(tabela.clubes)} clubes")
+    return tabela
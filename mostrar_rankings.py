@@ -5,10 +5,10 @@ from api_cartola import get_temporada_atual
 
 logger = logging.getLogger(__name__)
 
-def mostrar_ranking_peso_jogo(conn, rodada_atual, perfil_id):
-    """Exibe ranking de peso do jogo para um perfil específico"""
+def mostrar_ranking_peso_jogo(conn, rodada_atual, perfil_id, temporada=None):
+    """Exibe ranking de peso do jogo para um perfil específico (temporada padrão: atual)"""
     cursor = conn.cursor()
-    temporada_atual = get_temporada_atual()
+    temporada_atual = temporada or get_temporada_atual()
     
     try:
         # Buscar dados com informações das partidas
@@ -100,10 +100,10 @@ def mostrar_ranking_peso_jogo(conn, rodada_atual, perfil_id):
     finally:
         cursor.close()
 
-def mostrar_ranking_peso_sg(conn, rodada_atual, perfil_id):
-    """Exibe ranking de peso do SG para um perfil específico"""
+def mostrar_ranking_peso_sg(conn, rodada_atual, perfil_id, temporada=None):
+    """Exibe ranking de peso do SG para um perfil específico (temporada padrão: atual)"""
     cursor = conn.cursor()
-    temporada_atual = get_temporada_atual()
+    temporada_atual = temporada or get_temporada_atual()
     
     try:
         # Buscar dados com informações das partidas
@@ -0,0 +1,236 @@
+"""
+Motor ELO em lote: replay da temporada para várias configurações ao mesmo tempo
+
+Os ratings de C configurações (K, divisor, vantagem de mando) ficam em uma matriz C × clubes.
+Cada rodada é processada como um passo vetorizado: todas as partidas da rodada atualizam a
+matriz de uma vez (um clube joga no máximo uma vez por passo, então o resultado é idêntico ao
+replay partida a partida; partidas adiadas que repetem um clube na rodada viram um passo extra).
+
+Uso:
+    grade = replay_grade(partidas, rodada_atual, [ConfiguracaoElo(20, 400, 0), ConfiguracaoElo(30, 400, 50)])
+    grade.historico(configuracao)[r]   # ratings (índice denso) antes da rodada r
+
+Na mesma passada são mantidos os componentes por mando (modo 'mando'): um rating de mandante,
+atualizado só nos jogos em casa, e um de visitante, atualizado só nos jogos fora. A expectativa
+de uma partida compara o rating de mandante da casa com o rating de visitante do adversário, então
+a vantagem de jogar em casa é absorvida pelos próprios componentes.
+
+    grade.historico_mando(configuracao, 'casa')[r]   # componente de mandante antes da rodada r
+
+A passada também acumula o Brier score e a log-loss da expectativa do mandante em cada partida
+(nos dois modos), usados por ajustar_grade para escolher configurações a partir do histórico.
+"""
+import itertools
+import logging
+from typing import Dict, Iterable, List, NamedTuple, Sequence
+
+import numpy as np
+
+from modelo_dados import TabelaPartidas
+
+logger = logging.getLogger(__name__)
+
+RATING_INICIAL = 1000
+K_FACTOR = 20  # Fator de ajuste (quanto maior, mais rápido o rating muda)
+DIVISOR_ELO = 400  # Divisor padrão do ELO
+
+
+class ConfiguracaoElo(NamedTuple):
+    """Parâmetros de um replay ELO"""
+    k_factor: float = K_FACTOR
+    divisor: float = DIVISOR_ELO
+    vantagem_casa: float = 0.0  # Pontos somados ao mandante no cálculo da expectativa
+
+
+CONFIGURACAO_PADRAO = ConfiguracaoElo()
+# 'geral': um rating por clube; 'mando': componentes de mandante e de visitante
+MODOS_RATING = ('geral', 'mando')
+
+
+class GradeElo:
+    """
+    Resultado de um replay em lote
+
+    Attributes:
+        configuracoes: Configurações na ordem das linhas
+        historicos: Array (ate_rodada + 1) × C × clubes; [r, c] = ratings antes da rodada r
+        historicos_mando: {'casa': array, 'fora': array} com os componentes por mando (mesmo formato)
+        brier / log_loss: Erro médio da expectativa do mandante por configuração (modo 'geral')
+        brier_mando / log_loss_mando: O mesmo no modo 'mando'
+        partidas_avaliadas: Partidas consideradas no erro
+    """
+
+    def __init__(self, configuracoes: Sequence[ConfiguracaoElo], historicos: np.ndarray,
+                 historicos_mando: Dict[str, np.ndarray], erros: Dict[str, np.ndarray], partidas_avaliadas: int):
+        self.configuracoes = list(configuracoes)
+        self.historicos = historicos
+        self.historicos_mando = historicos_mando
+        self.brier = erros['brier']
+        self.log_loss = erros['log_loss']
+        self.brier_mando = erros['brier_mando']
+        self.log_loss_mando = erros['log_loss_mando']
+        self.partidas_avaliadas = partidas_avaliadas
+        self._indice = {configuracao: i for i, configuracao in enumerate(self.configuracoes)}
+
+    def __contains__(self, configuracao) -> bool:
+        return configuracao in self._indice
+
+    def historico(self, configuracao: ConfiguracaoElo) -> np.ndarray:
+        """Ratings antes de cada rodada ((ate_rodada + 1) × clubes) de uma configuração"""
+        return self.historicos[:, self._indice[configuracao], :]
+
+    def historico_mando(self, configuracao: ConfiguracaoElo, mando: str) -> np.ndarray:
+        """Componente de mandante ('casa') ou de visitante ('fora') antes de cada rodada"""
+        return self.historicos_mando[mando][:, self._indice[configuracao], :]
+
+
+def passos_da_temporada(partidas: TabelaPartidas, posicoes: np.ndarray) -> List[np.ndarray]:
+    """
+    Agrupa as partidas (em ordem cronológica) em passos sem clube repetido
+
+    Normalmente um passo = uma rodada; um clube com duas partidas na mesma rodada (jogo adiado)
+    abre um novo passo, preservando a ordem cronológica.
+    """
+    passos = []
+    atual: List[int] = []
+    clubes_no_passo = set()
+    rodada_passo = None
+    for posicao, rodada, casa, visitante in zip(
+        posicoes.tolist(),
+        partidas.rodada[posicoes].tolist(),
+        partidas.casa[posicoes].tolist(),
+        partidas.visitante[posicoes].tolist(),
+    ):
+        if rodada != rodada_passo or casa in clubes_no_passo or visitante in clubes_no_passo:
+            if atual:
+                passos.append(np.array(atual, dtype=np.int64))
+            atual, clubes_no_passo, rodada_passo = [], set(), rodada
+        atual.append(posicao)
+        clubes_no_passo.update((casa, visitante))
+    if atual:
+        passos.append(np.array(atual, dtype=np.int64))
+    return passos
+
+
+def aplicar_passo(ratings: np.ndarray, ratings_mando: Dict[str, np.ndarray], casa: np.ndarray,
+                  visitante: np.ndarray, resultado_casa: np.ndarray, k: np.ndarray, divisor: np.ndarray,
+                  vantagem: np.ndarray):
+    """
+    Atualiza (no lugar) os ratings C × clubes com as partidas de um passo (sem clube repetido)
+
+    Args:
+        ratings: Ratings do modo 'geral'
+        ratings_mando: {'casa': componentes de mandante, 'fora': componentes de visitante}
+        casa, visitante: Índices densos dos clubes das partidas
+        resultado_casa: Resultado do mandante em cada partida (1.0, 0.5 ou 0.0)
+        k, divisor, vantagem: Parâmetros das configurações (colunas C × 1)
+
+    Returns:
+        (expectativa do mandante no modo 'geral', expectativa no modo 'mando'), arrays C × partidas
+    """
+    # Modo geral: um rating por clube, vantagem de mando como deslocamento fixo
+    rating_casa = ratings[:, casa]
+    rating_visitante = ratings[:, visitante]
+    esperado_casa = 1.0 / (1.0 + 10.0 ** ((rating_visitante - rating_casa - vantagem) / divisor))
+    esperado_visitante = 1.0 / (1.0 + 10.0 ** ((rating_casa + vantagem - rating_visitante) / divisor))
+    ratings[:, casa] = rating_casa + k * (resultado_casa - esperado_casa)
+    ratings[:, visitante] = rating_visitante + k * ((1.0 - resultado_casa) - esperado_visitante)
+
+    # Modo mando: componente de mandante da casa contra componente de visitante do adversário
+    componente_casa = ratings_mando['casa'][:, casa]
+    componente_fora = ratings_mando['fora'][:, visitante]
+    esperado_mando = 1.0 / (1.0 + 10.0 ** ((componente_fora - componente_casa - vantagem) / divisor))
+    ratings_mando['casa'][:, casa] = componente_casa + k * (resultado_casa - esperado_mando)
+    ratings_mando['fora'][:, visitante] = componente_fora + k * (esperado_mando - resultado_casa)
+    return esperado_casa, esperado_mando
+
+
+def parametros_grade(configuracoes: Sequence[ConfiguracaoElo]):
+    """(k, divisor, vantagem) das configurações em colunas C × 1"""
+    return tuple(
+        np.array([getattr(c, campo) for c in configuracoes], dtype=np.float64)[:, None]
+        for campo in ConfiguracaoElo._fields
+    )
+
+
+def replay_grade(partidas: TabelaPartidas, ate_rodada: int,
+                 configuracoes: Iterable[ConfiguracaoElo]) -> GradeElo:
+    """
+    Replay cronológico do ELO até ate_rodada - 1 para todas as configurações de uma vez
+
+    Args:
+        partidas: Tabela de partidas da temporada
+        ate_rodada: Última linha do histórico (ratings antes dessa rodada)
+        configuracoes: Configurações (repetidas são calculadas uma vez)
+    """
+    configuracoes = list(dict.fromkeys(configuracoes)) or [CONFIGURACAO_PADRAO]
+    k, divisor, vantagem = parametros_grade(configuracoes)
+
+    forma = (len(configuracoes), len(partidas.clubes))
+    ratings = np.full(forma, float(RATING_INICIAL))
+    ratings_mando = {'casa': np.full(forma, float(RATING_INICIAL)), 'fora': np.full(forma, float(RATING_INICIAL))}
+    historicos = np.empty((ate_rodada + 1,) + forma)
+    historicos_mando = {mando: np.empty((ate_rodada + 1,) + forma) for mando in ratings_mando}
+    erros = {nome: np.zeros(len(configuracoes)) for nome in ('brier', 'log_loss', 'brier_mando', 'log_loss_mando')}
+
+    posicoes = partidas.encerradas(ate_rodada - 1)
+    linha = 0
+    for passo in passos_da_temporada(partidas, posicoes):
+        rodada = int(partidas.rodada[passo[0]])
+        # Fotografia dos ratings antes da primeira partida de cada rodada
+        while linha <= rodada:
+            historicos[linha] = ratings
+            for mando in ratings_mando:
+                historicos_mando[mando][linha] = ratings_mando[mando]
+            linha += 1
+
+        resultado_casa = partidas.resultado_casa(passo)
+        esperado_casa, esperado_mando = aplicar_passo(
+            ratings, ratings_mando, partidas.casa[passo], partidas.visitante[passo], resultado_casa,
+            k, divisor, vantagem
+        )
+        _acumular_erros(erros, 'brier', 'log_loss', esperado_casa, resultado_casa)
+        _acumular_erros(erros, 'brier_mando', 'log_loss_mando', esperado_mando, resultado_casa)
+
+    while linha <= ate_rodada:
+        historicos[linha] = ratings
+        for mando in ratings_mando:
+            historicos_mando[mando][linha] = ratings_mando[mando]
+        linha += 1
+
+    n = max(len(posicoes), 1)
+    return GradeElo(configuracoes, historicos, historicos_mando,
+                    {nome: valores / n for nome, valores in erros.items()}, len(posicoes))
+
+
+def _acumular_erros(erros: Dict[str, np.ndarray], brier: str, log_loss: str,
+                    esperado_casa: np.ndarray, resultado_casa: np.ndarray):
+    """Soma o Brier score e a log-loss das partidas do passo (por configuração)"""
+    erros[brier] += ((esperado_casa - resultado_casa) ** 2).sum(axis=1)
+    prob = np.clip(esperado_casa, 1e-12, 1 - 1e-12)
+    erros[log_loss] -= (resultado_casa * np.log(prob) + (1.0 - resultado_casa) * np.log(1.0 - prob)).sum(axis=1)
+
+
+def ajustar_grade(partidas: TabelaPartidas, ate_rodada: int, k_factors: Iterable[float],
+                  divisores: Iterable[float], vantagens: Iterable[float]) -> List[Dict]:
+    """
+    Avalia a grade K × divisor × vantagem de mando no histórico da temporada (um único replay)
+
+    Returns:
+        [{'configuracao': ConfiguracaoElo, 'brier': float, 'log_loss': float,
+          'brier_mando': float, 'log_loss_mando': float}] do menor para o maior Brier score
+    """
+    configuracoes = [ConfiguracaoElo(*valores) for valores in itertools.product(k_factors, divisores, vantagens)]
+    grade = replay_grade(partidas, ate_rodada, configuracoes)
+    logger.info(f"Grade ELO avaliada: {len(grade.configuracoes)} configurações, {grade.partidas_avaliadas} partidas")
+    avaliacao = [
+        {
+            'configuracao': configuracao,
+            'brier': float(grade.brier[i]),
+            'log_loss': float(grade.log_loss[i]),
+            'brier_mando': float(grade.brier_mando[i]),
+            'log_loss_mando': float(grade.log_loss_mando[i]),
+        }
+        for i, configuracao in enumerate(grade.configuracoes)
+    ]
+    return sorted(avaliacao, key=lambda a: a['brier'])
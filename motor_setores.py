@@ -0,0 +1,245 @@
+"""
+Motor de análise de setores dos times (ataque, meio e defesa)
+
+Carrega todos os atletas relevantes em uma única consulta e calcula, em uma passada
+vetorizada, o score de titulares, profundidade e consistência de todos os clubes × setores.
+O resultado é uma matriz clube × setor compartilhada por todas as famílias de peso do jogo
+(normal, ajustada e rating).
+"""
+import logging
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from cache_persistente import cacheado
+
+logger = logging.getLogger(__name__)
+
+SETORES = ('ata', 'mei', 'def')
+POSICOES_SETOR = {'ata': (5,), 'mei': (4,), 'def': (1, 2, 3)}
+# Quantidade de titulares considerada em cada setor (defesa: 3, demais: 5)
+TITULARES_SETOR = np.array([5, 5, 3])
+SCORE_SEM_JOGADORES = 1.0
+
+_SETOR_POR_POSICAO = {posicao: i for i, setor in enumerate(SETORES) for posicao in POSICOES_SETOR[setor]}
+
+
+class MatrizSetores:
+    """Scores finais de setor por clube (linhas: clubes, colunas: SETORES)"""
+
+    def __init__(self, clubes: np.ndarray, scores: np.ndarray, num_jogadores: np.ndarray):
+        self.clubes = clubes
+        self.scores = scores
+        self.num_jogadores = num_jogadores
+        self.indice = {int(clube_id): i for i, clube_id in enumerate(clubes)}
+
+    def score(self, clube_id: int, setor: str) -> float:
+        """Score final do setor do clube (1.0 se o clube não tem jogadores no setor)"""
+        i = self.indice.get(clube_id)
+        if i is None:
+            return SCORE_SEM_JOGADORES
+        return float(self.scores[i, SETORES.index(setor)])
+
+    def scores_clube(self, clube_id: int) -> np.ndarray:
+        """Vetor de scores (ata, mei, def) do clube"""
+        i = self.indice.get(clube_id)
+        if i is None:
+            return np.full(len(SETORES), SCORE_SEM_JOGADORES)
+        return self.scores[i]
+
+    def razoes(self, casa_id: int, visitante_id: int) -> Tuple[float, float, float]:
+        """Razões (ata, mei, def) casa/visitante com raiz cúbica, usadas no peso do jogo"""
+        razoes = np.cbrt(self.scores_clube(casa_id) / self.scores_clube(visitante_id))
+        return float(razoes[0]), float(razoes[1]), float(razoes[2])
+
+    def como_dicionario(self) -> Dict[Tuple[int, str], float]:
+        """{(clube_id, setor): score_final}"""
+        return {
+            (int(clube_id), setor): float(self.scores[i, j])
+            for i, clube_id in enumerate(self.clubes)
+            for j, setor in enumerate(SETORES)
+        }
+
+
+def calcular_matriz_setores(clube_ids, posicao_ids, medias, jogos) -> MatrizSetores:
+    """
+    Calcula a matriz clube × setor a partir dos atletas (arrays paralelos)
+
+    Os atletas devem vir ordenados por média decrescente (a ordem define os titulares de
+    cada setor). Reproduz o cálculo por setor:
+        score_jogador = 0.7 * min(media/10, 1) + 0.3 * min(jogos/20, 1)
+        titulares     = média dos N melhores (N = 3 na defesa, 5 nos demais)
+        profundidade  = média dos reservas (ou 0.8 * titulares se não houver)
+        consistência  = max(0.1, 1 - desvio_padrão_amostral / 2) (1.0 com um jogador)
+        score_final   = max(0.1, 0.6 * titulares + 0.25 * profundidade + 0.15 * consistência)
+    """
+    clube_ids = np.asarray(clube_ids, dtype=np.int64)
+    setor_idx = np.array([_SETOR_POR_POSICAO.get(int(p), -1) for p in posicao_ids], dtype=np.int64)
+    medias = np.asarray(medias, dtype=np.float64)
+    jogos = np.asarray(jogos, dtype=np.float64)
+
+    validos = setor_idx >= 0
+    clube_ids, setor_idx, medias, jogos = clube_ids[validos], setor_idx[validos], medias[validos], jogos[validos]
+
+    clubes, clube_idx = np.unique(clube_ids, return_inverse=True)
+    n_setores = len(SETORES)
+    n_grupos = len(clubes) * n_setores
+
+    # Score individual (média e jogos nulos/zerados tratados como no cálculo original)
+    medias = np.maximum(np.nan_to_num(medias, nan=1.0), 1.0)
+    jogos = np.maximum(np.nan_to_num(jogos, nan=0.0), 0.0)
+    scores = 0.7 * np.minimum(medias / 10.0, 1.0) + 0.3 * np.minimum(jogos / 20.0, 1.0)
+
+    # Agrupar por (clube, setor) preservando a ordem por média (sort estável)
+    grupo = clube_idx * n_setores + setor_idx
+    ordem = np.argsort(grupo, kind='stable')
+    grupo = grupo[ordem]
+    scores = scores[ordem]
+
+    contagem = np.bincount(grupo, minlength=n_grupos)
+    inicio = np.cumsum(contagem) - contagem
+    posicao_no_grupo = np.arange(len(grupo)) - inicio[grupo]
+
+    n_titulares = np.minimum(contagem, np.tile(TITULARES_SETOR, len(clubes)))
+    eh_titular = posicao_no_grupo < n_titulares[grupo]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        soma_titulares = np.bincount(grupo, weights=scores * eh_titular, minlength=n_grupos)
+        score_titulares = np.where(n_titulares > 0, soma_titulares / n_titulares, 1.0)
+
+        n_reservas = contagem - n_titulares
+        soma_reservas = np.bincount(grupo, weights=scores * ~eh_titular, minlength=n_grupos)
+        score_profundidade = np.where(n_reservas > 0, soma_reservas / n_reservas, score_titulares * 0.8)
+
+        media_grupo = np.bincount(grupo, weights=scores, minlength=n_grupos) / contagem
+        soma_quadrados = np.bincount(grupo, weights=(scores - media_grupo[grupo]) ** 2, minlength=n_grupos)
+        desvio_padrao = np.sqrt(soma_quadrados / (contagem - 1))
+        score_consistencia = np.where(contagem > 1, np.maximum(0.1, 1.0 - desvio_padrao / 2.0), 1.0)
+
+    score_final = np.maximum(0.1, 0.6 * score_titulares + 0.25 * score_profundidade + 0.15 * score_consistencia)
+    score_final = np.where(contagem > 0, score_final, SCORE_SEM_JOGADORES)
+
+    return MatrizSetores(
+        clubes,
+        score_final.reshape(len(clubes), n_setores),
+        contagem.reshape(len(clubes), n_setores),
+    )
+
+
+def carregar_matriz_setores(cursor, usar_provaveis_cartola: bool = False,
+                            impressao: Optional[str] = None) -> MatrizSetores:
+    """
+    Carrega todos os atletas (status 7 ou prováveis) em uma consulta e calcula a matriz
+
+    Args:
+        cursor: Cursor do banco
+        usar_provaveis_cartola: Se deve usar os prováveis do Cartola em vez do status 7
+        impressao: Hash dos dados dos atletas; quando informado, usa o cache persistente
+    """
+    return cacheado(
+        'setores', impressao, (usar_provaveis_cartola,),
+        lambda: _carregar_matriz_setores(cursor, usar_provaveis_cartola)
+    )
+
+
+# Atletas das posições dos setores (parâmetro: posições); também verificadas com EXPLAIN em
+# database.verificar_planos
+CONSULTA_SETORES = '''
+    SELECT a.clube_id, a.posicao_id, a.media_num, a.jogos_num
+    FROM acf_atletas a
+    WHERE a.posicao_id = ANY(%s) AND a.status_id = 7
+    ORDER BY a.media_num DESC
+'''
+CONSULTA_SETORES_PROVAVEIS = '''
+    SELECT a.clube_id, a.posicao_id, a.media_num, a.jogos_num
+    FROM acf_atletas a
+    JOIN provaveis_cartola p ON a.atleta_id = p.atleta_id
+    WHERE a.posicao_id = ANY(%s) AND p.status = 'provavel'
+    ORDER BY a.media_num DESC
+'''
+POSICOES_SETORES = tuple(sorted(_SETOR_POR_POSICAO))
+
+
+def _carregar_matriz_setores(cursor, usar_provaveis_cartola: bool) -> MatrizSetores:
+    consulta = CONSULTA_SETORES_PROVAVEIS if usar_provaveis_cartola else CONSULTA_SETORES
+    cursor.execute(consulta, (list(POSICOES_SETORES),))
+    atletas = cursor.fetchall()
+
+    if not atletas:
+        logger.warning("Nenhum atleta encontrado para análise de setores")
+        vazio = np.empty(0)
+        return calcular_matriz_setores(vazio, vazio, vazio, vazio)
+
+    clube_ids, posicao_ids, medias, jogos = zip(*atletas)
+    matriz = calcular_matriz_setores(
+        clube_ids, posicao_ids,
+        [np.nan if m is None else float(m) for m in medias],
+        [np.nan if j is None else float(j) for j in jogos],
+    )
+    logger.info(f"Matriz de setores calculada: {len(matriz.clubes)} clubes × {len(SETORES)} setores ({len(atletas)} atletas)")
+    return matriz
+
+
+# Posições usadas nos agregados de prováveis do peso do SG
+POSICOES_DEFESA_SG = (1, 2, 3, 6)
+POSICOES_ATAQUE_SG = (4, 5)
+
+
+def carregar_agregados_provaveis(cursor, impressao: Optional[str] = None) -> Dict[int, Dict[str, float]]:
+    """
+    Médias de defesa e ataque dos prováveis de todos os clubes em uma consulta agrupada
+
+    Args:
+        cursor: Cursor do banco
+        impressao: Hash dos atletas prováveis; quando informado, usa o cache persistente
+
+    Returns:
+        {clube_id: {'media_defesa', 'total_defesa', 'media_ataque', 'total_ataque'}}
+        (médias None quando o clube não tem prováveis no setor)
+    """
+    return cacheado('provaveis_sg', impressao, (), lambda: _carregar_agregados_provaveis(cursor))
+
+
+# Médias dos prováveis agrupadas por clube (parâmetros: PARAMETROS_AGREGADOS_PROVAVEIS)
+CONSULTA_AGREGADOS_PROVAVEIS = '''
+    SELECT a.clube_id,
+           AVG(a.media_num) FILTER (WHERE a.posicao_id = ANY(%s)),
+           COUNT(*) FILTER (WHERE a.posicao_id = ANY(%s)),
+           AVG(a.media_num) FILTER (WHERE a.posicao_id = ANY(%s)),
+           COUNT(*) FILTER (WHERE a.posicao_id = ANY(%s))
+    FROM acf_atletas a
+    JOIN provaveis_cartola p ON a.atleta_id = p.atleta_id
+    WHERE p.status = 'provavel'
+    GROUP BY a.clube_id
+'''
+PARAMETROS_AGREGADOS_PROVAVEIS = (
+    list(POSICOES_DEFESA_SG), list(POSICOES_DEFESA_SG), list(POSICOES_ATAQUE_SG), list(POSICOES_ATAQUE_SG)
+)
+
+
+def _carregar_agregados_provaveis(cursor) -> Dict[int, Dict[str, float]]:
+    cursor.execute(CONSULTA_AGREGADOS_PROVAVEIS, PARAMETROS_AGREGADOS_PROVAVEIS)
+
+    agregados = {}
+    for clube_id, media_defesa, total_defesa, media_ataque, total_ataque in cursor.fetchall():
+        agregados[clube_id] = {
+            'media_defesa': float(media_defesa) if media_defesa is not None else None,
+            'total_defesa': total_defesa,
+            'media_ataque': float(media_ataque) if media_ataque is not None else None,
+            'total_ataque': total_ataque,
+        }
+    logger.info(f"Agregados de prováveis calculados para {len(agregados)} clubes")
+    return agregados
+
+
+def calcular_fator_jogadores(agregados: Dict[int, Dict[str, float]], clube_id: int, adversario_id: int) -> float:
+    """
+    Fator de jogadores do SG: defesa provável do clube contra ataque provável do adversário
+
+    Retorna 0.5 (neutro) quando falta média de algum dos lados.
+    """
+    media_defesa = agregados.get(clube_id, {}).get('media_defesa')
+    media_ataque = agregados.get(adversario_id, {}).get('media_ataque')
+    if not media_defesa or not media_ataque:
+        return 0.5
+    return max(0.1, min(1.0, (media_defesa / 10.0) - (media_ataque / 10.0) + 0.5))
@@ -0,0 +1,149 @@
+"""
+Política de agendamento guiada pelo status do mercado
+
+Decide quanto esperar até a próxima verificação/ciclo a partir do status_mercado e do horário
+de fechamento informados pela API de status:
+
+    mercado fechado / manutenção   backoff crescente (dobra a cada verificação sem mudança,
+                                   de INTERVALO_FECHADO_MIN até INTERVALO_FECHADO_MAX)
+    transição para aberto          o ciclo roda na própria verificação que detecta a abertura
+                                   e a cadência fica curta nas primeiras horas (corrida de usuários)
+    horas antes do fechamento      cadência curta, com um último ciclo logo antes do fechamento
+    demais momentos                CALCULATION_INTERVAL_MINUTES
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STATUS_ABERTO = 1
+# Margem antes do fechamento para o último ciclo terminar com o mercado ainda aberto
+MARGEM_FECHAMENTO = timedelta(minutes=2)
+INTERVALO_MINIMO = timedelta(minutes=1)
+
+
+def obter_fechamento(status_data: Optional[Dict]) -> Optional[datetime]:
+    """Horário de fechamento do mercado no payload de status (None se ausente/inválido)"""
+    fechamento = (status_data or {}).get('fechamento') or {}
+    try:
+        if fechamento.get('timestamp'):
+            return datetime.fromtimestamp(int(fechamento['timestamp']))
+        return datetime(int(fechamento['ano']), int(fechamento['mes']), int(fechamento['dia']),
+                        int(fechamento.get('hora', 0)), int(fechamento.get('minuto', 0)))
+    except (KeyError, TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+class PoliticaAgendamento:
+    """
+    Estado da política entre verificações (status anterior, início da abertura, backoff)
+
+    Args:
+        intervalo_padrao: Cadência normal com o mercado aberto
+        intervalo_curto: Cadência após a abertura e antes do fechamento
+        janela_pos_abertura: Duração da cadência curta após a abertura
+        janela_pre_fechamento: Antecedência do fechamento a partir da qual a cadência é curta
+        intervalo_fechado_min / intervalo_fechado_max: Limites do backoff com o mercado fechado
+    """
+
+    def __init__(self, intervalo_padrao: timedelta, intervalo_curto: timedelta,
+                 janela_pos_abertura: timedelta, janela_pre_fechamento: timedelta,
+                 intervalo_fechado_min: timedelta, intervalo_fechado_max: timedelta):
+        self.intervalo_padrao = intervalo_padrao
+        self.intervalo_curto = intervalo_curto
+        self.janela_pos_abertura = janela_pos_abertura
+        self.janela_pre_fechamento = janela_pre_fechamento
+        self.intervalo_fechado_min = intervalo_fechado_min
+        self.intervalo_fechado_max = intervalo_fechado_max
+
+        self.status_anterior: Optional[int] = None
+        self.aberto_desde: Optional[datetime] = None
+        self._intervalo_fechado: Optional[timedelta] = None
+
+    def registrar_status(self, status_data: Optional[Dict], agora: Optional[datetime] = None,
+                         origem: Optional[str] = None) -> bool:
+        """
+        Registra o status da verificação atual
+
+        Um status de fallback (origem 'ultimo_valido', a API falhou) não é uma leitura nova: não
+        conta como transição nem substitui o status anterior.
+
+        Returns:
+            True se o mercado acabou de abrir (transição para aberto)
+        """
+        if origem == 'ultimo_valido':
+            logger.info("Status do mercado do fallback (último válido); transições não avaliadas nesta verificação")
+            return False
+        agora = agora or datetime.now()
+        status = (status_data or {}).get('status_mercado')
+        abriu = status == STATUS_ABERTO and self.status_anterior is not None and self.status_anterior != STATUS_ABERTO
+
+        if status == STATUS_ABERTO:
+            # Ao iniciar o serviço com o mercado já aberto não se sabe quando abriu (aberto_desde = None)
+            if abriu:
+                self.aberto_desde = agora
+            self._intervalo_fechado = None
+        elif status != self.status_anterior:
+            self.aberto_desde = None
+            self._intervalo_fechado = None
+
+        if status is not None:
+            self.status_anterior = status
+        if abriu:
+            logger.info("Mercado abriu desde a última verificação: executando ciclo imediatamente")
+        return abriu
+
+    def proximo_intervalo(self, status_data: Optional[Dict], agora: Optional[datetime] = None) -> Tuple[timedelta, str]:
+        """
+        Intervalo até a próxima verificação, a partir do status registrado
+
+        Returns:
+            (intervalo, motivo)
+        """
+        agora = agora or datetime.now()
+        status = (status_data or {}).get('status_mercado')
+
+        if status is None:
+            # Sem status (API indisponível): tentar de novo na cadência normal
+            return self.intervalo_padrao, 'status indisponível'
+
+        if status != STATUS_ABERTO:
+            if self._intervalo_fechado is None:
+                self._intervalo_fechado = self.intervalo_fechado_min
+            else:
+                self._intervalo_fechado = min(self._intervalo_fechado * 2, self.intervalo_fechado_max)
+            return self._intervalo_fechado, f'mercado fechado (status {status}), backoff'
+
+        intervalo, motivo = self.intervalo_padrao, 'mercado aberto'
+        if self.aberto_desde is not None and agora - self.aberto_desde < self.janela_pos_abertura:
+            intervalo, motivo = self.intervalo_curto, 'logo após a abertura'
+
+        fechamento = obter_fechamento(status_data)
+        if fechamento is not None:
+            ate_fechamento = fechamento - agora
+            if ate_fechamento <= self.janela_pre_fechamento:
+                intervalo, motivo = min(intervalo, self.intervalo_curto), 'perto do fechamento'
+            # Último ciclo logo antes do fechamento; depois dele, a próxima verificação já encontra
+            # o mercado fechado
+            limite = ate_fechamento - MARGEM_FECHAMENTO
+            if timedelta(0) < limite < intervalo:
+                intervalo, motivo = limite, 'último ciclo antes do fechamento'
+
+        return max(intervalo, INTERVALO_MINIMO), motivo
+
+
+def criar_politica() -> PoliticaAgendamento:
+    """Política com os parâmetros do config"""
+    from config import (
+        CALCULATION_INTERVAL_MINUTES, INTERVALO_CURTO_MINUTOS, JANELA_POS_ABERTURA_HORAS,
+        JANELA_PRE_FECHAMENTO_HORAS, INTERVALO_FECHADO_MIN_MINUTOS, INTERVALO_FECHADO_MAX_MINUTOS
+    )
+    return PoliticaAgendamento(
+        intervalo_padrao=timedelta(minutes=CALCULATION_INTERVAL_MINUTES),
+        intervalo_curto=timedelta(minutes=INTERVALO_CURTO_MINUTOS),
+        janela_pos_abertura=timedelta(hours=JANELA_POS_ABERTURA_HORAS),
+        janela_pre_fechamento=timedelta(hours=JANELA_PRE_FECHAMENTO_HORAS),
+        intervalo_fechado_min=timedelta(minutes=INTERVALO_FECHADO_MIN_MINUTOS),
+        intervalo_fechado_max=timedelta(minutes=INTERVALO_FECHADO_MAX_MINUTOS),
+    )
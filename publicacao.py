@@ -0,0 +1,311 @@
+"""
+Etapa de publicação dos resultados de um ciclo de cálculos
+
+Depois que todos os perfis foram gravados nas tabelas acp_*, os resultados da rodada
+são lidos uma única vez e entregues aos consumidores:
+- cache em memória da API de leitura embutida
+- matriz materializada de combinações (acp_matriz_combinacoes)
+- snapshot binário mapeável em memória no volume compartilhado (SNAPSHOT_DIR)
+- NOTIFY no canal CANAL_NOTIFICACAO com o resumo do que mudou
+
+Cada publicação recebe um número de geração (acp_publicacoes) que versiona os artefatos.
+Um ciclo cujo resultado é idêntico ao da geração anterior da mesma rodada não gera nova
+geração nem notificação.
+
+Payload da notificação (JSON):
+    {"temporada": 2025, "rodada": 20, "geracao": 123, "nova_rodada": false,
+     "perfis_jogo": [1, 6], "perfis_sg": [3]}
+perfis_jogo/perfis_sg listam apenas os perfis cujos pesos mudaram em relação à geração anterior
+(todos, quando nova_rodada é true). Quando algum perfil está obsoleto, o payload traz também
+"obsoletos": {"jogo": [...], "sg": [...]}.
+
+Perfis obsoletos: um perfil que estoura o orçamento de tempo ou falha no ciclo não deixa a rodada
+sem pesos - manter_pesos_anteriores copia os pesos publicados anteriormente (da mesma rodada ou,
+numa rodada nova, da rodada anterior) com obsoleto = TRUE, até que um ciclo recalcule o perfil.
+"""
+import hashlib
+import json
+import logging
+import threading
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Tuple
+from api_leitura import cache_leitura
+from matriz_combinacoes import gravar_matriz
+from snapshot_binario import gravar_snapshot
+from config import SNAPSHOT_DIR
+
+logger = logging.getLogger(__name__)
+
+# Tabela e coluna de pesos de cada tipo de perfil
+TABELAS_PESOS = {
+    'jogo': ('acp_peso_jogo_perfis', 'peso_jogo'),
+    'sg': ('acp_peso_sg_perfis', 'peso_sg'),
+}
+
+# Canal do LISTEN/NOTIFY usado para avisar os consumidores de novas publicações
+CANAL_NOTIFICACAO = 'acp_pesos_publicados'
+
+# As famílias de cálculo publicam em jobs independentes; a geração, a matriz e o snapshot de
+# uma publicação não podem se intercalar com os de outra
+_lock_publicacao = threading.Lock()
+
+
+def carregar_resultados_rodada(cursor, rodada_atual: int, temporada: int) -> Dict[str, Dict[int, Dict[int, float]]]:
+    """
+    Lê os pesos de todos os perfis de uma rodada
+
+    Args:
+        cursor: Cursor do banco
+        rodada_atual: Rodada dos resultados
+        temporada: Temporada dos resultados
+
+    Returns:
+        {'jogo': {perfil_id: {clube_id: peso_jogo}}, 'sg': {perfil_id: {clube_id: peso_sg}},
+         'obsoletos': {'jogo': [perfil_id], 'sg': [perfil_id]}}
+    """
+    resultados = {'jogo': {}, 'sg': {}, 'obsoletos': {'jogo': [], 'sg': []}}
+
+    for tipo, (tabela, coluna) in TABELAS_PESOS.items():
+        cursor.execute(f'''
+            SELECT perfil_id, clube_id, {coluna}, obsoleto
+            FROM {tabela}
+            WHERE rodada_atual = %s AND temporada = %s
+        ''', (rodada_atual, temporada))
+        obsoletos = set()
+        for perfil_id, clube_id, peso, obsoleto in cursor.fetchall():
+            resultados[tipo].setdefault(perfil_id, {})[clube_id] = float(peso)
+            if obsoleto:
+                obsoletos.add(perfil_id)
+        resultados['obsoletos'][tipo] = sorted(obsoletos)
+
+    return resultados
+
+
+def manter_pesos_anteriores(conn, tipo: str, perfil_id: int, rodada_atual: int, temporada: int) -> int:
+    """
+    Mantém os pesos publicados anteriormente de um perfil que não foi recalculado, marcados como obsoletos
+
+    Se o perfil já tem pesos na rodada (de um ciclo anterior), apenas os marca como obsoletos.
+    Senão (rodada nova), copia os pesos da rodada mais recente do perfil na temporada.
+
+    Args:
+        conn: Conexão com banco
+        tipo: 'jogo' ou 'sg'
+        perfil_id: Perfil não recalculado
+        rodada_atual: Rodada do ciclo
+        temporada: Temporada do ciclo
+
+    Returns:
+        Número de clubes com pesos mantidos (0 se o perfil nunca foi publicado)
+    """
+    tabela, coluna = TABELAS_PESOS[tipo]
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f'''
+            UPDATE {tabela} SET obsoleto = TRUE
+            WHERE perfil_id = %s AND rodada_atual = %s AND temporada = %s
+        ''', (perfil_id, rodada_atual, temporada))
+        mantidos = cursor.rowcount
+        if not mantidos:
+            cursor.execute(f'''
+                INSERT INTO {tabela} (perfil_id, rodada_atual, clube_id, {coluna}, ultimas_partidas, temporada, obsoleto)
+                SELECT perfil_id, %s, clube_id, {coluna}, ultimas_partidas, temporada, TRUE
+                FROM {tabela}
+                WHERE perfil_id = %s AND temporada = %s
+                  AND rodada_atual = (
+                      SELECT MAX(rodada_atual) FROM {tabela}
+                      WHERE perfil_id = %s AND temporada = %s AND rodada_atual < %s
+                  )
+            ''', (rodada_atual, perfil_id, temporada, perfil_id, temporada, rodada_atual))
+            mantidos = cursor.rowcount
+        conn.commit()
+        return mantidos
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def remover_pesos_perfil(conn, tipo: str, perfil_id: int, rodada_atual: int, temporada: int) -> int:
+    """
+    Remove os pesos da rodada de um perfil que saiu do registro (a publicação deixa de incluí-lo)
+
+    Rodadas anteriores ficam intactas (histórico e avaliação).
+
+    Returns:
+        Número de clubes removidos
+    """
+    tabela, _ = TABELAS_PESOS[tipo]
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f'''
+            DELETE FROM {tabela}
+            WHERE perfil_id = %s AND rodada_atual = %s AND temporada = %s
+        ''', (perfil_id, rodada_atual, temporada))
+        removidos = cursor.rowcount
+        conn.commit()
+        return removidos
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def obter_ultima_rodada_publicada(cursor, temporada: int) -> Optional[int]:
+    """Retorna a rodada mais recente com pesos gravados na temporada (ou None)"""
+    cursor.execute('''
+        SELECT MAX(rodada_atual) FROM acp_peso_jogo_perfis WHERE temporada = %s
+    ''', (temporada,))
+    linha = cursor.fetchone()
+    return linha[0] if linha else None
+
+
+def calcular_hashes_perfis(pesos: Dict[int, Dict[int, float]], obsoletos=()) -> Dict[str, str]:
+    """
+    Hash do conteúdo de cada perfil ({perfil_id: hash}, chaves em texto para JSONB)
+
+    A marca de obsoleto entra no hash: um perfil que passa a (ou deixa de) ser obsoleto com os
+    mesmos pesos gera uma nova publicação, e o snapshot binário acompanha a marca.
+    """
+    obsoletos = set(obsoletos)
+    hashes = {}
+    for perfil_id, clubes in pesos.items():
+        conteudo = ';'.join(f"{clube_id}:{peso:.6f}" for clube_id, peso in sorted(clubes.items()))
+        if perfil_id in obsoletos:
+            conteudo += ';obsoleto'
+        hashes[str(perfil_id)] = hashlib.sha1(conteudo.encode('utf-8')).hexdigest()
+    return hashes
+
+
+def _perfis_alterados(hashes_atuais: Dict[str, str], hashes_anteriores: Optional[Dict[str, str]]) -> List[int]:
+    """Perfis cujo hash mudou (ou que não existiam na geração anterior)"""
+    anteriores = hashes_anteriores or {}
+    return sorted(int(p) for p, h in hashes_atuais.items() if anteriores.get(p) != h)
+
+
+def _registrar_geracao(cursor, temporada: int, rodada_atual: int,
+                       resultados: Dict[str, Dict[int, Dict[int, float]]]) -> Tuple[Optional[int], Dict]:
+    """
+    Registra uma nova geração se algo mudou e emite a notificação (sem commit)
+
+    O NOTIFY é transacional: só é entregue aos ouvintes no commit da publicação.
+
+    Returns:
+        (geracao, resumo) - geracao é None quando nada mudou desde a última publicação
+    """
+    hashes = {
+        'jogo': calcular_hashes_perfis(resultados['jogo'], resultados['obsoletos']['jogo']),
+        'sg': calcular_hashes_perfis(resultados['sg'], resultados['obsoletos']['sg']),
+    }
+
+    cursor.execute('''
+        SELECT temporada, rodada_atual, hashes_perfis
+        FROM acp_publicacoes
+        ORDER BY geracao DESC
+        LIMIT 1
+    ''')
+    anterior = cursor.fetchone()
+    nova_rodada = anterior is None or (anterior[0], anterior[1]) != (temporada, rodada_atual)
+    hashes_anteriores = {} if nova_rodada else (anterior[2] or {})
+
+    resumo = {
+        'temporada': temporada,
+        'rodada': rodada_atual,
+        'nova_rodada': nova_rodada,
+        'perfis_jogo': _perfis_alterados(hashes['jogo'], hashes_anteriores.get('jogo')),
+        'perfis_sg': _perfis_alterados(hashes['sg'], hashes_anteriores.get('sg')),
+    }
+    if resultados['obsoletos']['jogo'] or resultados['obsoletos']['sg']:
+        resumo['obsoletos'] = resultados['obsoletos']
+    if not nova_rodada and not resumo['perfis_jogo'] and not resumo['perfis_sg']:
+        return None, resumo
+
+    cursor.execute('''
+        INSERT INTO acp_publicacoes (temporada, rodada_atual, hashes_perfis)
+        VALUES (%s, %s, %s)
+        RETURNING geracao
+    ''', (temporada, rodada_atual, json.dumps(hashes)))
+    resumo['geracao'] = cursor.fetchone()[0]
+
+    cursor.execute('SELECT pg_notify(%s, %s)', (CANAL_NOTIFICACAO, json.dumps(resumo)))
+    return resumo['geracao'], resumo
+
+
+def publicar_resultados(conn, rodada_atual: int, temporada: int, materializar: bool = True,
+                        contexto=None) -> bool:
+    """
+    Publica os resultados da rodada para os consumidores
+
+    Chamada ao final de cada ciclo (e na inicialização, para aquecer o cache da API).
+
+    Args:
+        conn: Conexão com banco
+        rodada_atual: Rodada publicada
+        temporada: Temporada publicada
+        materializar: Se False, apenas atualiza o cache em memória (aquecimento)
+        contexto: ContextoCiclo do ciclo (registra o tempo de cada artefato publicado)
+
+    Returns:
+        True se havia resultados para publicar
+    """
+    with _lock_publicacao:
+        return _publicar(conn, rodada_atual, temporada, materializar, contexto)
+
+
+def _publicar(conn, rodada_atual: int, temporada: int, materializar: bool, contexto) -> bool:
+    cursor = conn.cursor()
+    medir = contexto.medir if contexto is not None else (lambda etapa: nullcontext())
+
+    try:
+        resultados = carregar_resultados_rodada(cursor, rodada_atual, temporada)
+        if not resultados['jogo'] and not resultados['sg']:
+            logger.warning(f"Nenhum resultado para publicar na rodada {rodada_atual} da temporada {temporada}")
+            return False
+
+        if materializar:
+            geracao, resumo = _registrar_geracao(cursor, temporada, rodada_atual, resultados)
+            if geracao is None:
+                conn.commit()
+                logger.info(f"Resultados da rodada {rodada_atual} inalterados desde a última geração; nada a publicar")
+            else:
+                with medir('publicacao_matriz'):
+                    tamanho_matriz = gravar_matriz(cursor, temporada, rodada_atual, resultados['jogo'], resultados['sg'])
+                    conn.commit()
+                logger.info(f"Matriz de combinações da rodada {rodada_atual} gravada ({tamanho_matriz} bytes) - geração {geracao}")
+                logger.info(
+                    f"Notificação enviada em '{CANAL_NOTIFICACAO}': perfis de jogo alterados {resumo['perfis_jogo']}, "
+                    f"perfis de SG alterados {resumo['perfis_sg']}"
+                )
+
+                if SNAPSHOT_DIR:
+                    try:
+                        with medir('publicacao_snapshot'):
+                            caminho = gravar_snapshot(SNAPSHOT_DIR, geracao, temporada, rodada_atual,
+                                                      resultados['jogo'], resultados['sg'],
+                                                      resultados['obsoletos'])
+                        logger.info(f"Snapshot binário da geração {geracao} gravado em {caminho}")
+                    except OSError as e:
+                        logger.error(f"Erro ao gravar snapshot binário em {SNAPSHOT_DIR}: {e}")
+
+        with medir('publicacao_cache_leitura'):
+            cache_leitura.atualizar(temporada, rodada_atual, resultados['jogo'], resultados['sg'],
+                                    resultados['obsoletos'])
+
+        logger.info(
+            f"Resultados publicados: rodada {rodada_atual}/{temporada} - "
+            f"{len(resultados['jogo'])} perfis de jogo, {len(resultados['sg'])} perfis de SG"
+        )
+        if resultados['obsoletos']['jogo'] or resultados['obsoletos']['sg']:
+            logger.warning(
+                f"Perfis publicados com pesos anteriores (obsoletos): jogo {resultados['obsoletos']['jogo']}, "
+                f"SG {resultados['obsoletos']['sg']}"
+            )
+        return True
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erro ao publicar resultados da rodada {rodada_atual}: {e}", exc_info=True)
+        return False
+    finally:
+        cursor.close()
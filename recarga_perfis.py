@@ -0,0 +1,143 @@
+"""
+Recarga dos perfis sem restart: arquivo PERFIS_ARQUIVO verificado periodicamente
+
+A cada PERFIS_VERIFICACAO_SEGUNDOS o serve compara a data de modificação e o tamanho do arquivo com
+os da última leitura. Quando o arquivo muda, os perfis são validados (registro_perfis) - um arquivo
+inválido é registrado no log e os perfis atuais continuam valendo - e comparados com o registro
+atual:
+
+    novos       ids que não existiam no tipo
+    alterados   mesmo id com parâmetros diferentes (mudar só a descrição não recalcula)
+    removidos   ids que saíram do arquivo
+
+O novo registro passa a valer para os próximos ciclos de todas as famílias, e apenas os perfis
+novos e alterados são calculados imediatamente; os demais perfis mantêm os pesos da rodada.
+"""
+import logging
+import os
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from registro_perfis import (
+    TIPOS, RegistroPerfis, carregar_arquivo_perfis, definir_registro, registro_padrao
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _parametros(perfil: Dict) -> Dict:
+    """Chaves que afetam o cálculo (método explícito; sem a descrição)"""
+    parametros = {chave: valor for chave, valor in perfil.items() if chave != 'descricao'}
+    parametros.setdefault('metodo', 'janela')
+    return parametros
+
+
+class DiferencaPerfis(NamedTuple):
+    """Diferença entre dois registros: (tipo, perfil) novos e alterados, (tipo, id) removidos"""
+    novos: List[Tuple[str, Dict]]
+    alterados: List[Tuple[str, Dict]]
+    removidos: List[Tuple[str, int]]
+
+    @property
+    def vazia(self) -> bool:
+        return not (self.novos or self.alterados or self.removidos)
+
+    def a_calcular(self) -> Dict[str, set]:
+        """{tipo: ids dos perfis novos e alterados}"""
+        ids = {tipo: set() for tipo in TIPOS}
+        for tipo, perfil in self.novos + self.alterados:
+            ids[tipo].add(perfil['id'])
+        return ids
+
+    def descrever(self) -> str:
+        def listar(itens):
+            return ', '.join(f"{tipo} {perfil_id}" for tipo, perfil_id in itens) or '-'
+        return (f"novos: {listar((t, p['id']) for t, p in self.novos)}; "
+                f"alterados: {listar((t, p['id']) for t, p in self.alterados)}; "
+                f"removidos: {listar(self.removidos)}")
+
+
+def diferenca_registros(atual: RegistroPerfis, novo: RegistroPerfis) -> DiferencaPerfis:
+    """Perfis novos, alterados e removidos de atual para novo"""
+    novos, alterados, removidos = [], [], []
+    for tipo in TIPOS:
+        anteriores = {p['id']: p for p in atual.perfis(tipo)}
+        seguintes = {p['id']: p for p in novo.perfis(tipo)}
+        for perfil_id, perfil in seguintes.items():
+            if perfil_id not in anteriores:
+                novos.append((tipo, perfil))
+            elif _parametros(perfil) != _parametros(anteriores[perfil_id]):
+                alterados.append((tipo, perfil))
+        removidos.extend((tipo, perfil_id) for perfil_id in anteriores if perfil_id not in seguintes)
+    return DiferencaPerfis(novos, alterados, removidos)
+
+
+class MonitorPerfis:
+    """
+    Verifica o arquivo de perfis e troca o registro atual quando ele muda
+
+    Args:
+        caminho: Arquivo JSON de perfis (PERFIS_ARQUIVO)
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._assinatura = self._assinatura_atual()
+
+    def _assinatura_atual(self) -> Optional[Tuple[int, int]]:
+        try:
+            estado = os.stat(self.caminho)
+        except OSError:
+            return None
+        return (estado.st_mtime_ns, estado.st_size)
+
+    def verificar(self) -> Optional[Tuple[RegistroPerfis, DiferencaPerfis]]:
+        """
+        Recarrega o arquivo se ele mudou desde a última verificação
+
+        Returns:
+            (novo registro, diferença) se houve mudança que afeta o cálculo; None caso contrário
+            (arquivo igual, inválido, ausente ou só com descrições alteradas)
+        """
+        assinatura = self._assinatura_atual()
+        if assinatura == self._assinatura:
+            return None
+        self._assinatura = assinatura
+        if assinatura is None:
+            logger.warning(f"Arquivo de perfis {self.caminho} não encontrado; mantendo os perfis atuais")
+            return None
+
+        try:
+            novo = carregar_arquivo_perfis(self.caminho)
+        except (OSError, ValueError) as e:
+            logger.error(f"Arquivo de perfis {self.caminho} inválido; mantendo os perfis atuais: {e}")
+            return None
+
+        diferenca = diferenca_registros(registro_padrao(), novo)
+        definir_registro(novo)
+        if diferenca.vazia:
+            logger.info(f"Arquivo de perfis {self.caminho} recarregado sem mudanças no cálculo")
+            return None
+        logger.info(f"Perfis recarregados de {self.caminho} ({diferenca.descrever()})")
+        return novo, diferenca
+
+
+def atualizar_familias(familias: Dict[str, object], registro: RegistroPerfis) -> List[object]:
+    """
+    Aplica o registro às famílias em execução (por nome)
+
+    As famílias existentes recebem a nova lista de perfis (a próxima execução já a usa; famílias
+    sem perfis ficam vazias); famílias de métodos que passaram a ter perfis são criadas.
+
+    Returns:
+        Famílias novas (a agendar)
+    """
+    from familias_calculo import criar_familias
+
+    atualizadas = {familia.nome: familia for familia in criar_familias(registro)}
+    novas = []
+    for nome, familia in familias.items():
+        familia.perfis = atualizadas.pop(nome).perfis if nome in atualizadas else []
+    for nome, familia in atualizadas.items():
+        familias[nome] = familia
+        novas.append(familia)
+    return novas
@@ -0,0 +1,299 @@
+"""
+Registro declarativo dos perfis e plano de execução do ciclo
+
+Cada perfil de config.py declara o método ('metodo', 'janela' quando ausente) e os parâmetros; cada
+método declara a família que o calcula e os intermediários de que precisa:
+
+    setores     matriz clube × setor (peso do jogo)
+    provaveis   médias de defesa/ataque dos prováveis (peso do SG, com USAR_PROVAVEIS_CARTOLA)
+    agregados   agregados das últimas N partidas (janelas)
+    forma       forma EWMA (meias-vidas)
+    elo         replay ELO em lote (configurações)
+    ajustados   agregados ponderados pela tabela de classificação (janelas)
+    poisson     modelo de Poisson (Dixon-Coles) ajustado à temporada (meias-vidas)
+
+O planejador junta os perfis de todos os métodos e calcula cada intermediário uma única vez, com a
+união dos parâmetros (todas as janelas em um agregado, todas as configurações em um replay); as
+famílias só combinam os intermediários. Um perfil novo de um método existente custa a combinação
+dos agregados da rodada, mais uma janela ou configuração se ainda não houver.
+
+    registro = RegistroPerfis(PERFIS_PESO_JOGO, PERFIS_PESO_SG)   # valida
+    plano = PlanoExecucao(registro)                                 # intermediários do ciclo
+
+Com PERFIS_ARQUIVO, os perfis vêm de um arquivo JSON ({"jogo": [...], "sg": [...]}, mesmas chaves de
+config.py) em vez dos literais de config.py; o registro atual do processo (registro_padrao) pode ser
+trocado em tempo de execução pela recarga do arquivo (recarga_perfis.py).
+"""
+import json
+import logging
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TIPOS = ('jogo', 'sg')
+INTERMEDIARIOS = ('setores', 'provaveis', 'agregados', 'forma', 'elo', 'ajustados', 'poisson')
+AGRESSIVIDADES = ('brando', 'agressivo')
+# Chaves de todos os perfis
+CHAVES_BASE = ('id', 'ultimas_partidas', 'descricao', 'metodo')
+
+
+class MetodoPerfil(NamedTuple):
+    """
+    Método de cálculo de um tipo de peso
+
+    Attributes:
+        tipo: 'jogo' ou 'sg'
+        metodo: Valor da chave 'metodo' dos perfis
+        familia: Nome da família que calcula os perfis (FAMILIAS_CADENCIA / FAMILIAS_PRAZO)
+        titulo: Texto exibido no log
+        intermediarios: Intermediários do ciclo usados pelo método
+        parametros: Chaves opcionais aceitas nos perfis (além de CHAVES_BASE)
+        perfis_ranking: Perfis cujo ranking é exibido no log
+    """
+    tipo: str
+    metodo: str
+    familia: str
+    titulo: str
+    intermediarios: Tuple[str, ...]
+    parametros: Tuple[str, ...]
+    perfis_ranking: Tuple[int, ...] = ()
+
+
+# Na ordem de execução do ciclo completo
+METODOS = (
+    MetodoPerfil('jogo', 'janela', 'jogo', 'PESO DO JOGO - PERFIS NORMAIS',
+                 ('setores', 'agregados'), ('expoente',), (1, 5, 6, 10)),
+    MetodoPerfil('jogo', 'rating', 'rating', 'PESO DO JOGO - PERFIS RATING',
+                 ('setores', 'elo'), ('expoente', 'k_factor', 'divisor_elo', 'vantagem_casa', 'modo_rating'), (11, 15)),
+    MetodoPerfil('sg', 'janela', 'sg', 'PESO DO SG',
+                 ('provaveis', 'agregados'), ('agressividade',), (1, 5, 6, 10)),
+    MetodoPerfil('jogo', 'ewma', 'forma_jogo', 'PESO DO JOGO - FORMA EWMA',
+                 ('setores', 'forma'), ('expoente',), (21, 25)),
+    MetodoPerfil('sg', 'ewma', 'forma_sg', 'PESO DO SG - FORMA EWMA',
+                 ('provaveis', 'forma'), ('agressividade',), (21, 25)),
+    MetodoPerfil('jogo', 'ajustado', 'ajustado_jogo', 'PESO DO JOGO - AJUSTADO PELA TABELA',
+                 ('setores', 'ajustados'), ('expoente',), (16, 20)),
+    MetodoPerfil('sg', 'ajustado', 'ajustado_sg', 'PESO DO SG - AJUSTADO PELA TABELA',
+                 ('provaveis', 'ajustados'), ('agressividade',), (11, 15, 16, 20)),
+    # ultimas_partidas = meia-vida (rodadas) da ponderação temporal do ajuste
+    MetodoPerfil('sg', 'poisson', 'poisson_sg', 'PESO DO SG - POISSON (DIXON-COLES)',
+                 ('poisson',), (), (26, 30)),
+)
+
+
+def metodo_do_perfil(tipo: str, perfil: Dict) -> MetodoPerfil:
+    """Método declarado pelo perfil ('janela' se ausente)"""
+    nome = perfil.get('metodo', 'janela')
+    for metodo in METODOS:
+        if metodo.tipo == tipo and metodo.metodo == nome:
+            return metodo
+    validos = ', '.join(m.metodo for m in METODOS if m.tipo == tipo)
+    raise ValueError(f"Perfil {perfil.get('id')} de {tipo}: metodo inválido {nome!r} (use {validos})")
+
+
+def validar_perfil(tipo: str, perfil: Dict) -> MetodoPerfil:
+    """
+    Valida as chaves e os parâmetros de um perfil
+
+    Returns:
+        Método do perfil
+
+    Raises:
+        ValueError: perfil inválido (mensagem com o id e a chave)
+    """
+    from motor_elo import MODOS_RATING
+
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo de perfil inválido: {tipo!r} (use {', '.join(TIPOS)})")
+    perfil_id = perfil.get('id')
+    if not isinstance(perfil_id, int) or isinstance(perfil_id, bool) or perfil_id < 1:
+        raise ValueError(f"Perfil de {tipo} com id inválido: {perfil_id!r}")
+    metodo = metodo_do_perfil(tipo, perfil)
+
+    desconhecidas = set(perfil) - set(CHAVES_BASE) - set(metodo.parametros)
+    if desconhecidas:
+        raise ValueError(f"Perfil {perfil_id} de {tipo} ({metodo.metodo}): chaves desconhecidas {sorted(desconhecidas)}")
+    ultimas_partidas = perfil.get('ultimas_partidas')
+    if not isinstance(ultimas_partidas, int) or isinstance(ultimas_partidas, bool) or ultimas_partidas < 1:
+        raise ValueError(f"Perfil {perfil_id} de {tipo}: ultimas_partidas deve ser inteiro positivo")
+    if not isinstance(perfil.get('descricao'), str):
+        raise ValueError(f"Perfil {perfil_id} de {tipo}: descricao obrigatória")
+
+    for chave in ('expoente', 'k_factor', 'divisor_elo', 'vantagem_casa'):
+        if chave in perfil and not isinstance(perfil[chave], (int, float)):
+            raise ValueError(f"Perfil {perfil_id} de {tipo}: {chave} deve ser numérico")
+    if 'expoente' in perfil and not 0 < perfil['expoente'] <= 1:
+        raise ValueError(f"Perfil {perfil_id} de {tipo}: expoente deve estar em (0, 1]")
+    for chave in ('k_factor', 'divisor_elo'):
+        if chave in perfil and perfil[chave] <= 0:
+            raise ValueError(f"Perfil {perfil_id} de {tipo}: {chave} deve ser positivo")
+    if perfil.get('agressividade', 'brando') not in AGRESSIVIDADES:
+        raise ValueError(f"Perfil {perfil_id} de {tipo}: agressividade deve ser {' ou '.join(AGRESSIVIDADES)}")
+    if perfil.get('modo_rating', 'geral') not in MODOS_RATING:
+        raise ValueError(f"Perfil {perfil_id} de {tipo}: modo_rating deve ser {' ou '.join(MODOS_RATING)}")
+    return metodo
+
+
+class RegistroPerfis:
+    """
+    Perfis de jogo e de SG validados e agrupados por método
+
+    Raises:
+        ValueError: perfil inválido ou id repetido dentro de um tipo
+    """
+
+    def __init__(self, perfis_jogo: Iterable[Dict], perfis_sg: Iterable[Dict]):
+        self._grupos: Dict[MetodoPerfil, List[Dict]] = {metodo: [] for metodo in METODOS}
+        self._perfis: Dict[str, List[Dict]] = {}
+        for tipo, perfis in (('jogo', perfis_jogo), ('sg', perfis_sg)):
+            perfis = list(perfis)
+            ids = set()
+            for perfil in perfis:
+                metodo = validar_perfil(tipo, perfil)
+                if perfil['id'] in ids:
+                    raise ValueError(f"Perfil {perfil['id']} de {tipo} repetido")
+                ids.add(perfil['id'])
+                self._grupos[metodo].append(perfil)
+            self._perfis[tipo] = perfis
+
+    def perfis(self, tipo: str, metodo: Optional[str] = None) -> List[Dict]:
+        """Perfis do tipo (na ordem de config.py), opcionalmente de um método"""
+        if metodo is None:
+            return list(self._perfis[tipo])
+        return [p for p in self._perfis[tipo] if p.get('metodo', 'janela') == metodo]
+
+    def grupos(self) -> List[Tuple[MetodoPerfil, List[Dict]]]:
+        """(método, perfis) dos métodos com perfis, na ordem de METODOS"""
+        return [(metodo, perfis) for metodo, perfis in self._grupos.items() if perfis]
+
+
+class PlanoExecucao:
+    """
+    Intermediários do ciclo e seus parâmetros, derivados dos perfis registrados
+
+    Attributes:
+        intermediarios: Intermediários usados por algum perfil
+        janelas: Janelas dos agregados das últimas partidas
+        meias_vidas: Meias-vidas da forma EWMA
+        janelas_ajustadas: Janelas dos agregados ajustados pela tabela
+        meias_vidas_poisson: Meias-vidas dos modelos de Poisson
+        configuracoes_elo: Configurações do replay ELO (sem repetição)
+    """
+
+    def __init__(self, registro: RegistroPerfis, usar_provaveis_cartola: bool = False):
+        from agregados_janela import JANELA_APROVEITAMENTO_SG
+        from calculo_rating import configuracao_elo
+
+        self.registro = registro
+        self.intermediarios = set()
+        self.janelas = set()
+        self.meias_vidas = set()
+        self.janelas_ajustadas = set()
+        self.meias_vidas_poisson = set()
+        self.configuracoes_elo = []
+
+        parametros = {'agregados': self.janelas, 'forma': self.meias_vidas, 'ajustados': self.janelas_ajustadas,
+                      'poisson': self.meias_vidas_poisson}
+        for metodo, perfis in registro.grupos():
+            self.intermediarios.update(metodo.intermediarios)
+            for intermediario in metodo.intermediarios:
+                destino = parametros.get(intermediario)
+                if destino is None:
+                    continue
+                destino.update(p['ultimas_partidas'] for p in perfis)
+                # O peso do SG usa também o aproveitamento recente (janela ou meia-vida fixa)
+                if metodo.tipo == 'sg' and intermediario != 'poisson':
+                    destino.add(JANELA_APROVEITAMENTO_SG)
+            if 'elo' in metodo.intermediarios:
+                self.configuracoes_elo.extend(configuracao_elo(p) for p in perfis)
+        self.configuracoes_elo = list(dict.fromkeys(self.configuracoes_elo))
+        if not usar_provaveis_cartola:
+            self.intermediarios.discard('provaveis')
+
+    def precisa(self, intermediario: str) -> bool:
+        return intermediario in self.intermediarios
+
+    def descrever(self) -> str:
+        """Resumo do plano para o log"""
+        partes = []
+        for intermediario in INTERMEDIARIOS:
+            if not self.precisa(intermediario):
+                continue
+            detalhe = {
+                'agregados': f"janelas {sorted(self.janelas)}",
+                'forma': f"meias-vidas {sorted(self.meias_vidas)}",
+                'ajustados': f"janelas {sorted(self.janelas_ajustadas)}",
+                'poisson': f"meias-vidas {sorted(self.meias_vidas_poisson)}",
+                'elo': f"{len(self.configuracoes_elo)} configurações",
+            }.get(intermediario)
+            partes.append(f"{intermediario} ({detalhe})" if detalhe else intermediario)
+        perfis = sum(len(p) for _, p in self.registro.grupos())
+        return f"{perfis} perfis em {len(self.registro.grupos())} famílias; intermediários: {', '.join(partes)}"
+
+
+def carregar_arquivo_perfis(caminho: str) -> RegistroPerfis:
+    """
+    Registro dos perfis de um arquivo JSON {"jogo": [...], "sg": [...]}
+
+    Raises:
+        OSError: arquivo inacessível
+        ValueError: JSON, estrutura ou perfil inválido
+    """
+    with open(caminho, encoding='utf-8') as arquivo:
+        try:
+            conteudo = json.load(arquivo)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"JSON inválido: {e}")
+    if not isinstance(conteudo, dict):
+        raise ValueError('o arquivo deve conter um objeto {"jogo": [...], "sg": [...]}')
+    for tipo in TIPOS:
+        # Obrigatórios: um tipo ausente por engano não pode remover todos os perfis do tipo
+        if not isinstance(conteudo.get(tipo), list):
+            raise ValueError(f"lista de perfis '{tipo}' ausente")
+        if not all(isinstance(perfil, dict) for perfil in conteudo[tipo]):
+            raise ValueError(f"perfis de '{tipo}' devem ser objetos")
+    return RegistroPerfis(conteudo['jogo'], conteudo['sg'])
+
+
+def exportar_perfis(registro: RegistroPerfis) -> str:
+    """JSON dos perfis do registro (formato de PERFIS_ARQUIVO)"""
+    return json.dumps({tipo: registro.perfis(tipo) for tipo in TIPOS}, ensure_ascii=False, indent=2)
+
+
+_lock_registro = threading.Lock()
+_registro_atual: Optional[RegistroPerfis] = None
+
+
+def _carregar_registro_inicial() -> RegistroPerfis:
+    from config import PERFIS_ARQUIVO, PERFIS_PESO_JOGO, PERFIS_PESO_SG
+    if PERFIS_ARQUIVO:
+        try:
+            registro = carregar_arquivo_perfis(PERFIS_ARQUIVO)
+            logger.info(f"Perfis carregados de {PERFIS_ARQUIVO}")
+            return registro
+        except (OSError, ValueError) as e:
+            logger.error(f"Perfis de {PERFIS_ARQUIVO} indisponíveis ({e}); usando os perfis de config.py")
+    return RegistroPerfis(PERFIS_PESO_JOGO, PERFIS_PESO_SG)
+
+
+def registro_padrao() -> RegistroPerfis:
+    """Registro atual do processo (PERFIS_ARQUIVO ou perfis de config.py na primeira chamada)"""
+    global _registro_atual
+    with _lock_registro:
+        if _registro_atual is None:
+            _registro_atual = _carregar_registro_inicial()
+        return _registro_atual
+
+
+def definir_registro(registro: RegistroPerfis):
+    """Troca o registro atual (próximos planos e famílias usam os novos perfis)"""
+    global _registro_atual
+    with _lock_registro:
+        _registro_atual = registro
+
+
+def plano_padrao() -> PlanoExecucao:
+    """Plano de execução do registro atual"""
+    from config import USAR_PROVAVEIS_CARTOLA
+    return PlanoExecucao(registro_padrao(), USAR_PROVAVEIS_CARTOLA)
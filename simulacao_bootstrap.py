@@ -0,0 +1,273 @@
+"""
+Simulação bootstrap: faixas de incerteza dos pesos da rodada
+
+Com janelas de 2 ou 4 partidas, um peso do jogo ou do SG depende de poucos resultados. A simulação
+reamostra, com reposição, as últimas N partidas de cada clube com o mando da rodada (N = janela do
+perfil) e recalcula o peso em cada amostra; a média e os percentis por clube mostram quanto o peso
+oscilaria com outro sorteio do mesmo histórico.
+
+Nenhuma amostra passa pelos calculadores partida a partida: as contagens de cada reamostragem vêm
+de uma multinomial (amostras × partidas do clube), os agregados são o produto dessas contagens
+pelos componentes das partidas (vitória, empate, derrota, gols pró/contra, clean sheet) e as
+fórmulas dos calculadores (calculo_peso_jogo.peso_jogo_confronto e
+calculo_peso_sg.peso_sg_confronto) são avaliadas uma vez por confronto sobre os arrays de amostras.
+O peso do SG é normalizado em cada amostra, como no ciclo. 10.000 amostras de todos os perfis por
+janela levam menos de um segundo.
+
+Cada (clube, mando, janela) tem o próprio gerador, semeado por SIMULACAO_SEMENTE e pela chave:
+o resultado é reprodutível e não depende de quais perfis são simulados nem da ordem. Perfis de
+jogo e de SG com a mesma janela usam as mesmas reamostragens; o aproveitamento recente do SG
+(JANELA_APROVEITAMENTO_SG) é reamostrado à parte.
+
+Apenas os perfis por janela são simulados: EWMA, rating, ajustados e Poisson não são agregados de
+partidas equiprováveis.
+"""
+import json
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from agregados_janela import JANELA_APROVEITAMENTO_SG, MANDOS, AgregadoJanela
+from modelo_dados import TabelaPartidas
+
+logger = logging.getLogger(__name__)
+
+METODOS_SIMULACAO = {'jogo': ('janela',), 'sg': ('janela',)}
+PERCENTIS = (5, 25, 50, 75, 95)
+
+
+class SimuladorBootstrap:
+    """
+    Distribuição bootstrap dos pesos da rodada atual, sobre os insumos do ciclo
+
+    Args:
+        partidas: Tabela de partidas da temporada do ciclo
+        rodada_atual: Rodada dos pesos (histórico até rodada_atual - 1)
+        matriz_setores: Matriz clube × setor do ciclo
+        agregados_provaveis: Médias dos prováveis para o fator de jogadores do SG
+        usar_provaveis_cartola: Se o fator de jogadores do SG usa os prováveis
+        amostras: Número de reamostragens
+        semente: Semente dos geradores
+
+    Raises:
+        ValueError: rodada sem partidas ou número de amostras inválido
+    """
+
+    def __init__(self, partidas: TabelaPartidas, rodada_atual: int, matriz_setores, agregados_provaveis=None,
+                 usar_provaveis_cartola: bool = False, amostras: int = 10000, semente: int = 42):
+        if amostras < 1:
+            raise ValueError('O número de amostras deve ser positivo')
+        self.partidas = partidas
+        self.rodada_atual = rodada_atual
+        self.matriz_setores = matriz_setores
+        self.agregados_provaveis = agregados_provaveis
+        self.usar_provaveis_cartola = usar_provaveis_cartola
+        self.amostras = amostras
+        self.semente = semente
+
+        self.confrontos = partidas.confrontos(rodada_atual)
+        if not self.confrontos:
+            raise ValueError(f"Rodada {rodada_atual} sem partidas válidas")
+        # Colunas dos pesos: casa e visitante de cada confronto (ordem dos calculadores)
+        self.clube_ids = [clube for _, casa_id, _, visitante_id, _ in self.confrontos for clube in (casa_id, visitante_id)]
+        self._reamostras: Dict[Tuple[int, str, int], Tuple[AgregadoJanela, AgregadoJanela]] = {}
+
+    def _componentes(self, clube_id: int, mando: str, janela: int) -> np.ndarray:
+        """Partidas da janela do clube × (vitória, empate, derrota, gols pró, gols contra, clean sheet)"""
+        clube = self.partidas.clubes.get(clube_id)
+        if clube < 0:
+            return np.zeros((0, 6), dtype=np.int64)
+        posicoes = self.partidas.ultimas_do_clube(clube, mando, self.rodada_atual - 1, janela)
+        pro, contra = self.partidas.gols_do_ponto_de_vista(posicoes, mando)
+        pro, contra = pro.astype(np.int64), contra.astype(np.int64)
+        return np.column_stack([pro > contra, pro == contra, pro < contra, pro, contra, contra == 0]).astype(np.int64)
+
+    def agregados(self, clube_id: int, mando: str, janela: int) -> Tuple[AgregadoJanela, AgregadoJanela]:
+        """
+        Agregados observados e reamostrados do clube
+
+        Returns:
+            (agregado da janela, agregado com um array de amostras em cada campo exceto jogos)
+        """
+        chave = (clube_id, mando, janela)
+        if chave not in self._reamostras:
+            componentes = self._componentes(clube_id, mando, janela)
+            jogos = len(componentes)
+            if jogos == 0:
+                vazio = AgregadoJanela()
+                self._reamostras[chave] = (vazio, vazio)
+            else:
+                gerador = np.random.default_rng([self.semente, janela, clube_id, MANDOS.index(mando)])
+                # Reamostragem com reposição: quantas vezes cada partida é sorteada em cada amostra
+                contagens = gerador.multinomial(jogos, np.full(jogos, 1 / jogos), size=self.amostras)
+                valores = contagens @ componentes
+                self._reamostras[chave] = (
+                    AgregadoJanela(jogos, *(int(v) for v in componentes.sum(axis=0))),
+                    AgregadoJanela(jogos, *valores.T),
+                )
+        return self._reamostras[chave]
+
+    def avaliar(self, tipo: str, perfil: Dict) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Pesos do perfil com o histórico observado e em cada amostra
+
+        Args:
+            tipo: 'jogo' ou 'sg'
+            perfil: Perfil do registro (método janela)
+
+        Returns:
+            (array clubes com os pesos do ciclo, array amostras × clubes), colunas em self.clube_ids
+        """
+        from registro_perfis import metodo_do_perfil
+        from motor_setores import calcular_fator_jogadores
+
+        metodo = metodo_do_perfil(tipo, perfil).metodo
+        if metodo not in METODOS_SIMULACAO[tipo]:
+            raise ValueError(f"Método {metodo} ({tipo}) não é simulado (use {', '.join(METODOS_SIMULACAO[tipo])})")
+        janela = perfil['ultimas_partidas']
+
+        observado = np.empty(len(self.clube_ids))
+        pesos = np.empty((self.amostras, len(self.clube_ids)))
+        for p, (_, casa_id, _, visitante_id, _) in enumerate(self.confrontos):
+            casa, casa_amostras = self.agregados(casa_id, 'casa', janela)
+            visitante, visitante_amostras = self.agregados(visitante_id, 'fora', janela)
+            if tipo == 'jogo':
+                from calculo_peso_jogo import peso_jogo_confronto
+                razoes = self.matriz_setores.razoes(casa_id, visitante_id)
+                expoente = perfil.get('expoente', 1/4)
+                peso = peso_jogo_confronto(casa, visitante, razoes, expoente)
+                peso_amostras = peso_jogo_confronto(casa_amostras, visitante_amostras, razoes, expoente)
+                observado[2 * p], observado[2 * p + 1] = peso, -peso
+                pesos[:, 2 * p], pesos[:, 2 * p + 1] = peso_amostras, -peso_amostras
+                continue
+
+            from calculo_peso_sg import peso_sg_confronto
+            recente_casa, recente_casa_amostras = self.agregados(casa_id, 'casa', JANELA_APROVEITAMENTO_SG)
+            recente_visitante, recente_visitante_amostras = self.agregados(visitante_id, 'fora', JANELA_APROVEITAMENTO_SG)
+            fatores_jogadores = (0.5, 0.5)
+            if self.usar_provaveis_cartola:
+                fatores_jogadores = (
+                    calcular_fator_jogadores(self.agregados_provaveis, casa_id, visitante_id),
+                    calcular_fator_jogadores(self.agregados_provaveis, visitante_id, casa_id),
+                )
+            agressividade = perfil.get('agressividade', 'brando')
+            observado[2 * p:2 * p + 2] = peso_sg_confronto(
+                casa, visitante, recente_casa.aproveitamento, recente_visitante.aproveitamento,
+                *fatores_jogadores, agressividade
+            )
+            pesos[:, 2 * p], pesos[:, 2 * p + 1] = peso_sg_confronto(
+                casa_amostras, visitante_amostras, recente_casa_amostras.aproveitamento,
+                recente_visitante_amostras.aproveitamento, *fatores_jogadores, agressividade
+            )
+
+        if tipo == 'sg':
+            from calculo_peso_sg import normalizar_pesos_sg
+            observado, pesos = normalizar_pesos_sg(observado), normalizar_pesos_sg(pesos)
+        return observado, pesos
+
+    def bandas(self, tipo: str, perfil: Dict) -> Dict:
+        """
+        Média, desvio e percentis (PERCENTIS) do peso de cada clube sobre as amostras
+
+        Returns:
+            {'tipo', 'perfil_id', 'rodada_atual', 'amostras', 'semente', 'clubes': [{'clube_id',
+            'jogos', 'peso', 'media', 'desvio', 'percentis': {'p5', ...}}]} com 'peso' = peso do ciclo
+            e 'jogos' = partidas na janela do clube
+        """
+        observado, pesos = self.avaliar(tipo, perfil)
+        percentis = np.percentile(pesos, PERCENTIS, axis=0)
+        medias, desvios = pesos.mean(axis=0), pesos.std(axis=0)
+
+        clubes = []
+        for k, clube_id in enumerate(self.clube_ids):
+            mando = MANDOS[k % 2]
+            clubes.append({
+                'clube_id': clube_id,
+                'jogos': self.agregados(clube_id, mando, perfil['ultimas_partidas'])[0].jogos,
+                'peso': float(observado[k]),
+                'media': float(medias[k]),
+                'desvio': float(desvios[k]),
+                'percentis': {f"p{p}": float(percentis[i, k]) for i, p in enumerate(PERCENTIS)},
+            })
+        return {
+            'tipo': tipo,
+            'perfil_id': perfil['id'],
+            'rodada_atual': self.rodada_atual,
+            'amostras': self.amostras,
+            'semente': self.semente,
+            'clubes': clubes,
+        }
+
+
+def criar_simulador(contexto, insumos) -> SimuladorBootstrap:
+    """Simulador sobre os insumos do ciclo (rodada atual do contexto, SIMULACAO_AMOSTRAS e SIMULACAO_SEMENTE)"""
+    from config import SIMULACAO_AMOSTRAS, SIMULACAO_SEMENTE, USAR_PROVAVEIS_CARTOLA
+    return SimuladorBootstrap(
+        insumos.partidas, contexto.rodada_atual, insumos.matriz_setores, insumos.agregados_provaveis,
+        USAR_PROVAVEIS_CARTOLA, SIMULACAO_AMOSTRAS, SIMULACAO_SEMENTE
+    )
+
+
+def perfis_simulaveis(registro) -> List[Tuple[str, Dict]]:
+    """(tipo, perfil) dos perfis do registro com método simulado"""
+    from registro_perfis import TIPOS, metodo_do_perfil
+    return [
+        (tipo, perfil)
+        for tipo in TIPOS
+        for perfil in registro.perfis(tipo)
+        if metodo_do_perfil(tipo, perfil).metodo in METODOS_SIMULACAO[tipo]
+    ]
+
+
+class CalculadorSimulacao:
+    """Bandas dos perfis registrados sobre os insumos do último ciclo (API de leitura)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versao: Optional[str] = None
+        self._simulador: Optional[SimuladorBootstrap] = None
+        self._respostas: Dict[Tuple[str, tuple], object] = {}
+
+    def obter(self, tipo: str, perfil_id: int):
+        """
+        Resposta pré-serializada com as bandas do perfil
+
+        Returns:
+            RespostaPreparada, ou None sem insumos do ciclo
+
+        Raises:
+            KeyError: perfil não registrado
+            ValueError: método do perfil fora da simulação ou rodada sem partidas
+        """
+        from api_leitura import RespostaPreparada
+        from calculo_sob_demanda import calculador_sob_demanda
+        from registro_perfis import registro_padrao
+
+        perfil = next((p for p in registro_padrao().perfis(tipo) if p['id'] == perfil_id), None)
+        if perfil is None:
+            raise KeyError(f"Perfil {perfil_id} ({tipo}) não registrado")
+        dados = calculador_sob_demanda.dados
+        if dados is None:
+            return None
+        contexto, insumos, versao = dados
+
+        with self._lock:
+            if versao != self._versao:
+                self._simulador = criar_simulador(contexto, insumos)
+                self._versao = versao
+                self._respostas = {}
+            # Perfil inteiro na chave: um perfil alterado na recarga não reaproveita a resposta antiga
+            chave = (tipo, tuple(sorted(perfil.items())))
+            if chave not in self._respostas:
+                bandas = self._simulador.bandas(tipo, perfil)
+                bandas.update({'temporada': contexto.temporada, 'versao': versao})
+                self._respostas[chave] = RespostaPreparada(
+                    json.dumps(bandas, separators=(',', ':')).encode('utf-8')
+                )
+            return self._respostas[chave]
+
+
+# Calculador único do processo (insumos do calculador sob demanda)
+calculador_simulacao = CalculadorSimulacao()
@@ -0,0 +1,256 @@
+"""
+Snapshot binário (mapeável em memória) dos resultados publicados em cada ciclo
+
+Cada publicação grava um arquivo versionado em um volume compartilhado, substituído de forma
+atômica (arquivo temporário + os.replace). Consumidores abrem o arquivo com mmap e leem os
+arrays float32 sem cópia, recarregando apenas quando o número de geração muda.
+
+Layout (little-endian), versão de formato 2:
+
+    Cabeçalho (64 bytes)
+        magic           4s      b'ACPS'
+        versao_formato  uint16  2
+        reservado       uint16  0
+        geracao         uint64  versão da publicação (monotônica)
+        temporada       int32
+        rodada          int32
+        n_clubes        uint32  (C)
+        n_perfis_jogo   uint32  (J)
+        n_perfis_sg     uint32  (S)
+        offset_clubes   uint32
+        offset_perfis   uint32
+        offset_dados    uint32
+        criado_em       float64 epoch em segundos
+        offset_obsoletos uint32
+        reservado       4 bytes
+    Tabela de clubes        int32[C]   clube_id em ordem crescente (índice denso = posição)
+    Tabela de perfis        int32[J] perfis de jogo, seguidos de int32[S] perfis de SG
+    Dados                   float32[J][C] peso_jogo, seguidos de float32[S][C] peso_sg; NaN = sem valor
+    Obsoletos               uint8[J] e uint8[S] na ordem da tabela de perfis; 1 = perfil com os pesos
+                            da publicação anterior (estourou o orçamento ou falhou)
+
+A versão 1 (sem a seção de obsoletos; offset_obsoletos era reservado) continua legível, com
+obsoletos = None: a marca é desconhecida, e quem precisa dela deve consultar o banco.
+"""
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'ACPS'
+VERSAO_FORMATO = 2
+VERSOES_LEGIVEIS = (1, 2)
+NOME_ARQUIVO = 'pesos_snapshot.bin'
+_CABECALHO = struct.Struct('<4sHHQiiIIIIIIdI4x')
+
+
+def caminho_snapshot(diretorio: str) -> str:
+    """Caminho do snapshot corrente dentro do diretório compartilhado"""
+    return os.path.join(diretorio, NOME_ARQUIVO)
+
+
+def gravar_snapshot(diretorio: str, geracao: int, temporada: int, rodada: int,
+                    pesos_jogo: Dict[int, Dict[int, float]],
+                    pesos_sg: Dict[int, Dict[int, float]],
+                    obsoletos: Optional[Dict[str, List[int]]] = None) -> str:
+    """
+    Grava o snapshot da publicação com substituição atômica
+
+    Args:
+        diretorio: Diretório do volume compartilhado
+        geracao: Número da geração publicada
+        temporada: Temporada
+        rodada: Rodada
+        pesos_jogo: {perfil_id: {clube_id: peso_jogo}}
+        pesos_sg: {perfil_id: {clube_id: peso_sg}}
+        obsoletos: {'jogo': [perfil_id], 'sg': [perfil_id]} - perfis com pesos da publicação anterior
+
+    Returns:
+        Caminho do arquivo gravado
+    """
+    clubes = sorted(set().union(*pesos_jogo.values(), *pesos_sg.values()))
+    perfis_jogo = sorted(pesos_jogo)
+    perfis_sg = sorted(pesos_sg)
+    n_clubes = len(clubes)
+
+    nan = float('nan')
+    valores = []
+    for perfil_id in perfis_jogo:
+        valores.extend(pesos_jogo[perfil_id].get(c, nan) for c in clubes)
+    for perfil_id in perfis_sg:
+        valores.extend(pesos_sg[perfil_id].get(c, nan) for c in clubes)
+
+    offset_clubes = _CABECALHO.size
+    offset_perfis = offset_clubes + 4 * n_clubes
+    offset_dados = offset_perfis + 4 * (len(perfis_jogo) + len(perfis_sg))
+    offset_obsoletos = offset_dados + 4 * len(valores)
+    obsoletos_jogo = set((obsoletos or {}).get('jogo', ()))
+    obsoletos_sg = set((obsoletos or {}).get('sg', ()))
+    flags = [perfil_id in obsoletos_jogo for perfil_id in perfis_jogo] + [perfil_id in obsoletos_sg for perfil_id in perfis_sg]
+
+    conteudo = b''.join([
+        _CABECALHO.pack(
+            MAGIC, VERSAO_FORMATO, 0, geracao, temporada, rodada,
+            n_clubes, len(perfis_jogo), len(perfis_sg),
+            offset_clubes, offset_perfis, offset_dados, time.time(), offset_obsoletos
+        ),
+        struct.pack(f'<{n_clubes}i', *clubes),
+        struct.pack(f'<{len(perfis_jogo) + len(perfis_sg)}i', *perfis_jogo, *perfis_sg),
+        struct.pack(f'<{len(valores)}f', *valores),
+        bytes(flags),
+    ])
+
+    os.makedirs(diretorio, exist_ok=True)
+    destino = caminho_snapshot(diretorio)
+
+    # Temporário no mesmo diretório para que os.replace seja atômico
+    fd, temporario = tempfile.mkstemp(prefix='.pesos_', suffix='.tmp', dir=diretorio)
+    try:
+        with os.fdopen(fd, 'wb') as arquivo:
+            arquivo.write(conteudo)
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+        os.chmod(temporario, 0o644)
+        os.replace(temporario, destino)
+    except Exception:
+        if os.path.exists(temporario):
+            os.unlink(temporario)
+        raise
+
+    return destino
+
+
+def ler_geracao(caminho: str) -> Optional[int]:
+    """Lê apenas o número de geração do snapshot em disco (None se ausente/inválido)"""
+    try:
+        with open(caminho, 'rb') as arquivo:
+            dados = arquivo.read(_CABECALHO.size)
+    except OSError:
+        return None
+    if len(dados) < _CABECALHO.size or dados[:4] != MAGIC:
+        return None
+    return _CABECALHO.unpack(dados)[3]
+
+
+class SnapshotPesos:
+    """
+    Leitor do snapshot via mmap (sem cópia dos arrays de pesos)
+
+    Os métodos pesos_jogo/pesos_sg retornam memoryviews float32 indexadas pelo índice denso
+    do clube (veja indice_clube). Use recarregar_se_mudou() periodicamente para acompanhar
+    novas gerações publicadas.
+    """
+
+    def __init__(self, caminho: str):
+        if sys.byteorder != 'little':
+            raise RuntimeError("SnapshotPesos requer plataforma little-endian")
+        self.caminho = caminho
+        self._mapa = None
+        self._visao = None
+        self._carregar()
+
+    def _carregar(self):
+        with open(self.caminho, 'rb') as arquivo:
+            mapa = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+            stat = os.fstat(arquivo.fileno())
+
+        visao = memoryview(mapa)
+        try:
+            if len(mapa) < _CABECALHO.size:
+                raise ValueError(f"{self.caminho} não é um snapshot de pesos (arquivo truncado)")
+            (magic, versao, _, geracao, temporada, rodada, n_clubes, n_jogo, n_sg,
+             offset_clubes, offset_perfis, offset_dados, criado_em, offset_obsoletos) = _CABECALHO.unpack_from(visao, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{self.caminho} não é um snapshot de pesos (magic inválido)")
+            if versao not in VERSOES_LEGIVEIS:
+                raise ValueError(f"Versão de formato não suportada: {versao}")
+        except Exception:
+            # Arquivo rejeitado: fechar o mapeamento aqui (o anterior, se houver, continua valendo)
+            visao.release()
+            mapa.close()
+            raise
+
+        self._liberar()
+        self._mapa = mapa
+        self._visao = visao
+        self._stat = stat
+        self.geracao = geracao
+        self.temporada = temporada
+        self.rodada = rodada
+        self.criado_em = criado_em
+        self.clubes = visao[offset_clubes:offset_clubes + 4 * n_clubes].cast('i')
+        perfis = visao[offset_perfis:offset_perfis + 4 * (n_jogo + n_sg)].cast('i')
+        self.perfis_jogo = {perfil_id: i for i, perfil_id in enumerate(perfis[:n_jogo])}
+        self.perfis_sg = {perfil_id: i for i, perfil_id in enumerate(perfis[n_jogo:])}
+        self.obsoletos = None
+        if versao >= 2:
+            flags = visao[offset_obsoletos:offset_obsoletos + n_jogo + n_sg]
+            self.obsoletos = {
+                'jogo': sorted(perfil_id for perfil_id, i in self.perfis_jogo.items() if flags[i]),
+                'sg': sorted(perfil_id for perfil_id, i in self.perfis_sg.items() if flags[n_jogo + i]),
+            }
+        self.indice_clube = {clube_id: i for i, clube_id in enumerate(self.clubes)}
+        self._dados = visao[offset_dados:offset_dados + 4 * n_clubes * (n_jogo + n_sg)].cast('f')
+        self._n_clubes = n_clubes
+        self._n_jogo = n_jogo
+
+    def _liberar(self):
+        """Solta o mapeamento anterior (se ainda houver views exportadas, o GC fecha depois)"""
+        if self._mapa is None:
+            return
+        self.clubes = self._dados = None
+        try:
+            self._visao.release()
+            self._mapa.close()
+        except BufferError:
+            pass
+        self._mapa = self._visao = None
+
+    def pesos_jogo(self, perfil_id: int) -> memoryview:
+        """Array float32 de peso_jogo do perfil, indexado pelo índice denso do clube"""
+        inicio = self.perfis_jogo[perfil_id] * self._n_clubes
+        return self._dados[inicio:inicio + self._n_clubes]
+
+    def pesos_sg(self, perfil_id: int) -> memoryview:
+        """Array float32 de peso_sg do perfil, indexado pelo índice denso do clube"""
+        inicio = (self._n_jogo + self.perfis_sg[perfil_id]) * self._n_clubes
+        return self._dados[inicio:inicio + self._n_clubes]
+
+    def como_dicionarios(self):
+        """Converte o snapshot para ({perfil: {clube: peso_jogo}}, {perfil: {clube: peso_sg}})"""
+        def _converter(perfis, obter):
+            resultado = {}
+            for perfil_id in perfis:
+                pesos = obter(perfil_id)
+                resultado[perfil_id] = {
+                    clube_id: float(pesos[i])
+                    for i, clube_id in enumerate(self.clubes) if pesos[i] == pesos[i]
+                }
+            return resultado
+        return _converter(self.perfis_jogo, self.pesos_jogo), _converter(self.perfis_sg, self.pesos_sg)
+
+    def recarregar_se_mudou(self) -> bool:
+        """
+        Remapeia o arquivo se uma nova geração foi publicada
+
+        Returns:
+            True se recarregou
+        """
+        try:
+            stat = os.stat(self.caminho)
+        except OSError:
+            return False
+        if (stat.st_ino, stat.st_mtime_ns) == (self._stat.st_ino, self._stat.st_mtime_ns):
+            return False
+        geracao = ler_geracao(self.caminho)
+        if geracao is None or geracao == self.geracao:
+            return False
+        self._carregar()
+        logger.info(f"Snapshot de pesos recarregado: geração {self.geracao} (rodada {self.rodada}/{self.temporada})")
+        return True
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Servidor local que imita o endpoint de status do mercado do Cartola
+
+Permite testar offline a latência do ciclo e o comportamento do cliente de status
+(retries, circuit breaker, requisições condicionais e fallback). Aponte o calculador para ele:
+
+    python stub_status_cartola.py --porta 8099 --rodada 20 --status 1 --atraso 0.2 --taxa-falha 0.3
+    API_URL_STATUS=http://localhost:8099/mercado/status python main.py run-once
+
+Endpoints:
+    GET  /mercado/status    status simulado (com ETag e Last-Modified; responde 304 se não mudou)
+    POST /controle          altera o estado em tempo de execução; corpo JSON com qualquer um de
+                            rodada, status, temporada, fechamento (epoch), atraso, taxa_falha
+"""
+import argparse
+import hashlib
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger('stub_status_cartola')
+
+
+class EstadoStub:
+    """Estado simulado do mercado e das falhas injetadas"""
+
+    def __init__(self, rodada, status, temporada, fechamento, atraso, taxa_falha):
+        self.lock = threading.Lock()
+        self.rodada = rodada
+        self.status = status
+        self.temporada = temporada
+        self.fechamento = fechamento
+        self.atraso = atraso
+        self.taxa_falha = taxa_falha
+        self.modificado_em = time.time()
+
+    def corpo(self) -> bytes:
+        fechamento = time.localtime(self.fechamento)
+        return json.dumps({
+            'rodada_atual': self.rodada,
+            'status_mercado': self.status,
+            'temporada': self.temporada,
+            'fechamento': {
+                'dia': fechamento.tm_mday,
+                'mes': fechamento.tm_mon,
+                'ano': fechamento.tm_year,
+                'hora': fechamento.tm_hour,
+                'minuto': fechamento.tm_min,
+                'timestamp': int(self.fechamento),
+            },
+        }).encode('utf-8')
+
+    def atualizar(self, valores: dict):
+        with self.lock:
+            for campo in ('rodada', 'status', 'temporada', 'fechamento', 'atraso', 'taxa_falha'):
+                if campo in valores:
+                    setattr(self, campo, valores[campo])
+            self.modificado_em = time.time()
+
+
+def criar_handler(estado: EstadoStub):
+    class HandlerStub(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/mercado/status':
+                self._enviar(404, b'{"erro":"nao encontrado"}')
+                return
+
+            with estado.lock:
+                atraso, taxa_falha = estado.atraso, estado.taxa_falha
+                corpo = estado.corpo()
+                modificado_em = estado.modificado_em
+
+            if atraso:
+                time.sleep(atraso)
+            if taxa_falha and random.random() < taxa_falha:
+                self._enviar(503, b'{"erro":"falha simulada"}')
+                return
+
+            etag = '"' + hashlib.sha1(corpo).hexdigest()[:16] + '"'
+            cabecalhos = {'ETag': etag, 'Last-Modified': formatdate(modificado_em, usegmt=True)}
+            if self.headers.get('If-None-Match') == etag:
+                self._enviar(304, b'', cabecalhos)
+                return
+            self._enviar(200, corpo, cabecalhos)
+
+        def do_POST(self):
+            if self.path != '/controle':
+                self._enviar(404, b'{"erro":"nao encontrado"}')
+                return
+            try:
+                tamanho = int(self.headers.get('Content-Length') or 0)
+                estado.atualizar(json.loads(self.rfile.read(tamanho) or b'{}'))
+            except (ValueError, TypeError) as e:
+                self._enviar(400, json.dumps({'erro': str(e)}).encode('utf-8'))
+                return
+            logger.info(f"Estado alterado: rodada={estado.rodada} status={estado.status} "
+                        f"atraso={estado.atraso} taxa_falha={estado.taxa_falha}")
+            self._enviar(200, estado.corpo())
+
+        def _enviar(self, codigo, corpo, cabecalhos=None):
+            self.send_response(codigo)
+            self.send_header('Content-Type', 'application/json')
+            for nome, valor in (cabecalhos or {}).items():
+                self.send_header(nome, valor)
+            self.send_header('Content-Length', str(len(corpo)))
+            self.end_headers()
+            if corpo:
+                self.wfile.write(corpo)
+
+        def log_message(self, format, *args):
+            logger.debug("%s - %s" % (self.address_string(), format % args))
+
+    return HandlerStub
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stub local do endpoint de status do Cartola')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8099)
+    parser.add_argument('--rodada', type=int, default=1)
+    parser.add_argument('--status', type=int, default=1, help='status_mercado (1 = aberto, 2 = fechado)')
+    parser.add_argument('--temporada', type=int, default=time.localtime().tm_year)
+    parser.add_argument('--fechamento-em', type=float, default=24 * 3600,
+                        help='Segundos até o fechamento do mercado (padrão: 24h)')
+    parser.add_argument('--atraso', type=float, default=0.0, help='Latência de cada resposta (s)')
+    parser.add_argument('--taxa-falha', type=float, default=0.0, help='Fração de respostas 503 (0 a 1)')
+    args = parser.parse_args()
+
+    estado = EstadoStub(args.rodada, args.status, args.temporada, time.time() + args.fechamento_em,
+                        args.atraso, args.taxa_falha)
+    servidor = ThreadingHTTPServer((args.host, args.porta), criar_handler(estado))
+    logger.info(f"Stub de status em http://{args.host}:{args.porta}/mercado/status")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        servidor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
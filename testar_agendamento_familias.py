@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Script para testar o agendamento dos jobs das famílias (sem banco nem API)
+
+- Uma execução ignorada por sobreposição (família ocupada, ex.: recálculo dos perfis recarregados)
+  reagenda a família: a cadeia de execuções não pode parar
+- Uma execução normal (mercado fechado) agenda a próxima pela política
+- A cópia parcial da família (recarga de perfis) mantém cadência e prazo e registra estouros
+- A recarga de perfis agenda na hora só a família suspensa (sem perfis); uma família em execução
+  (sem job no agendador naquele instante) recalcula só os perfis alterados
+"""
+import logging
+import sys
+from datetime import datetime, timedelta
+
+import main
+import recarga_perfis
+from familias_calculo import FamiliaCalculo
+from metricas import metricas
+from politica_agendamento import criar_politica, INTERVALO_MINIMO
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+class SchedulerFalso:
+    """Guarda os jobs agendados como o BlockingScheduler (um job por id)"""
+
+    def __init__(self):
+        self.jobs = {}
+
+    def add_job(self, func, **kwargs):
+        self.jobs[kwargs['id']] = kwargs
+
+    def get_job(self, job_id):
+        return self.jobs.get(job_id)
+
+
+class SnapshotFalso:
+    """Status fixo do mercado (fechado), sem consultar a API"""
+
+    def obter_status(self):
+        return {'rodada_atual': 10, 'temporada': 2025, 'status_mercado': 2}, 'api'
+
+    def invalidar_insumos(self):
+        pass
+
+
+class MonitorFalso:
+    """Recarga com o perfil 3 novo (registro não usado: atualizar_familias é substituída no teste)"""
+
+    def verificar(self):
+        return None, recarga_perfis.DiferencaPerfis([('jogo', {'id': 3})], [], [])
+
+
+def criar_familia():
+    return FamiliaCalculo(
+        'jogo', 'PESO DO JOGO', 'jogo', [{'id': 1}, {'id': 2}], lambda *args: None,
+        cadencia_minutos=3, prazo_segundos=5
+    )
+
+
+def testar_execucao_ignorada_reagenda():
+    """Família ocupada: o job ignorado agenda uma nova tentativa"""
+    logger.info("=" * 80)
+    logger.info("TESTE: Execução ignorada por sobreposição reagenda a família")
+    logger.info("=" * 80)
+
+    scheduler, familia = SchedulerFalso(), criar_familia()
+    # Recálculo dos perfis recarregados em andamento
+    familia.lock.acquire()
+    try:
+        inicio = datetime.now()
+        main.execute_calculations(scheduler, familia, criar_politica(), SnapshotFalso())
+    finally:
+        familia.lock.release()
+
+    job = scheduler.get_job('calculo_jogo')
+    if job is None:
+        logger.error("Nenhum job agendado: a cadeia de execuções da família parou")
+        return False
+    atraso = job['run_date'] - inicio
+    if not INTERVALO_MINIMO <= atraso < INTERVALO_MINIMO + timedelta(seconds=5):
+        logger.error(f"Nova tentativa agendada para daqui a {atraso} (esperado: {INTERVALO_MINIMO})")
+        return False
+    if job['args'][1] is not familia:
+        logger.error("Job reagendado com outra família")
+        return False
+    logger.info(f"[OK] Nova tentativa agendada para daqui a {atraso}")
+    return True
+
+
+def testar_execucao_normal_reagenda():
+    """Mercado fechado: a execução termina e agenda a próxima (cadência mínima da família)"""
+    logger.info("=" * 80)
+    logger.info("TESTE: Execução normal agenda a próxima")
+    logger.info("=" * 80)
+
+    scheduler, familia = SchedulerFalso(), criar_familia()
+    inicio = datetime.now()
+    main.execute_calculations(scheduler, familia, criar_politica(), SnapshotFalso())
+
+    job = scheduler.get_job('calculo_jogo')
+    if job is None:
+        logger.error("Nenhum job agendado após a execução")
+        return False
+    if familia.lock.locked():
+        logger.error("Lock da família não foi liberado")
+        return False
+    if job['run_date'] - inicio < timedelta(minutes=familia.cadencia_minutos):
+        logger.error(f"Próxima execução antes da cadência da família: {job['run_date']}")
+        return False
+    logger.info(f"[OK] Próxima execução: {job['run_date'].strftime('%H:%M:%S')}")
+    return True
+
+
+def testar_parcial_mede_prazo():
+    """A cópia parcial mantém cadência e prazo e registra o estouro do prazo da família"""
+    logger.info("=" * 80)
+    logger.info("TESTE: Recálculo parcial medido como a execução agendada")
+    logger.info("=" * 80)
+
+    parcial = criar_familia().parcial({2})
+    if [p['id'] for p in parcial.perfis] != [2]:
+        logger.error(f"Perfis da cópia parcial: {parcial.perfis}")
+        return False
+    if (parcial.cadencia_minutos, parcial.prazo_segundos) != (3, 5):
+        logger.error(f"Cópia parcial sem cadência/prazo: {parcial.cadencia_minutos}, {parcial.prazo_segundos}")
+        return False
+
+    estouros = metricas.estouros['familia']
+    if parcial.registrar_duracao(1.0) or metricas.estouros['familia'] != estouros:
+        logger.error("Execução dentro do prazo registrada como estouro")
+        return False
+    if not parcial.registrar_duracao(6.0) or metricas.estouros['familia'] != estouros + 1:
+        logger.error("Estouro do prazo da família não registrado")
+        return False
+    logger.info("[OK] Cadência, prazo e estouro da família na cópia parcial")
+    return True
+
+
+def testar_recarga_agenda_so_familia_suspensa():
+    """Família suspensa volta a rodar na hora; família em execução recebe só o recálculo parcial"""
+    logger.info("=" * 80)
+    logger.info("TESTE: Recarga de perfis agenda só a família suspensa")
+    logger.info("=" * 80)
+
+    scheduler, snapshot = SchedulerFalso(), SnapshotFalso()
+    suspensa, executando = criar_familia(), criar_familia()
+    executando.nome = 'ajustado'
+
+    # Todos os perfis removidos: a execução suspende a família (sem agendar a próxima)
+    suspensa.perfis = []
+    main.execute_calculations(scheduler, suspensa, criar_politica(), snapshot)
+    if not suspensa.suspensa or scheduler.get_job('calculo_jogo') is not None:
+        logger.error("Família sem perfis não foi suspensa")
+        return False
+
+    # A outra família está executando: o job disparado já saiu do agendador
+    familias = {'jogo': suspensa, 'ajustado': executando}
+    parciais = []
+    atualizar_familias, recalcular_perfis = recarga_perfis.atualizar_familias, main._recalcular_perfis
+
+    def atualizar(familias, registro):
+        for familia in familias.values():
+            familia.perfis = [{'id': 1}, {'id': 3}]
+        return []
+
+    recarga_perfis.atualizar_familias = atualizar
+    main._recalcular_perfis = lambda lista, removidos, snapshot: parciais.extend(lista)
+    try:
+        main.verificar_perfis(scheduler, MonitorFalso(), familias, snapshot)
+    finally:
+        recarga_perfis.atualizar_familias, main._recalcular_perfis = atualizar_familias, recalcular_perfis
+
+    if scheduler.get_job('calculo_jogo') is None or suspensa.suspensa:
+        logger.error("Família suspensa não foi agendada ao voltar a ter perfis")
+        return False
+    if scheduler.get_job('calculo_ajustado') is not None:
+        logger.error("Família em execução agendada de novo (execução duplicada)")
+        return False
+    if [(familia.nome, ids) for familia, ids in parciais] != [('ajustado', {3})]:
+        logger.error(f"Recálculo parcial inesperado: {[(familia.nome, ids) for familia, ids in parciais]}")
+        return False
+    logger.info("[OK] Família suspensa agendada; família em execução com recálculo parcial do perfil 3")
+    return True
+
+
+if __name__ == "__main__":
+    logger.info("Iniciando testes do agendamento das famílias...\n")
+
+    resultados = [
+        testar_execucao_ignorada_reagenda(),
+        testar_execucao_normal_reagenda(),
+        testar_parcial_mede_prazo(),
+        testar_recarga_agenda_so_familia_suspensa(),
+    ]
+    sys.exit(0 if all(resultados) else 1)
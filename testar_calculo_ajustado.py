@@ -11,7 +11,8 @@ from calculo_tabela import calcular_tabela_classificacao
 from calculo_peso_jogo_ajustado import calculate_peso_jogo_for_profile_ajustado
 from calculo_peso_sg_ajustado import calculate_peso_sg_for_profile_ajustado
 from mostrar_rankings import mostrar_ranking_peso_jogo, mostrar_ranking_peso_sg
-from config import PERFIS_PESO_JOGO, PERFIS_PESO_SG
+from api_cartola import get_temporada_atual
+from registro_perfis import registro_padrao
 
 # Configurar logging
 logging.basicConfig(
@@ -48,7 +49,7 @@ def testar_tabela_classificacao():
     
     try:
         cursor = conn.cursor()
-        tabela = calcular_tabela_classificacao(cursor, rodada_atual)
+        tabela = calcular_tabela_classificacao(cursor, rodada_atual, get_temporada_atual())
         
         logger.info(f"\nTabela de Classificação (Top 10):")
         logger.info(f"{'Pos':<5} {'Clube ID':<10} {'Pontos':<8} {'V':<4} {'E':<4} {'D':<4} {'GP':<5} {'GC':<5} {'SG':<6} {'Aproveit.':<12} {'Força':<8}")
@@ -100,29 +101,28 @@ def testar_calculo_ajustado():
     try:
         init_tables(conn)
         
+        # Primeiro perfil ajustado de cada tipo
+        registro = registro_padrao()
+        perfil_jogo = registro.perfis('jogo', 'ajustado')[0]
+        perfil_sg = registro.perfis('sg', 'ajustado')[0]
+        
         # Testar 1 perfil de peso do jogo
         logger.info(f"\n{'='*80}")
-        logger.info("TESTANDO PESO DO JOGO (AJUSTADO) - Perfil 1")
+        logger.info(f"TESTANDO PESO DO JOGO (AJUSTADO) - Perfil {perfil_jogo['id']}")
         logger.info(f"{'='*80}\n")
         
-        perfil_jogo = PERFIS_PESO_JOGO[0]
-        cache_setores = {}
-        
         calculate_peso_jogo_for_profile_ajustado(
             conn, rodada_atual, perfil_jogo,
-            usar_provaveis_cartola=False,
-            cache_setores=cache_setores
+            usar_provaveis_cartola=False
         )
         
         mostrar_ranking_peso_jogo(conn, rodada_atual, perfil_jogo['id'])
         
         # Testar 1 perfil de peso do SG
         logger.info(f"\n{'='*80}")
-        logger.info("TESTANDO PESO DO SG (AJUSTADO) - Perfil 1")
+        logger.info(f"TESTANDO PESO DO SG (AJUSTADO) - Perfil {perfil_sg['id']}")
         logger.info(f"{'='*80}\n")
         
-        perfil_sg = PERFIS_PESO_SG[0]
-        
         calculate_peso_sg_for_profile_ajustado(
             conn, rodada_atual, perfil_sg,
             usar_provaveis_cartola=False
@@ -125,11 +125,9 @@ def testar_calculo_rating():
         
         logger.info(f"\nTestando perfil {perfil_rating['id']}: {perfil_rating['descricao']}")
         
-        cache_setores = {}
         calculate_peso_jogo_for_profile_rating(
             conn, rodada_atual, perfil_rating,
-            usar_provaveis_cartola=False,
-            cache_setores=cache_setores
+            usar_provaveis_cartola=False
         )
         
         mostrar_ranking_peso_jogo(conn, rodada_atual, perfil_rating['id'])